@@ -0,0 +1,88 @@
+"""Measure how long src/main.py takes to start, using python -X importtime.
+
+Compares the modules main.py used to import eagerly with the lazy CLI, for
+`--help` and for a command that needs the agents. Reports the median wall
+time and import time of each, plus the slowest top-level imports.
+
+Usage:
+    python benchmarks/cli_startup.py [--repeat 10] [--top 5] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MAIN = os.path.join(ROOT, 'src', 'main.py')
+
+# What main.py imported before the CLI, except `config` and `pyperclip`, which are
+# local or optional and would only make the eager case slower
+EAGER_IMPORTS = ('import json, os, logging, sys; sys.path.insert(0, "src"); '
+                 'import agent.codebase, agent.git_agent, agent.gpt_agent, agent.job_journal, agent.metrics, '
+                 'agent.model_router, agent.programmer, agent.rate_limiter, agent.request_processor, '
+                 'agent.request_watcher, agent.structured_output')
+
+SCENARIOS = {
+    'eager imports (before)': ['-c', EAGER_IMPORTS],
+    'main.py --help': [MAIN, '--help'],
+    'main.py show-structure': [MAIN, 'show-structure', os.path.join(ROOT, 'tests', 'unit', 'codebaseFolderTest')],
+}
+
+def parse_importtime(stderr):
+    """Return {module: cumulative microseconds} for the top-level imports in -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):  # Nested imports are indented under their parent
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+def measure(arguments, repeat):
+    """Run a scenario `repeat` times and return its median wall and import times and top imports."""
+    walls, totals, modules = [], [], {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime'] + arguments, cwd=ROOT,
+                                capture_output=True, text=True)
+        walls.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"{arguments} failed: {result.stderr[-500:]}")
+        imports = parse_importtime(result.stderr)
+        totals.append(sum(imports.values()))
+        for name, microseconds in imports.items():
+            modules.setdefault(name, []).append(microseconds)
+    slowest = sorted(((statistics.median(values), name) for name, values in modules.items()), reverse=True)
+    return {
+        'wall_ms': statistics.median(walls) * 1000,
+        'import_ms': statistics.median(totals) / 1000,
+        'slowest_imports': [(name, microseconds / 1000) for microseconds, name in slowest],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--top', type=int, default=5, help='Slowest imports listed per scenario.')
+    parser.add_argument('--output', help='Save the results to this JSON file.')
+    args = parser.parse_args()
+
+    results = {}
+    for label, arguments in SCENARIOS.items():
+        result = measure(arguments, args.repeat)
+        result['slowest_imports'] = result['slowest_imports'][:args.top]
+        results[label] = result
+        print(f"{label:<26} wall {result['wall_ms']:6.1f}ms  imports {result['import_ms']:6.1f}ms")
+        for name, milliseconds in result['slowest_imports']:
+            print(f"    {name:<30} {milliseconds:6.1f}ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'parameters': vars(args), 'results': results}, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Benchmark CodebaseAgent directory scans and prompt rendering on synthetic trees.
+
+Each case records wall time, peak Python memory, directory reads and stat calls,
+and output size. Results can be saved as JSON and compared with a baseline run;
+the script exits with status 1 when a case got slower or larger than the tolerance.
+
+Usage:
+    python benchmarks/codebase_benchmark.py [--files 100000] [--shapes wide deep large excluded]
+                                            [--repeat 3] [--output results.json]
+                                            [--compare baseline.json] [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.agent.codebase import CodebaseAgent
+from src.agent.metrics import Metrics
+from src.agent.tokens import estimate_tokens
+from src.agent.tree_renderer import render_tree
+from src.agent.walker import walk_directory_structure
+
+RESULTS_VERSION = 1
+SHAPES = ('wide', 'deep', 'large', 'excluded')
+# Directory mtimes are pushed this far into the past so the directory index trusts them
+AGE_SECONDS = 60
+
+def _touch_files(path, count, suffix='.py'):
+    os.makedirs(path, exist_ok=True)
+    for j in range(count):
+        open(os.path.join(path, f'file{j}{suffix}'), 'w').close()
+
+def build_wide(root, files):
+    """Few levels, many siblings: 1000 top-level directories plus loose root files."""
+    dirs = max(1, min(1000, files // 10))
+    per_dir = (files - files // 10) // dirs
+    for i in range(dirs):
+        _touch_files(os.path.join(root, f'dir{i}'), per_dir)
+    _touch_files(root, files // 10)
+
+def build_deep(root, files):
+    """A 64-level chain of nested directories with the files spread along it."""
+    depth = 64
+    path = root
+    for level in range(depth):
+        path = os.path.join(path, f'level{level}')
+        _touch_files(path, files // depth)
+
+def build_large(root, files):
+    """A realistic package layout: pkg/mod/dir with 20 files per leaf directory."""
+    per_dir = 20
+    for i in range(max(1, files // per_dir)):
+        _touch_files(os.path.join(root, f'pkg{i % 50}', f'mod{i % 500}', f'dir{i}'), per_dir)
+
+def build_excluded(root, files):
+    """Half source files, half in directories that are excluded or gitignored."""
+    build_large(os.path.join(root, 'src'), files // 2)
+    per_dir = 20
+    for i in range(max(1, files // 2 // per_dir)):
+        ignored = ('node_modules', 'build', '.git')[i % 3]
+        _touch_files(os.path.join(root, ignored, f'dep{i}'), per_dir, '.js')
+    with open(os.path.join(root, '.gitignore'), 'w') as f:
+        f.write('node_modules/\nbuild/\n*.log\n')
+
+BUILDERS = {'wide': build_wide, 'deep': build_deep, 'large': build_large, 'excluded': build_excluded}
+
+def age_directories(root):
+    """Move every directory mtime into the past, as in a checkout that is not being edited."""
+    timestamp = time.time() - AGE_SECONDS
+    for path, _, _ in os.walk(root):
+        os.utime(path, (timestamp, timestamp))
+
+@contextmanager
+def count_calls(counts):
+    """Count the os.scandir and os.stat calls made from Python inside the block."""
+    original_scandir, original_stat = os.scandir, os.stat
+
+    def scandir(*args, **kwargs):
+        counts['scandir'] += 1
+        return original_scandir(*args, **kwargs)
+
+    def stat(*args, **kwargs):
+        counts['stat'] += 1
+        return original_stat(*args, **kwargs)
+
+    os.scandir, os.stat = scandir, stat
+    try:
+        yield counts
+    finally:
+        os.scandir, os.stat = original_scandir, original_stat
+
+def measure(function, repeat):
+    """Run `function` for timings, once under tracemalloc and once while counting calls."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with count_calls({'scandir': 0, 'stat': 0}) as calls:
+        function()
+
+    text = output if isinstance(output, str) else json.dumps(output)
+    return {
+        'wall_seconds': {'min': min(timings), 'median': statistics.median(timings)},
+        'peak_memory_bytes': peak,
+        'calls': calls,
+        'output_bytes': len(text.encode('utf-8')),
+        'output_tokens': estimate_tokens(text),
+    }
+
+def benchmark_shape(shape, root, repeat, structure_token_budget):
+    """Run every case against one generated tree."""
+    metrics = Metrics(enabled=False)
+    exclusions = ['node_modules', 'build', '.git'] if shape == 'excluded' else []
+    index_path = os.path.join(tempfile.mkdtemp(), 'directory_index.json')
+    try:
+        indexed_agent = CodebaseAgent(root, index_path=index_path, metrics=metrics)
+        indexed_agent.get_directory_structure(exclusions=exclusions)  # Warm the index
+        structure = walk_directory_structure(root, exclusions)
+
+        # A CodebaseAgent keeps listings in memory between calls, so the cold scans walk directly
+        cases = {
+            'scan': lambda: walk_directory_structure(root, exclusions),
+            'scan_gitignore': lambda: walk_directory_structure(root, exclusions, respect_gitignore=True),
+            'scan_index_warm': lambda: indexed_agent.get_directory_structure(exclusions=exclusions),
+            'render_budgeted': lambda: render_tree(structure, max_tokens=structure_token_budget),
+            'render_full': lambda: render_tree(structure),
+        }
+        return {f'{shape}/{name}': measure(function, repeat) for name, function in cases.items()}
+    finally:
+        shutil.rmtree(os.path.dirname(index_path))
+
+def compare(results, baseline, tolerance):
+    """Print the change of every case against the baseline and return the regressed case names."""
+    regressions = []
+    print(f"\n{'case':<32} {'median':>10} {'baseline':>10} {'change':>8} {'peak mem':>9}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<32} {'(new)':>10}")
+            continue
+        median = result['wall_seconds']['median']
+        previous_median = previous['wall_seconds']['median']
+        time_change = median / previous_median - 1 if previous_median else 0.0
+        memory_change = (result['peak_memory_bytes'] / previous['peak_memory_bytes'] - 1
+                         if previous['peak_memory_bytes'] else 0.0)
+        flags = []
+        if time_change > tolerance:
+            flags.append('SLOWER')
+        if memory_change > tolerance:
+            flags.append('MORE MEMORY')
+        if result['output_bytes'] != previous['output_bytes']:
+            flags.append('output changed')
+        if 'SLOWER' in flags or 'MORE MEMORY' in flags:
+            regressions.append(name)
+        print(f"{name:<32} {median * 1000:>8.1f}ms {previous_median * 1000:>8.1f}ms "
+              f"{time_change:>+7.0%} {memory_change:>+8.0%}  {' '.join(flags)}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=100000, help='Files generated per tree shape.')
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=list(SHAPES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--structure-token-budget', type=int, default=2000)
+    parser.add_argument('--output', help='Save the results to this JSON file.')
+    parser.add_argument('--compare', help='Compare against results saved by an earlier run.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative increase in median time or peak memory.')
+    args = parser.parse_args()
+
+    results = {}
+    for shape in args.shapes:
+        root = tempfile.mkdtemp()
+        try:
+            start = time.perf_counter()
+            BUILDERS[shape](root, args.files)
+            age_directories(root)
+            print(f"Built '{shape}' tree with {args.files} files in {time.perf_counter() - start:.1f}s")
+            results.update(benchmark_shape(shape, root, args.repeat, args.structure_token_budget))
+        finally:
+            shutil.rmtree(root)
+
+    print(f"\n{'case':<32} {'min':>10} {'median':>10} {'peak mem':>10} {'scandir':>8} {'stat':>8} {'output':>10}")
+    for name, result in results.items():
+        wall = result['wall_seconds']
+        print(f"{name:<32} {wall['min'] * 1000:>8.1f}ms {wall['median'] * 1000:>8.1f}ms "
+              f"{result['peak_memory_bytes'] / 2**20:>8.1f}MB {result['calls']['scandir']:>8} "
+              f"{result['calls']['stat']:>8} {result['output_bytes']:>9}B")
+
+    if args.output:
+        document = {
+            'version': RESULTS_VERSION,
+            'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+            'parameters': {'files': args.files, 'repeat': args.repeat,
+                           'structure_token_budget': args.structure_token_budget},
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('version') != RESULTS_VERSION:
+            sys.exit(f"{args.compare} was written by an incompatible version of this benchmark.")
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
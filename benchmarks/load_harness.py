@@ -0,0 +1,152 @@
+"""Push request files through RequestProcessor and ProgrammerAgent against the mock server.
+
+Reports throughput, per-request and per-API-call tail latency, server-side
+statuses (so retries of 429s and 500s are visible) and failed request files.
+With --hedge, slow requests are duplicated after a fixed delay or the learned
+p95, and the hedge counters show how often that fired and won. --server-rpm
+gives the mock a provider-style RPM limit, and --rpm/--tpm admit requests
+through the client-side rate limiter to stay under it.
+
+Usage:
+    python benchmarks/load_harness.py [--requests 200] [--workers 1 4 8] [--stream]
+                                      [--latency lognormal:0.3,0.6] [--error-rate 0.02]
+                                      [--rate-limit-rate 0.05] [--max-retries 3] [--hedge [DELAY]]
+                                      [--server-rpm 120] [--rpm 115] [--tpm 90000] [--output load.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from mock_openai_server import MockChatCompletionsServer
+from src.agent.hedging import Hedger
+from src.agent.http_client import HTTPClient
+from src.agent.metrics import Metrics
+from src.agent.programmer import ProgrammerAgent
+from src.agent.rate_limiter import RateLimiter
+from src.agent.request_processor import RequestProcessor
+
+def write_requests(folder, count):
+    os.makedirs(folder)
+    for i in range(count):
+        with open(os.path.join(folder, f'request_{i:05d}.txt'), 'w') as f:
+            f.write(f'Write a function that multiplies its argument by {i}')
+
+def run(args, workers):
+    """Run one load test with `workers` parallel request files and return its report."""
+    work_dir = tempfile.mkdtemp()
+    request_folder = os.path.join(work_dir, 'requests')
+    results_folder = os.path.join(request_folder, 'results')
+    write_requests(request_folder, args.requests)
+
+    metrics = Metrics()
+    http_client = HTTPClient(max_retries=args.max_retries, backoff_factor=args.backoff,
+                             pool_maxsize=max(workers, 1))
+    server = MockChatCompletionsServer(latency=args.latency, error_rate=args.error_rate,
+                                       rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                                       stream_chunks=args.stream_chunks, chunk_delay=args.chunk_delay,
+                                       seed=args.seed, requests_per_minute=args.server_rpm)
+    hedger = None
+    if args.hedge is not None:
+        hedger = Hedger(delay=args.hedge if args.hedge > 0 else None, max_ratio=args.hedge_ratio, metrics=metrics)
+    rate_limiter = None
+    if args.rpm or args.tpm:
+        rate_limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm, metrics=metrics)
+
+    def create_programmer_agent():
+        agent = ProgrammerAgent(codebase_repo_path=args.codebase, gpt_api_key='mock-key', metrics=metrics)
+        agent.gpt_agent.api_url = server.url
+        agent.gpt_agent.http_client = http_client
+        agent.gpt_agent.hedger = hedger
+        agent.gpt_agent.rate_limiter = rate_limiter
+        return agent
+
+    try:
+        with server:
+            processor = RequestProcessor(request_folder, results_folder, create_programmer_agent,
+                                         max_workers=workers, stream_results=args.stream, metrics=metrics)
+            start = time.perf_counter()
+            outcomes = processor.process_all()
+            elapsed = time.perf_counter() - start
+    finally:
+        http_client.close()
+        if hedger is not None:
+            hedger.close()
+        shutil.rmtree(work_dir)
+
+    snapshot = metrics.snapshot()
+    succeeded = sum(outcomes.values())
+    return {
+        'workers': workers,
+        'requests': args.requests,
+        'succeeded': succeeded,
+        'failed': args.requests - succeeded,
+        'elapsed_seconds': elapsed,
+        'throughput_per_second': succeeded / elapsed if elapsed else 0.0,
+        'request_latency': snapshot['spans'].get('request.process'),
+        'api_latency': snapshot['spans'].get('gpt.stream' if args.stream else 'gpt.request'),
+        'first_chunk_latency': snapshot['spans'].get('gpt.stream.first_chunk'),
+        'server': server.stats(),
+        'counters': snapshot['counters'],
+    }
+
+def print_report(report):
+    server = report['server']
+    statuses = ', '.join(f'{status}: {count}' for status, count in sorted(server['statuses'].items()))
+    print(f"\nworkers={report['workers']}: {report['succeeded']}/{report['requests']} succeeded "
+          f"in {report['elapsed_seconds']:.2f}s ({report['throughput_per_second']:.1f} req/s)")
+    for label, key in (('request', 'request_latency'), ('api call', 'api_latency'),
+                       ('first chunk', 'first_chunk_latency')):
+        summary = report[key]
+        if summary:
+            print(f"  {label:<12} p50={summary['p50'] * 1000:.0f}ms p95={summary['p95'] * 1000:.0f}ms "
+                  f"p99={summary['p99'] * 1000:.0f}ms")
+    print(f"  server       {server['requests']} requests ({statuses}), "
+          f"{server['requests'] - report['succeeded']} beyond one per successful file")
+    counters = report['counters']
+    if counters.get('hedge.calls'):
+        print(f"  hedging      fired {counters.get('hedge.fired', 0):.0f}, won {counters.get('hedge.won', 0):.0f}, "
+              f"suppressed {counters.get('hedge.suppressed', 0):.0f} of {counters['hedge.calls']:.0f} calls")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--stream', action='store_true', help='Stream results to disk as they arrive.')
+    parser.add_argument('--codebase', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'),
+                        help='Repository whose structure goes into each prompt.')
+    parser.add_argument('--latency', default='lognormal:0.3,0.6')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=0.1)
+    parser.add_argument('--stream-chunks', type=int, default=8)
+    parser.add_argument('--chunk-delay', type=float, default=0.0)
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--backoff', type=float, default=0.5)
+    parser.add_argument('--hedge', type=float, nargs='?', const=0.0,
+                        help='Hedge requests after this many seconds, or after the learned p95 if no value is given.')
+    parser.add_argument('--hedge-ratio', type=float, default=0.1, help='Most extra requests hedging may add.')
+    parser.add_argument('--server-rpm', type=int, help='RPM limit enforced by the mock server.')
+    parser.add_argument('--rpm', type=float, help='Client-side requests-per-minute limit.')
+    parser.add_argument('--tpm', type=float, help='Client-side tokens-per-minute limit.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Save the reports to this JSON file.')
+    args = parser.parse_args()
+
+    reports = []
+    for workers in args.workers:
+        report = run(args, workers)
+        print_report(report)
+        reports.append(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'parameters': vars(args), 'reports': reports}, f, indent=2)
+        print(f"\nSaved reports to {args.output}")
+
+if __name__ == '__main__':
+    main()
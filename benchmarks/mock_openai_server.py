@@ -0,0 +1,248 @@
+"""Local stand-in for the OpenAI chat completions endpoint, for offline load tests.
+
+Latency specs:
+    fixed:SECONDS                  e.g. fixed:0.2
+    uniform:LOW,HIGH               e.g. uniform:0.05,0.5
+    lognormal:MEDIAN,SIGMA         e.g. lognormal:0.3,0.6 (heavy tail)
+    exponential:MEAN               e.g. exponential:0.2
+
+Usage:
+    python benchmarks/mock_openai_server.py [--port 8000] [--latency lognormal:0.3,0.6]
+                                            [--error-rate 0.02] [--rate-limit-rate 0.05]
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def parse_latency(spec):
+    """Turn a latency spec into a function returning one delay in seconds."""
+    kind, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(',')] if params else []
+    if kind == 'fixed' and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'lognormal' and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    if kind == 'exponential' and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+def default_content(request_number, body):
+    """Reply in the programmer role's format: a JSON object with a 'code' field."""
+    code = f"def solve_{request_number}(value):\n    \"\"\"Generated by the mock server.\"\"\"\n    return value * {request_number}\n"
+    return json.dumps({'code': code})
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server.mock
+        raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON body.'}})
+            return
+
+        outcome, delay, request_number = server.next_outcome()
+        if outcome == 429:
+            self._send_json(429, {'error': {'message': 'Rate limit reached.', 'type': 'requests'}},
+                            {'Retry-After': f'{server.retry_after:g}'})
+            return
+        time.sleep(delay)
+        if outcome == 500:
+            self._send_json(500, {'error': {'message': 'The server had an error.'}})
+            return
+
+        content = server.content(request_number, body)
+        prompt_tokens = len(raw) // 4
+        completion_tokens = max(1, len(content) // 4)
+        if body.get('stream'):
+            self._stream(body, content)
+        else:
+            self._send_json(200, {
+                'id': f'chatcmpl-mock-{request_number}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'mock'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': content}}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                          'total_tokens': prompt_tokens + completion_tokens},
+            })
+        server.record(200, prompt_tokens, completion_tokens)
+
+    def _stream(self, body, content):
+        server = self.server.mock
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        size = max(1, math.ceil(len(content) / server.stream_chunks))
+        for start in range(0, len(content), size):
+            chunk = {'object': 'chat.completion.chunk', 'model': body.get('model', 'mock'),
+                     'choices': [{'index': 0, 'delta': {'content': content[start:start + size]}}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            time.sleep(server.chunk_delay)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        if status != 200:
+            self.server.mock.record(status)
+
+    def log_message(self, format, *args):
+        pass
+
+class MockChatCompletionsServer:
+    """Chat completions stand-in with configurable latency, 500s, 429s and streaming."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency='fixed:0.05', error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=0.1, stream_chunks=8, chunk_delay=0.0,
+                 content=default_content, seed=None, requests_per_minute=None):
+        """
+        Initialize the server. It listens once `start` is called.
+
+        Parameters:
+            host (str): Interface to bind. Defaults to localhost.
+            port (int): Port to bind; 0 picks a free one.
+            latency (str): Latency spec for successful and failed responses. See the module docstring.
+            error_rate (float): Fraction of requests answered with a 500 after the latency.
+            rate_limit_rate (float): Fraction of requests answered at once with a 429.
+            retry_after (float): Seconds sent in the Retry-After header of a 429.
+            stream_chunks (int): Number of SSE chunks a streamed response is split into.
+            chunk_delay (float): Seconds between streamed chunks.
+            content (Callable): Builds the reply from the request number and request body.
+            seed (int, optional): Seed for reproducible latencies and failures.
+            requests_per_minute (int, optional): Answer requests beyond this many in the last
+                                                 60 seconds with a 429, like a provider's RPM limit.
+        """
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.stream_chunks = stream_chunks
+        self.chunk_delay = chunk_delay
+        self.content = content
+        self.requests_per_minute = requests_per_minute
+        self._admitted = deque()
+        self.statuses = Counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._random = random.Random(seed)
+        self._requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        """The chat completions URL to pass to GPTAgent."""
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/v1/chat/completions'
+
+    def next_outcome(self):
+        """Draw the status, latency and request number for the next request."""
+        with self._lock:
+            self._requests += 1
+            roll = self._random.random()
+            delay = self.latency(self._random)
+            if roll < self.rate_limit_rate or self._over_limit():
+                return 429, 0.0, self._requests
+            if roll < self.rate_limit_rate + self.error_rate:
+                return 500, delay, self._requests
+            return 200, delay, self._requests
+
+    def _over_limit(self):
+        """Whether the RPM limit is reached; otherwise counts the request against it."""
+        if self.requests_per_minute is None:
+            return False
+        now = time.monotonic()
+        while self._admitted and self._admitted[0] <= now - 60:
+            self._admitted.popleft()
+        if len(self._admitted) >= self.requests_per_minute:
+            return True
+        self._admitted.append(now)
+        return False
+
+    def record(self, status, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            self.statuses[status] += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def stats(self):
+        """Return the number of requests answered with each status, and the tokens served."""
+        with self._lock:
+            return {'requests': sum(self.statuses.values()), 'statuses': dict(self.statuses),
+                    'prompt_tokens': self.prompt_tokens, 'completion_tokens': self.completion_tokens}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={'poll_interval': 0.05},
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', default='lognormal:0.3,0.6')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=0.1)
+    parser.add_argument('--stream-chunks', type=int, default=8)
+    parser.add_argument('--chunk-delay', type=float, default=0.0)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--rpm', type=int, help='Requests per minute before answering with 429s.')
+    args = parser.parse_args()
+
+    server = MockChatCompletionsServer(args.host, args.port, args.latency, args.error_rate,
+                                       args.rate_limit_rate, args.retry_after, args.stream_chunks,
+                                       args.chunk_delay, seed=args.seed, requests_per_minute=args.rpm)
+    print(f"Serving {server.url} (Ctrl+C to stop)")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(json.dumps(server.stats(), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Compare the scandir walker with the previous os.walk implementation.
+
+Usage:
+    python benchmarks/walker_benchmark.py [--dirs 2000] [--files-per-dir 20] [--repeat 5]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.agent.walker import walk_directory_structure
+
+def legacy_get_directory_structure(start_path, exclusions=None):
+    """The os.walk based CodebaseAgent.get_directory_structure this walker replaced."""
+    if exclusions is None:
+        exclusions = []
+
+    dir_structure = {}
+    start_path_parts = start_path.split(os.sep)
+
+    for root, dirs, files in os.walk(start_path):
+        dirs[:] = [d for d in dirs if d not in exclusions]
+        files = [f for f in files if f not in exclusions]
+
+        subtree = {}
+        for d in dirs:
+            subtree[d] = {}
+        for f in files:
+            subtree[f] = None
+
+        path_parts = root.split(os.sep)
+        relative_parts = path_parts[len(start_path_parts):]
+
+        parent_dir_subtree = dir_structure
+        for part in relative_parts:
+            parent_dir_subtree = parent_dir_subtree.setdefault(part, {})
+        parent_dir_subtree.update(subtree)
+
+    return dir_structure
+
+def build_tree(root, dirs, files_per_dir):
+    """Create `dirs` directories spread over a few levels, plus an ignored node_modules tree."""
+    for i in range(dirs):
+        path = os.path.join(root, f'pkg{i % 20}', f'mod{i % 200}', f'dir{i}')
+        os.makedirs(path, exist_ok=True)
+        for j in range(files_per_dir):
+            open(os.path.join(path, f'file{j}.py'), 'w').close()
+
+    for i in range(dirs // 2):
+        path = os.path.join(root, 'node_modules', f'dep{i}')
+        os.makedirs(path, exist_ok=True)
+        for j in range(files_per_dir):
+            open(os.path.join(path, f'index{j}.js'), 'w').close()
+
+    with open(os.path.join(root, '.gitignore'), 'w') as f:
+        f.write('node_modules/\n')
+
+def best_time(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dirs', type=int, default=2000)
+    parser.add_argument('--files-per-dir', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        build_tree(root, args.dirs, args.files_per_dir)
+        cases = [
+            ('os.walk (previous)', lambda: legacy_get_directory_structure(root)),
+            ('scandir', lambda: walk_directory_structure(root)),
+            ('scandir, 4 workers', lambda: walk_directory_structure(root, workers=4)),
+            ('os.walk, exclusions', lambda: legacy_get_directory_structure(root, ['node_modules'])),
+            ('scandir, .gitignore', lambda: walk_directory_structure(root, respect_gitignore=True)),
+            ('scandir, .gitignore, 4 workers', lambda: walk_directory_structure(root, respect_gitignore=True, workers=4)),
+        ]
+        assert legacy_get_directory_structure(root) == walk_directory_structure(root)
+
+        print(f"{'case':<32} {'best (ms)':>10}")
+        for name, function in cases:
+            print(f"{name:<32} {best_time(function, args.repeat) * 1000:>10.1f}")
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
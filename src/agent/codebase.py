@@ -1,17 +1,49 @@
 import os
+from typing import Dict
+from .directory_index import DirectoryIndex
+from .metrics import Metrics, get_metrics
+from .relevance_index import RelevanceIndex
+from .symbol_index import SymbolIndex
+from .tokens import estimate_tokens
 
 class CodebaseAgent:
     
-    def __init__(self, repository_path: str):
+    def __init__(self, repository_path: str, index_path: str = None, search_index_path: str = None,
+                 symbol_index_path: str = None, metrics: Metrics = None):
+        """
+        Initialize a CodebaseAgent instance.
+
+        Parameters:
+            repository_path (str): Root of the repository to inspect.
+            index_path (str, optional): File for a persisted directory index. Defaults to keeping
+                                        it in memory. Either way, repeated calls only rescan
+                                        directories whose mtime changed.
+            search_index_path (str, optional): File for a persisted relevance index over file
+                                               contents. Defaults to keeping it in memory.
+            symbol_index_path (str, optional): File for a persisted index of the classes and
+                                               functions in Python files. Defaults to keeping it in memory.
+            metrics (Metrics, optional): Registry for stage timings. Defaults to the shared registry.
+        """
         self.repo_path = repository_path
+        self.directory_index = DirectoryIndex(index_path)
+        self.search_index_path = search_index_path
+        self.relevance_index = None
+        self.symbol_index_path = symbol_index_path
+        self.symbol_index = None
+        self.metrics = metrics or get_metrics()
 
-    def get_directory_structure(self, start_path=None, exclusions=None) -> dict:
+    def get_directory_structure(self, start_path=None, exclusions=None, respect_gitignore=False,
+                                max_depth=None, workers=1) -> dict:
         """
         Get the directory structure starting from `start_path` or the root of the repository.
 
         Parameters:
             start_path (str): The path to start scanning from. Defaults to the root of the repository.
             exclusions (list): List of folder or filenames to exclude.
+            respect_gitignore (bool): Skip paths matched by .gitignore files, and '.git'. Defaults to False.
+            max_depth (int): Deepest level whose contents are listed; 0 lists only `start_path`.
+                             Defaults to no limit.
+            workers (int): Number of threads listing directories in parallel. Defaults to 1.
         
         Returns:
             dict: A dictionary representing the directory structure.
@@ -22,28 +54,95 @@ class CodebaseAgent:
         if exclusions is None:
             exclusions = []
 
-        dir_structure = {}
-        start_path_parts = start_path.split(os.sep)
+        walk_options = {'respect_gitignore': respect_gitignore, 'max_depth': max_depth, 'workers': workers}
+        with self.metrics.span('codebase.directory_structure'):
+            structure = self.directory_index.get_directory_structure(start_path, exclusions, **walk_options)
+            self.directory_index.save()
+            return structure
+
+    def find_relevant_context(self, task_description: str, top_k: int = 5, max_tokens: int = 1500) -> str:
+        """
+        Find the snippets of repository files most relevant to a task.
+
+        The relevance index is built on first use and then only updated for
+        files that changed.
 
-        for root, dirs, files in os.walk(start_path):
-            # Exclude directories and files in the exclusions list
-            dirs[:] = [d for d in dirs if d not in exclusions]
-            files = [f for f in files if f not in exclusions]
+        Parameters:
+            task_description (str): The task to find context for.
+            top_k (int): Maximum number of files to include. Defaults to 5.
+            max_tokens (int): Estimated token budget for the snippets. Defaults to 1500.
 
-            subtree = {}
-            for d in dirs:
-                subtree[d] = {}
-            for f in files:
-                subtree[f] = None  # Files are leaves, hence mapped to None
+        Returns:
+            str: Snippets headed by their path and line range, or '' if nothing matches.
+        """
+        with self.metrics.span('codebase.relevant_context'):
+            return self._updated_relevance_index().relevant_context(task_description, top_k=top_k,
+                                                                    max_tokens=max_tokens)
 
-            path_parts = root.split(os.sep)
+    def find_relevant_files(self, task_description: str, top_k: int = 3, max_tokens: int = 3000) -> Dict[str, str]:
+        """
+        Find the files most relevant to a task and return them whole, e.g. for the model to patch.
 
-            # Skip the parts of the path that are common with start_path
-            relative_parts = path_parts[len(start_path_parts):]
+        Parameters:
+            task_description (str): The task to find files for.
+            top_k (int): Maximum number of files to return. Defaults to 3.
+            max_tokens (int): Estimated token budget for the files; files that do not fit
+                              are left out. Defaults to 3000.
+
+        Returns:
+            Dict[str, str]: Maps each relative path to its content, most relevant first.
+        """
+        with self.metrics.span('codebase.relevant_files'):
+            files = {}
+            used = 0
+            for relative_path, _ in self._updated_relevance_index().search(task_description, top_k=top_k):
+                try:
+                    with open(os.path.join(self.repo_path, relative_path), 'r', encoding='utf-8') as f:
+                        content = f.read()
+                except (OSError, UnicodeDecodeError):
+                    continue
+                cost = estimate_tokens(content)
+                if used + cost > max_tokens:
+                    continue
+                files[relative_path] = content
+                used += cost
+            return files
+
+    def get_api_outline(self, task_description: str = None, max_tokens: int = 1500) -> str:
+        """
+        Outline the classes and functions of the repository's Python files.
+
+        Each file is listed with its public signatures and the first line of
+        their docstrings, which describes far more of the code per token than
+        snippets of the files do. Files are only parsed again when their content
+        changes.
+
+        Parameters:
+            task_description (str, optional): When given, the files most relevant to it are
+                                              outlined first. Defaults to path order.
+            max_tokens (int): Estimated token budget for the outline. Defaults to 1500.
+
+        Returns:
+            str: One outline per file headed by '# <path>', or '' if there are no Python files.
+        """
+        with self.metrics.span('codebase.api_outline'):
+            if self.symbol_index is None:
+                self.symbol_index = SymbolIndex(self.repo_path, index_path=self.symbol_index_path)
+            self.symbol_index.update()
+            self.symbol_index.save()
 
-            parent_dir_subtree = dir_structure
-            for part in relative_parts:
-                parent_dir_subtree = parent_dir_subtree.setdefault(part, {})
-            parent_dir_subtree.update(subtree)
+            paths = self.symbol_index.paths()
+            if task_description:
+                outlined = set(paths)
+                ranked = self._updated_relevance_index().search(task_description, top_k=None)
+                relevant = [path for path, _ in ranked if path in outlined]
+                paths = relevant + sorted(outlined - set(relevant))
+            return self.symbol_index.outline(paths, max_tokens=max_tokens)
 
-        return dir_structure
+    def _updated_relevance_index(self) -> RelevanceIndex:
+        """Return the relevance index, building it on first use and updating it for changed files."""
+        if self.relevance_index is None:
+            self.relevance_index = RelevanceIndex(self.repo_path, index_path=self.search_index_path)
+        self.relevance_index.update()
+        self.relevance_index.save()
+        return self.relevance_index
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from .walker import scan_directory, walk_directory_structure
+
+class DirectoryIndex:
+    """Class for caching directory listings and rescanning only directories whose mtime changed."""
+
+    VERSION = 1
+    # Listings taken this close to a directory's mtime may miss a change made in the
+    # same timestamp tick, so they are rescanned on the next lookup.
+    RACY_WINDOW_NS = 2_000_000_000
+
+    def __init__(self, index_path: Optional[str] = None):
+        """
+        Initialize the index, loading the snapshot at `index_path` if it exists.
+
+        Parameters:
+            index_path (str, optional): File where the snapshot is persisted. Defaults to
+                                        keeping the index in memory only.
+        """
+        self.index_path = index_path
+        self.rescanned = 0
+        self.reused = 0
+        # Maps absolute directory path -> (mtime_ns or None, dirs, files, linked dirs)
+        self._entries: Dict[str, Tuple[Optional[int], List[str], List[str], List[str]]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        if index_path is not None and os.path.exists(index_path):
+            self._load()
+
+    def get_directory_structure(self, start_path: str, exclusions: Iterable[str] = (), **walk_options) -> dict:
+        """
+        Build the nested directory structure rooted at `start_path`.
+
+        The result has the same shape as `CodebaseAgent.get_directory_structure`:
+        directories map to dictionaries and files map to None.
+
+        Parameters:
+            start_path (str): The directory to start scanning from.
+            exclusions (Iterable[str]): Folder or file names to exclude.
+            **walk_options: Passed through to `walk_directory_structure`.
+
+        Returns:
+            dict: A dictionary representing the directory structure.
+        """
+        return walk_directory_structure(start_path, exclusions, list_dir=self.list_dir, **walk_options)
+
+    def list_dir(self, path: str) -> Tuple[List[str], List[str], List[str]]:
+        """
+        List a directory, reusing the cached listing if its mtime is unchanged.
+
+        Parameters:
+            path (str): Absolute path of the directory.
+
+        Returns:
+            Tuple[List[str], List[str], List[str]]: Sub-directories, files and symlinked
+                                                    directories. Empty if unreadable.
+        """
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._forget(path)
+            return [], [], []
+
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == mtime_ns:
+                self.reused += 1
+                return cached[1], cached[2], cached[3]
+
+        dirs, files, linked_dirs = scan_directory(path)
+
+        with self._lock:
+            if cached is not None:
+                for removed in set(cached[1]) - set(dirs):
+                    self._forget(os.path.join(path, removed))
+
+            trusted_mtime = mtime_ns if time.time_ns() - mtime_ns > self.RACY_WINDOW_NS else None
+            self._entries[path] = (trusted_mtime, dirs, files, linked_dirs)
+            self._dirty = True
+            self.rescanned += 1
+        return dirs, files, linked_dirs
+
+    def save(self):
+        """Persist the snapshot to `index_path` if it changed since it was loaded or saved."""
+        if self.index_path is None or not self._dirty:
+            return
+
+        data = {'version': self.VERSION,
+                'directories': {path: list(entry) for path, entry in self._entries.items()}}
+        # Unique per writer, since agents in several threads or processes may share the file
+        temp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.index_path)
+        self._dirty = False
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable directory index {self.index_path}: {e}")
+            return
+
+        if data.get('version') != self.VERSION:
+            return
+        self._entries = {path: tuple(entry) for path, entry in data['directories'].items()}
+
+    def _forget(self, path: str):
+        """Drop the cached listing of `path` and of everything below it."""
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return
+        self._dirty = True
+        for name in entry[1]:
+            self._forget(os.path.join(path, name))
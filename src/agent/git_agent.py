@@ -1,14 +1,20 @@
 import logging
 import os
 import subprocess
-import requests
 import json
+from .github_client import GitHubClient
 
 class GitAgent:
     """Class for managing Git repositories."""
 
+    # Conservative command-line budget for staged paths; Windows allows 32767 characters
+    MAX_ARG_BYTES = 30000
+    # Pathspec magic making a path relative to the repository root, whatever the working
+    # directory, and matched literally, so 'f[1].txt' does not also stage 'f1.txt'
+    PATHSPEC_PREFIX = ':(top,literal)'
+
     def __init__(self, repository_url=None, local_directory=None, 
-                 default_branch='main', api_key=None):
+                 default_branch='main', api_key=None, github_client=None):
         """
         Initialize a GitAgent instance.
 
@@ -18,11 +24,14 @@ class GitAgent:
                                              should be cloned.
             default_branch (str, optional): The default branch to work with. Defaults to 'main'.
             api_key (str, optional): API key for authentication. Defaults to None.
+            github_client (GitHubClient, optional): Client for GitHub REST calls. Defaults to
+                                                    a pooled client for api.github.com.
         """
         self.repository_url = repository_url
         self.local_directory = local_directory
         self.default_branch = default_branch
         self.api_key = api_key
+        self.github = github_client or GitHubClient(api_key)
 
     def create_github_repo(self, repo_name, private=True):
         """
@@ -37,15 +46,6 @@ class GitAgent:
             str: The HTML URL of the created repository if successful, otherwise None.
         """
         
-        # Build the URL endpoint for the GitHub API
-        url = f'https://api.github.com/user/repos'
-        
-        # Set up the headers for API authentication
-        headers = {
-            'Authorization': f'BEARER {self.api_key}',
-            'Content-Type': 'application/json'
-        }
-        
         # Create the payload to be sent in the API request
         payload = {
             'name': repo_name,
@@ -53,7 +53,7 @@ class GitAgent:
         }
 
         # Send a POST request to GitHub API to create a new repository
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        response = self.github.post('/user/repos', data=json.dumps(payload))
 
         # Check if the repository was successfully created
         if response.status_code == 201:
@@ -74,14 +74,8 @@ class GitAgent:
             bool: True if repository exists, otherwise False.
         """
         
-        url = f'https://api.github.com/repos/{username}/{repo_name}'
-        
-        headers = {
-            'Authorization': f'BEARER {self.api_key}',
-            'Content-Type': 'application/json'
-        }
-
-        response = requests.get(url, headers=headers)
+        # Conditional GET: an unchanged repository costs no rate limit
+        response = self.github.get(f'/repos/{username}/{repo_name}')
         
         if response.status_code == 200:
             return True
@@ -107,7 +101,7 @@ class GitAgent:
     def add_files_to_index(self):
         """Add files to the Git index."""
         try:
-            subprocess.run(['git', 'add', '.'], check=True)
+            subprocess.run(['git', 'add', '.'], cwd=self.local_directory, check=True)
             logging.info("Successfully added files to Git index.")
         except subprocess.CalledProcessError as e:
             logging.error(f"Failed to add files to Git index: {e}")
@@ -119,7 +113,7 @@ class GitAgent:
             message (str): The commit message. Defaults to 'Initial commit'.
         """
         try:
-            subprocess.run(['git', 'commit', '-m', message], check=True)
+            subprocess.run(['git', 'commit', '-m', message], cwd=self.local_directory, check=True)
             logging.info("Successfully committed changes.")
         except subprocess.CalledProcessError as e:
             logging.error(f"Failed to commit changes: {e}")
@@ -137,7 +131,7 @@ class GitAgent:
     def add_remote_origin(self, github_url):
         # Check if remote origin already exists
         try:
-            result = subprocess.run(['git', 'remote', 'get-url', 'origin'], 
+            result = subprocess.run(['git', 'remote', 'get-url', 'origin'], cwd=self.local_directory,
                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             if result.returncode == 0:
                 logging.info("Remote origin already exists. Skipping.")
@@ -147,7 +141,7 @@ class GitAgent:
 
         # Add remote origin
         try:
-            subprocess.run(['git', 'remote', 'add', 'origin', github_url], check=True)
+            subprocess.run(['git', 'remote', 'add', 'origin', github_url], cwd=self.local_directory, check=True)
             logging.info(f"Successfully added remote origin: {github_url}")
         except subprocess.CalledProcessError as e:
             logging.error(f"Failed to add remote origin: {e}")
@@ -159,7 +153,7 @@ class GitAgent:
             branch (str): The branch to push to. Defaults to 'main'.
         """
         try:
-            subprocess.run(['git', 'push', '-u', 'origin', branch], check=True)
+            subprocess.run(['git', 'push', '-u', 'origin', branch], cwd=self.local_directory, check=True)
             logging.info(f"Successfully pushed to remote branch: {branch}")
         except subprocess.CalledProcessError as e:
             logging.error(f"Failed to push to remote: {e}")
@@ -180,17 +174,143 @@ class GitAgent:
         except subprocess.CalledProcessError as e:
             logging.error(f"Failed to push new branch {branch_name} to remote: {e}")
 
+    def get_changed_paths(self):
+        """Get the paths with unstaged changes, using a single `git status` call.
+
+        Returns:
+            list: Paths relative to the repository root, including untracked paths
+                  and both sides of renames. None if git failed.
+        """
+        status = self._read_status()
+        return None if status is None else status[0]
+
+    def _read_status(self):
+        """Parse `git status --porcelain -z`.
+
+        Returns:
+            tuple: The paths with unstaged changes and whether anything is already
+                   staged, or None if git failed.
+        """
+        try:
+            result = subprocess.run(['git', 'status', '--porcelain', '-z'], cwd=self.local_directory,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Failed to read git status: {e}")
+            return None
+
+        entries = result.stdout.decode('utf-8', errors='surrogateescape').split('\0')
+        changed = []
+        has_staged = False
+        i = 0
+        while i < len(entries):
+            entry = entries[i]
+            i += 1
+            if len(entry) < 4:
+                continue
+            index_status, worktree_status, path = entry[0], entry[1], entry[3:]
+            # Renames and copies are followed by the original path
+            original = None
+            if index_status in 'RC' or worktree_status in 'RC':
+                original = entries[i]
+                i += 1
+            if index_status not in ' ?':
+                has_staged = True
+            if worktree_status == ' ':
+                continue  # Already staged
+            changed.append(path)
+            if original is not None:
+                changed.append(original)
+        return changed, has_staged
+
+    def stage_changed_files(self, paths=None):
+        """Stage only the changed paths, in chunks that fit the command-line limit.
+
+        Paths are taken relative to the repository root, as `git status` reports them,
+        even when `local_directory` is a subdirectory, and are not treated as globs.
+
+        Parameters:
+            paths (list, optional): Paths to stage. Defaults to `get_changed_paths()`.
+
+        Returns:
+            list: The staged paths, or None if git failed.
+        """
+        if paths is None:
+            paths = self.get_changed_paths()
+            if paths is None:
+                return None
+
+        try:
+            for chunk in self._chunk_paths(paths):
+                pathspecs = [self.PATHSPEC_PREFIX + path for path in chunk]
+                subprocess.run(['git', 'add', '-A', '--'] + pathspecs, cwd=self.local_directory, check=True)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Failed to stage changed files: {e}")
+            return None
+
+        logging.info(f"Staged {len(paths)} changed paths.")
+        return paths
+
+    def commit_and_push_branch(self, branch_name, message, push=True):
+        """Create a branch, stage the changed files, commit and push with as few git calls as possible.
+
+        Every command runs in `local_directory`. Staging uses one `git status` call
+        plus one `git add` per chunk of changed paths. The commit is skipped when
+        nothing changed.
+
+        Parameters:
+            branch_name (str): The branch to create and push.
+            message (str): The commit message.
+            push (bool, optional): Whether to push the branch to origin. Defaults to True.
+
+        Returns:
+            bool: True if every step succeeded, otherwise False.
+        """
+        try:
+            subprocess.run(['git', 'checkout', '-b', branch_name], cwd=self.local_directory, check=True)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Failed to create new branch {branch_name}: {e}")
+            return False
+
+        status = self._read_status()
+        if status is None:
+            return False
+        changed, has_staged = status
+        if self.stage_changed_files(changed) is None:
+            return False
+
+        try:
+            if changed or has_staged:
+                subprocess.run(['git', 'commit', '-m', message], cwd=self.local_directory, check=True)
+                logging.info("Successfully committed changes.")
+            else:
+                logging.info("No changes to commit.")
+            if push:
+                subprocess.run(['git', 'push', '-u', 'origin', branch_name], cwd=self.local_directory, check=True)
+                logging.info(f"Successfully pushed new branch {branch_name} to remote.")
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Failed to commit and push branch {branch_name}: {e}")
+            return False
+        return True
+
+    def _chunk_paths(self, paths):
+        """Split paths into lists whose combined argument size stays under MAX_ARG_BYTES."""
+        chunk, size = [], 0
+        for path in paths:
+            path_size = len(self.PATHSPEC_PREFIX) + len(os.fsencode(path)) + 1
+            if chunk and size + path_size > self.MAX_ARG_BYTES:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(path)
+            size += path_size
+        if chunk:
+            yield chunk
+
     def create_pull_request(self, base_branch, feature_branch, title, description, username, repository):
-        """Create a pull request from feature_branch to base_branch."""
-        
-        # Build the URL endpoint for the GitHub API
-        url = f'https://api.github.com/repos/{username}/{repository}/pulls'
-        
-        # Set up the headers for API authentication
-        headers = {
-            'Authorization': f'BEARER {self.api_key}',
-            'Content-Type': 'application/json'
-        }
+        """Create a pull request from feature_branch to base_branch.
+
+        Returns:
+            bool: True if the pull request was created.
+        """
         
         # Create the payload to be sent in the API request
         payload = {
@@ -201,10 +321,11 @@ class GitAgent:
         }
         
         # Send a POST request to GitHub API to create a new pull request
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        response = self.github.post(f'/repos/{username}/{repository}/pulls', data=json.dumps(payload))
         
         # Check if the pull request was successfully created
         if response.status_code == 201:
             logging.info("Successfully created pull request.")
-        else:
-            logging.error(f"Failed to create pull request. {response.text}")
\ No newline at end of file
+            return True
+        logging.error(f"Failed to create pull request. {response.text}")
+        return False
\ No newline at end of file
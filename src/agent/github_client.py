@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import requests
+from .http_client import HTTPClient
+
+class GitHubClient:
+    """Class for calling the GitHub REST API over pooled connections with ETag caching."""
+
+    def __init__(self, api_key: str, base_url: str = 'https://api.github.com',
+                 http_client: Optional[HTTPClient] = None, min_remaining: int = 1,
+                 max_rate_limit_wait: float = 60.0, max_cached: int = 256):
+        """
+        Initialize a GitHubClient instance.
+
+        Parameters:
+            api_key (str): Token sent in the Authorization header.
+            base_url (str): Root of the REST API. Defaults to 'https://api.github.com'.
+            http_client (HTTPClient, optional): Client used for requests. Defaults to a new pooled client.
+            min_remaining (int): Requests are held back once the remaining rate limit drops
+                                 below this value, until the limit resets. Defaults to 1.
+            max_rate_limit_wait (float): Longest wait for a rate limit reset, in seconds. Defaults to 60.
+            max_cached (int): Number of GET responses kept for conditional requests. Defaults to 256.
+        """
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.http_client = http_client or HTTPClient(read_timeout=30.0)
+        self.min_remaining = min_remaining
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.max_cached = max_cached
+        self.rate_limit_remaining: Optional[int] = None
+        self.rate_limit_reset: Optional[float] = None
+        self.not_modified = 0
+        # Maps URL -> (ETag, response), least recently used first
+        self._etag_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        """
+        Send a conditional GET request.
+
+        A cached response is revalidated with If-None-Match. A 304 reply, which
+        does not count against the rate limit, returns the cached response.
+
+        Parameters:
+            path (str): API path such as '/repos/owner/name'.
+            **kwargs: Passed through to `HTTPClient.request`.
+
+        Returns:
+            requests.Response: The fresh or cached response.
+        """
+        url = self._url(path)
+        headers = self._headers(kwargs.pop('headers', None))
+        with self._lock:
+            cached = self._etag_cache.get(url)
+        if cached is not None:
+            headers['If-None-Match'] = cached[0]
+
+        response = self._send('GET', url, headers=headers, **kwargs)
+
+        with self._lock:
+            if response.status_code == 304 and cached is not None:
+                self.not_modified += 1
+                self._etag_cache.move_to_end(url)
+                return cached[1]
+
+            etag = response.headers.get('ETag')
+            if response.status_code == 200 and etag:
+                self._etag_cache[url] = (etag, response)
+                self._etag_cache.move_to_end(url)
+                while len(self._etag_cache) > self.max_cached:
+                    self._etag_cache.popitem(last=False)
+            else:
+                self._etag_cache.pop(url, None)
+        return response
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        """
+        Send a POST request.
+
+        POSTs create repositories and pull requests, so they are not retried after
+        GitHub may have received them; see `HTTPClient.request`.
+
+        Parameters:
+            path (str): API path such as '/user/repos'.
+            **kwargs: Passed through to `HTTPClient.request`.
+
+        Returns:
+            requests.Response: The response.
+        """
+        headers = self._headers(kwargs.pop('headers', None))
+        kwargs.setdefault('idempotent', False)
+        return self._send('POST', self._url(path), headers=headers, **kwargs)
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        self._wait_for_rate_limit()
+        response = self.http_client.request(method, url, **kwargs)
+        self._record_rate_limit(response.headers)
+        return response
+
+    def _wait_for_rate_limit(self):
+        """Sleep until the rate limit resets when too few requests remain."""
+        with self._lock:
+            remaining, reset = self.rate_limit_remaining, self.rate_limit_reset
+        if remaining is None or reset is None or remaining >= self.min_remaining:
+            return
+
+        delay = reset - time.time()
+        if delay <= 0:
+            return
+        if delay > self.max_rate_limit_wait:
+            logging.warning(f"GitHub rate limit resets in {delay:.0f}s; sending the request anyway.")
+            return
+        logging.info(f"GitHub rate limit nearly used up; waiting {delay:.1f}s for the reset.")
+        time.sleep(delay)
+
+    def _record_rate_limit(self, headers: Dict):
+        """Remember the rate limit headers. A malformed value is forgotten, which turns throttling off."""
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        with self._lock:
+            if remaining is not None:
+                self.rate_limit_remaining = _parse_number(remaining, int)
+            if reset is not None:
+                self.rate_limit_reset = _parse_number(reset, float)
+
+    def _headers(self, extra: Optional[Dict]) -> Dict:
+        headers = {
+            'Authorization': f'BEARER {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+        headers.update(extra or {})
+        return headers
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+def _parse_number(value: str, kind: type):
+    """Convert a header value with `kind`, returning None if it is malformed."""
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        logging.warning(f"Ignoring malformed GitHub rate limit header value {value!r}.")
+        return None
@@ -1,18 +1,41 @@
+import asyncio
 from enum import Enum
+import hashlib
 import json
-import os
+import logging
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import requests
-from typing import Dict, List
+from .hedging import Hedger
+from .http_client import HTTPClient, get_default_client
+from .memory import ConversationMemory
+from .metrics import Metrics, get_metrics
+from .model_router import ModelRouter
+from .prompt_registry import PromptRegistry, get_prompt_registry
+from .rate_limiter import RateLimiter
+from .response_cache import ResponseCache
+from .single_flight import SingleFlight, get_single_flight
+from .streaming import iter_content_deltas
+from .tokens import estimate_message_tokens, estimate_tokens
 
 class Role(Enum):
     """Enum class to define the roles that GPTAgent can take on."""
     PROGRAMMER = "programmer.txt"
     JOKESTER = "jokester.txt"
+    PATCHER = "patcher.txt"
 
 class GPTAgent:
     """Class to manage interactions with GPT-4."""
 
-    def __init__(self, api_key: str, role: Role, enable_memory: bool = False):
+    API_URL = 'https://api.openai.com/v1/chat/completions'
+
+    def __init__(self, api_key: str, role: Role, enable_memory: bool = False,
+                 http_client: Optional[HTTPClient] = None, cache: Optional[ResponseCache] = None,
+                 model: str = 'gpt-4', memory_token_budget: int = 4000,
+                 metrics: Optional[Metrics] = None, api_url: Optional[str] = None,
+                 prompt_registry: Optional[PromptRegistry] = None,
+                 single_flight: Optional[SingleFlight] = None, router: Optional[ModelRouter] = None,
+                 hedger: Optional[Hedger] = None, rate_limiter: Optional[RateLimiter] = None):
         """
         Initialize the GPTAgent with a specific role and optional memory feature.
 
@@ -20,15 +43,59 @@ class GPTAgent:
             api_key (str): The API key for accessing GPT-4.
             role (Role): The role the agent should take on.
             enable_memory (bool): Whether to enable conversational memory. Defaults to False.
+            http_client (HTTPClient, optional): Client used for API calls. Defaults to the
+                                                pooled client shared by all agents.
+            cache (ResponseCache, optional): Cache for API responses. Defaults to no caching.
+            model (str): The model to query when no router is given. Defaults to 'gpt-4'.
+            memory_token_budget (int): Estimated token budget for remembered turns. Defaults to 4000.
+            metrics (Metrics, optional): Registry for request timings and byte counts. Defaults
+                                         to the shared registry.
+            api_url (str, optional): Chat completions endpoint, e.g. a local stand-in server.
+                                     Defaults to `API_URL`.
+            prompt_registry (PromptRegistry, optional): Source of the role prompts. Defaults to
+                                                        the registry shared by all agents.
+            single_flight (SingleFlight, optional): Lets concurrent identical requests share one
+                                                    API call. Defaults to the instance shared
+                                                    by all agents.
+            router (ModelRouter, optional): Chooses the model per request and retries failed
+                                            requests on a fallback model. Defaults to always
+                                            using `model`.
+            hedger (Hedger, optional): Sends a duplicate of a slow request and uses the first
+                                       successful response. Defaults to no hedging.
+            rate_limiter (RateLimiter, optional): Holds each API call until it fits under the
+                                                  account's request and token limits. Share one
+                                                  between all agents. Defaults to no limit.
         """
         self.api_key = api_key
-        self.system_prompt = self._load_system_prompt(role)
-        self.prior_messages = []
+        self.api_url = api_url or self.API_URL
+        self.http_client = http_client or get_default_client()
+        self.cache = cache
+        self.model = model
+        self.role = role
+        self.prompt_registry = prompt_registry or get_prompt_registry()
+        # Load once up front so a missing prompt fails here rather than on the first query
+        self._load_system_prompt(role)
         self.enable_memory = enable_memory
+        self.memory = ConversationMemory(max_tokens=memory_token_budget) if enable_memory else None
+        self.metrics = metrics or get_metrics()
+        self.single_flight = single_flight or get_single_flight()
+        self.router = router
+        self.hedger = hedger
+        self.rate_limiter = rate_limiter
+
+    @property
+    def system_prompt(self) -> str:
+        """The role's system prompt, picking up edits to the prompt file."""
+        return self._load_system_prompt(self.role)
+
+    @property
+    def prior_messages(self) -> List[Dict]:
+        """The remembered messages sent ahead of each new query."""
+        return self.memory.messages() if self.memory is not None else []
 
     def _load_system_prompt(self, role: Role) -> str:
         """
-        Load the system prompt based on the role from a file.
+        Load the system prompt based on the role from the prompt registry.
 
         Parameters:
             role (Role): The role the agent should take on.
@@ -36,54 +103,301 @@ class GPTAgent:
         Returns:
             str: The loaded system prompt.
         """
-        current_directory = os.getcwd()
-        file_path = os.path.join(current_directory, f"src\\agent\\system_prompts\\{role.value}")
-
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File {file_path} does not exist.")
+        return self.prompt_registry.get(role.value)
 
-        with open(file_path, "r") as f:
-            return f.read()
+    def clear_memory(self):
+        """Forget the remembered conversation, e.g. before an unrelated task."""
+        if self.memory is not None:
+            self.memory.clear()
 
-    def ask_query(self, user_query: str) -> str:
+    def ask_query(self, user_query: str, use_cache: bool = True) -> str:
         """
         Send a query to GPT-4 and return its response.
 
         Parameters:
             user_query (str): The query from the user.
+            use_cache (bool): Whether a cached response may be returned. Defaults to True.
+
+        Returns:
+            str: The response from GPT-4.
+        """
+        response = self._send_request_to_gpt(user_query, use_cache=use_cache)
+        content = self._parse_response(response)
+        self._remember(user_query, content)
+        return content
+
+    async def ask_query_async(self, user_query: str, use_cache: bool = True) -> str:
+        """
+        Send a query to GPT-4 from a coroutine and return its response.
+
+        The HTTP call runs in the event loop's default executor. Concurrent
+        identical requests, from coroutines or threads, share one API call.
+
+        Parameters:
+            user_query (str): The query from the user.
+            use_cache (bool): Whether a cached response may be returned. Defaults to True.
 
         Returns:
             str: The response from GPT-4.
         """
-        response = self._send_request_to_gpt(user_query)
-        return self._parse_response(response)
+        body, cached = self._prepare_request(user_query, use_cache)
+        if cached is not None:
+            response = cached
+        else:
+            loop = asyncio.get_running_loop()
+            response, shared = await self.single_flight.do_async(
+                self._request_key(body), lambda: loop.run_in_executor(None, self._post_request, body))
+            if shared:
+                self.metrics.add('gpt.coalesced')
+        content = self._parse_response(response)
+        self._remember(user_query, content)
+        return content
+
+    def stream_query(self, user_query: str, use_cache: bool = True) -> Iterator[str]:
+        """
+        Send a query to GPT-4 and yield its response as the pieces arrive.
+
+        Joining the yielded pieces gives the same string `ask_query` returns.
+        A cached response is yielded as a single piece.
 
-    def _send_request_to_gpt(self, user_query: str) -> Dict:
+        Parameters:
+            user_query (str): The query from the user.
+            use_cache (bool): Whether a cached response may be returned. Defaults to True.
+
+        Returns:
+            Iterator[str]: The content fragments of the response, in order.
+        """
+        body, cached = self._prepare_request(user_query, use_cache, stream=True)
+        if cached is not None:
+            content = self._parse_response(cached)
+            self._remember(user_query, content)
+            yield content
+            return
+
+        self._count_request_bytes(body)
+        start = time.monotonic()
+        response, model, reserved = self._post_chat(body, stream=True)
+        try:
+            if response.status_code != 200:
+                logging.error(f'Error: {response.status_code}, {response.text}')
+                self.metrics.add('gpt.errors')
+                return
+
+            pieces = []
+            for piece in iter_content_deltas(response.iter_lines()):
+                if not pieces:
+                    self.metrics.observe('gpt.stream.first_chunk', time.monotonic() - start)
+                pieces.append(piece)
+                yield piece
+        finally:
+            response.close()
+        elapsed = time.monotonic() - start
+        self.metrics.observe('gpt.stream', elapsed)
+        if self.router is not None:
+            self.router.record(model, elapsed)
+
+        content = ''.join(pieces)
+        self.metrics.add('gpt.response_bytes', len(content.encode('utf-8')))
+        if self.rate_limiter is not None:
+            # Streamed replies carry no usage, so the reply is measured instead
+            self.rate_limiter.record_usage(reserved, {
+                'prompt_tokens': estimate_message_tokens(body['messages']),
+                'completion_tokens': estimate_tokens(content)})
+        self._remember(user_query, content)
+        if self.cache is not None:
+            result = {'choices': [{'message': {'role': 'assistant', 'content': content}}]}
+            self.cache.put(ResponseCache.make_key(model, body['messages']), result, elapsed=elapsed)
+
+    def _send_request_to_gpt(self, user_query: str, use_cache: bool = True) -> Dict:
         """
         Send a request to the GPT-4 API.
 
+        When a cache is configured, a cached response for the same model and
+        messages is returned without calling the API. With `use_cache` set to
+        False the lookup is skipped, but the fresh response still replaces the
+        cached one. A request identical to one already in flight waits for that
+        call and returns its response.
+
         Parameters:
             user_query (str): The query from the user.
+            use_cache (bool): Whether a cached response may be returned. Defaults to True.
 
         Returns:
             Dict: The response from the API, parsed as a dictionary.
         """
-        url = 'https://api.openai.com/v1/chat/completions'
-        headers = {
+        body, cached = self._prepare_request(user_query, use_cache)
+        if cached is not None:
+            return cached
+
+        result, shared = self.single_flight.do(self._request_key(body), lambda: self._post_request(body))
+        if shared:
+            self.metrics.add('gpt.coalesced')
+        return result
+
+    def _prepare_request(self, user_query: str, use_cache: bool,
+                         stream: bool = False) -> Tuple[Dict, Optional[Dict]]:
+        """
+        Build the request body, choosing its model, and look it up in the cache.
+
+        Returns:
+            Tuple[Dict, Optional[Dict]]: The body, and the cached response or None on a miss.
+        """
+        messages = self._build_messages(user_query)
+        model = self.router.choose(self.role.name.lower(), messages) if self.router is not None else self.model
+        body = {'model': model, 'messages': messages}
+        if stream:
+            body['stream'] = True
+
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(ResponseCache.make_key(model, messages))
+            if cached is not None:
+                self.metrics.add('gpt.cache_hits')
+                return body, cached
+        return body, None
+
+    def _request_key(self, body: Dict) -> str:
+        """Return the key under which identical in-flight requests are shared."""
+        # The API key is part of the identity so different accounts never share a response
+        payload = json.dumps({'url': self.api_url, 'api_key': self.api_key, 'body': body},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _post_request(self, body: Dict) -> Dict:
+        """Call the API with `body`, then parse and cache the response."""
+        self._count_request_bytes(body)
+        start = time.monotonic()
+        with self.metrics.span('gpt.request'):
+            if self.hedger is None:
+                response, model, reserved = self._post_chat(body)
+            else:
+                response, model, reserved = self.hedger.call(lambda: self._post_chat(body),
+                                                             is_success=lambda result: result[0].status_code == 200,
+                                                             discard=self._discard_attempt)
+        if response.status_code != 200:
+            self.metrics.add('gpt.errors')
+            return {'error': f'Error: {response.status_code}, {response.text}'}
+
+        self.metrics.add('gpt.response_bytes', len(response.text.encode('utf-8')))
+        with self.metrics.span('gpt.parse'):
+            result = json.loads(response.text)
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_usage(reserved, result.get('usage'))
+        if self.cache is not None:
+            # Cached under the model that answered, which differs after a fallback
+            self.cache.put(ResponseCache.make_key(model, body['messages']), result,
+                           elapsed=time.monotonic() - start)
+        return result
+
+    def _post_chat(self, body: Dict, stream: bool = False) -> Tuple[requests.Response, str, int]:
+        """
+        Post a request body to the API.
+
+        Each attempt first waits for the rate limiter; the tokens reserved for a
+        failed attempt are given back. With a router, a request that still fails
+        after the HTTP client's retries is sent again on the model's fallback, and
+        every attempt is recorded. The latency of a successful stream is recorded
+        by the caller once it ends.
+
+        Parameters:
+            body (Dict): The request body.
+            stream (bool): Whether to stream the response. Defaults to False.
+
+        Returns:
+            Tuple[requests.Response, str, int]: The last response, the model that produced it
+                                                and the tokens reserved for it, which the
+                                                caller corrects with the actual usage.
+        """
+        model = body['model']
+        tried = {model}
+        while True:
+            reserved = self._reserve_tokens(body)
+            start = time.monotonic()
+            try:
+                response = self.http_client.post(self.api_url, headers=self._headers(), json=body, stream=stream)
+            except Exception:
+                self._release_tokens(reserved)
+                fallback = self._fallback(model, tried, time.monotonic() - start)
+                if fallback is None:
+                    raise
+            else:
+                if response.status_code == 200:
+                    if self.router is not None and not stream:
+                        self.router.record(model, time.monotonic() - start)
+                    return response, model, reserved
+                self._release_tokens(reserved)
+                fallback = self._fallback(model, tried, time.monotonic() - start)
+                if fallback is None:
+                    return response, model, 0
+                response.close()
+
+            logging.warning(f'Request to {model} failed; retrying on {fallback}.')
+            body = dict(body, model=fallback)
+            model = fallback
+            tried.add(model)
+
+    def _discard_attempt(self, attempt: Tuple[requests.Response, str, int]):
+        """Close the response of a hedged attempt that lost, settling the tokens reserved for it."""
+        response, _, reserved = attempt
+        try:
+            if self.rate_limiter is not None and reserved:
+                # The losing copy was still answered, so the account was charged for it
+                try:
+                    usage = json.loads(response.text).get('usage')
+                except (ValueError, AttributeError):
+                    usage = None
+                self.rate_limiter.record_usage(reserved, usage)
+        finally:
+            response.close()
+
+    def _reserve_tokens(self, body: Dict) -> int:
+        """Wait for the rate limiter to admit `body` and return the tokens reserved for it."""
+        if self.rate_limiter is None:
+            return 0
+        return self.rate_limiter.acquire(estimate_message_tokens(body['messages']))
+
+    def _release_tokens(self, reserved: int):
+        """Give back the tokens reserved for an attempt that was rejected."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_usage(reserved, {'total_tokens': 0})
+
+    def _fallback(self, model: str, tried: Set[str], seconds: float) -> Optional[str]:
+        """Record a failed attempt and return the model to retry on, if there is an untried one."""
+        if self.router is None:
+            return None
+        self.router.record(model, seconds, ok=False)
+        fallback = self.router.fallback(model)
+        return fallback if fallback not in tried else None
+
+    def _count_request_bytes(self, body: Dict):
+        """Record the size of a request body. Skips the serialization when metrics are off."""
+        if self.metrics.enabled:
+            self.metrics.add('gpt.request_bytes', len(json.dumps(body).encode('utf-8')))
+
+    def _headers(self) -> Dict:
+        """Return the headers for an API request."""
+        return {
             'Content-Type': 'application/json',
             'Authorization': f'Bearer {self.api_key}'
         }
 
-        messages = [{'role': 'system', 'content': self.system_prompt},
-                    {'role': 'user', 'content': user_query}]
+    def _build_messages(self, user_query: str) -> List[Dict]:
+        """
+        Build the message list sent to the API.
 
-        if self.enable_memory:
-            messages.extend(self.prior_messages)
+        Parameters:
+            user_query (str): The query from the user.
 
-        body = {'model': 'gpt-4', 'messages': messages}
+        Returns:
+            List[Dict]: The system prompt, any remembered messages and then the user query.
+        """
+        return ([{'role': 'system', 'content': self.system_prompt}] +
+                self.prior_messages +
+                [{'role': 'user', 'content': user_query}])
 
-        response = requests.post(url, headers=headers, json=body)
-        return json.loads(response.text) if response.status_code == 200 else {'error': f'Error: {response.status_code}, {response.text}'}
+    def _remember(self, user_query: str, content: str):
+        """Record a completed turn when memory is enabled. Failed requests are not recorded."""
+        if self.memory is not None and content:
+            self.memory.add_turn(user_query, content)
 
     def _parse_response(self, response: Dict) -> str:
         """
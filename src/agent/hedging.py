@@ -0,0 +1,157 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+from .metrics import Metrics, get_metrics
+
+class Hedger:
+    """Class for sending a duplicate of a slow call and using whichever copy finishes first."""
+
+    def __init__(self, delay: Optional[float] = None, quantile: float = 0.95, window: int = 200,
+                 min_samples: int = 20, max_ratio: float = 0.1, burst: int = 5, max_in_flight: int = 4,
+                 max_workers: int = 32, metrics: Optional[Metrics] = None):
+        """
+        Initialize a Hedger.
+
+        Parameters:
+            delay (float, optional): Seconds to wait before sending the duplicate. Defaults to
+                                     the `quantile` of recent call durations.
+            quantile (float): Quantile of recent durations used as the learned delay. Defaults to 0.95.
+            window (int): Recent durations the learned delay is computed from. Defaults to 200.
+            min_samples (int): Durations needed before a learned delay is used; until then
+                               nothing is hedged. Defaults to 20.
+            max_ratio (float): Long-run limit on duplicates per call, e.g. 0.1 for at most 10%
+                               extra load. Defaults to 0.1.
+            burst (int): Duplicates that may be sent in a row before `max_ratio` applies. Defaults to 5.
+            max_in_flight (int): Duplicates running at once. Defaults to 4.
+            max_workers (int): Threads shared by every hedged call, first attempts and duplicates
+                               alike. Should exceed the number of callers by `max_in_flight`.
+                               Defaults to 32.
+            metrics (Metrics, optional): Registry for the hedge counters. Defaults to the shared registry.
+        """
+        self.static_delay = delay
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.metrics = metrics or get_metrics()
+        self._lock = threading.Lock()
+        self._durations = deque(maxlen=window)
+        # Token bucket refilled by `max_ratio` per call; each duplicate spends one token
+        self._budget = float(burst)
+        self._in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+
+    def delay(self) -> Optional[float]:
+        """Return the current hedging delay in seconds, or None while too little is known to hedge."""
+        if self.static_delay is not None:
+            return self.static_delay
+        with self._lock:
+            if len(self._durations) < self.min_samples:
+                return None
+            samples = sorted(self._durations)
+        return samples[max(1, math.ceil(self.quantile * len(samples))) - 1]
+
+    def call(self, function: Callable[[], Any], is_success: Callable[[Any], bool] = lambda result: True,
+             discard: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Call `function`, and call it again in parallel if the first call is slow.
+
+        The first successful result is returned. As soon as it is, the other
+        call is cancelled if it has not started yet, or, if it already finished,
+        its result is passed to `discard`. A call in progress cannot be
+        interrupted mid-request, so its result is discarded the moment it
+        arrives. If every call fails, the first call's result is returned or its
+        exception raised.
+
+        Parameters:
+            function (Callable): Makes the call. Must be safe to run twice at once.
+            is_success (Callable, optional): Whether a result may be used. Defaults to always.
+            discard (Callable, optional): Releases an unused result, e.g. closes a response.
+
+        Returns:
+            Any: The winning result.
+        """
+        self.metrics.add('hedge.calls')
+        with self._lock:
+            self._budget = min(self.burst, self._budget + self.max_ratio)
+
+        delay = self.delay()
+        if delay is None:
+            # Nothing to hedge against yet, so skip the extra thread
+            start = time.monotonic()
+            try:
+                return function()
+            finally:
+                self._record(time.monotonic() - start)
+
+        attempts = [self._start(function)]
+        if not wait(attempts, timeout=delay).done:
+            if self._acquire():
+                self.metrics.add('hedge.fired')
+                hedge = self._start(function)
+                hedge.add_done_callback(lambda future: self._release())
+                attempts.append(hedge)
+            else:
+                self.metrics.add('hedge.suppressed')
+
+        winner, pending = None, set(attempts)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and is_success(future.result()):
+                    winner = future
+                    break
+
+        if winner is not None and winner is not attempts[0]:
+            self.metrics.add('hedge.won')
+        chosen = winner or attempts[0]
+        for future in attempts:
+            if future is chosen or future.cancel():
+                continue
+            self.metrics.add('hedge.discarded')
+            if discard is not None:
+                # Runs at once for a finished call, otherwise as soon as it finishes
+                future.add_done_callback(lambda future: future.exception() is None and discard(future.result()))
+        return chosen.result()
+
+    def close(self):
+        """Stop the shared threads. Calls that have not started are cancelled; running ones finish in the background."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _start(self, function: Callable[[], Any]) -> Future:
+        """Run `function` on the shared executor, recording how long it takes."""
+        def run():
+            start = time.monotonic()
+            try:
+                return function()
+            finally:
+                self._record(time.monotonic() - start)
+
+        return self._executor.submit(run)
+
+    def _record(self, seconds: float):
+        with self._lock:
+            self._durations.append(seconds)
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self._budget < 1 or self._in_flight >= self.max_in_flight:
+                return False
+            self._budget -= 1
+            self._in_flight += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
@@ -0,0 +1,140 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+class HTTPClient:
+    """Class for sending HTTP requests over a pooled keep-alive session with retries."""
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, connect_timeout: float = 5.0, read_timeout: float = 120.0,
+                 max_retries: int = 3, backoff_factor: float = 0.5, max_backoff: float = 30.0,
+                 pool_maxsize: int = 10, retry_statuses: Iterable[int] = RETRY_STATUSES):
+        """
+        Initialize an HTTPClient with its own connection pool.
+
+        Parameters:
+            connect_timeout (float): Seconds to wait for a connection to be established. Defaults to 5.
+            read_timeout (float): Seconds to wait between bytes of the response. Defaults to 120.
+            max_retries (int): Number of retries after the first attempt. Defaults to 3.
+            backoff_factor (float): Base delay in seconds for exponential backoff. Defaults to 0.5.
+            max_backoff (float): Upper bound for a single computed backoff delay. Defaults to 30.
+            pool_maxsize (int): Number of keep-alive connections kept per host. Defaults to 10.
+            retry_statuses (Iterable[int]): Status codes that trigger a retry.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_statuses = frozenset(retry_statuses)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request. See `request` for details."""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request. See `request` for details."""
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, idempotent: bool = True, **kwargs) -> requests.Response:
+        """
+        Send a request, retrying connection errors, timeouts and retryable status codes.
+
+        Retries wait for the `Retry-After` header when the server sends one, and
+        otherwise back off exponentially with full jitter.
+
+        A request that is not idempotent, e.g. a POST that creates something, is
+        only retried when it cannot have been handled: the connection was never
+        made, or the server answered 429. A read timeout or 5xx could come after
+        the server acted on it, so retrying could do it twice.
+
+        Parameters:
+            method (str): The HTTP method.
+            url (str): The URL to send the request to.
+            idempotent (bool): Whether sending the request twice is harmless. Defaults to True.
+            **kwargs: Passed through to `requests.Session.request`.
+
+        Returns:
+            requests.Response: The first non-retryable response, or the last response
+                               once the retries are used up.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries or not (idempotent or self._failed_to_connect(e)):
+                    raise
+                delay = self._backoff_delay(attempt)
+                logging.warning(f"{method} {url} failed ({e}); retrying in {delay:.2f}s.")
+            else:
+                retryable = response.status_code in self.retry_statuses and (idempotent or response.status_code == 429)
+                if not retryable or attempt == self.max_retries:
+                    return response
+                retry_after = self._parse_retry_after(response.headers.get('Retry-After'))
+                delay = retry_after if retry_after is not None else self._backoff_delay(attempt)
+                logging.warning(f"{method} {url} returned {response.status_code}; retrying in {delay:.2f}s.")
+                response.close()
+
+            time.sleep(delay)
+
+    def close(self):
+        """Close every pooled connection."""
+        self.session.close()
+
+    @staticmethod
+    def _failed_to_connect(error: Exception) -> bool:
+        """Whether a request error happened before the request reached the server."""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        # requests wraps urllib3's MaxRetryError, whose reason is the underlying error
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Return a random delay between 0 and the capped exponential backoff for `attempt`."""
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """
+        Parse a `Retry-After` header given either as seconds or as an HTTP date.
+
+        Returns:
+            Optional[float]: Seconds to wait, or None if the header is missing or invalid.
+        """
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client() -> HTTPClient:
+    """Return the process-wide HTTPClient shared by agents that are not given their own."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HTTPClient()
+        return _default_client
@@ -0,0 +1,232 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+Job = namedtuple('Job', ['id', 'filename', 'content_hash', 'attempts'])
+
+class JobJournal:
+    """Class for recording request jobs in SQLite so work survives crashes and is shared between processes."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            filename TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            owner TEXT,
+            lease_expires REAL,
+            created REAL NOT NULL,
+            started REAL,
+            finished REAL,
+            deduplicated INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS jobs_open ON jobs (filename, content_hash)
+            WHERE status IN ('pending', 'running');
+        CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+        CREATE INDEX IF NOT EXISTS jobs_done_hash ON jobs (content_hash) WHERE status = 'done';
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, max_attempts: int = 3):
+        """
+        Open or create the journal.
+
+        Parameters:
+            path (str): SQLite database file. Every process sharing it sees the same jobs.
+            lease_seconds (float): How long a claim lasts without being renewed. A job whose
+                                   worker crashed is claimable again once its lease expires.
+                                   Defaults to 300.
+            max_attempts (int): Claims allowed per job before it is marked failed. Defaults to 3.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # sqlite3 connections may not be shared between threads, so each thread opens its own
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+
+    @staticmethod
+    def hash_content(content: str) -> str:
+        """Return the hash that identifies identical request texts."""
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def enqueue(self, filename: str, content: str) -> int:
+        """
+        Record a request, unless the same file with the same content is already pending or running.
+
+        Parameters:
+            filename (str): Name of the request file.
+            content (str): The request text.
+
+        Returns:
+            int: The id of the new or existing open job.
+        """
+        content_hash = self.hash_content(content)
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO jobs (filename, content_hash, status, created) VALUES (?, ?, 'pending', ?)",
+                (filename, content_hash, time.time()))
+            row = connection.execute(
+                "SELECT id FROM jobs WHERE filename = ? AND content_hash = ? AND status IN ('pending', 'running')",
+                (filename, content_hash)).fetchone()
+        return row[0]
+
+    def claim(self, owner: str, job_id: Optional[int] = None) -> Optional[Job]:
+        """
+        Lease a pending job, or a running job whose lease expired.
+
+        Parameters:
+            owner (str): Identifies the claiming worker, e.g. host, process and thread.
+            job_id (int, optional): Claim this job only. Defaults to the oldest claimable job.
+
+        Returns:
+            Optional[Job]: The claimed job, or None if nothing is claimable.
+        """
+        now = time.time()
+        claimable = "(status = 'pending' OR (status = 'running' AND lease_expires < ?))"
+        with self._transaction() as connection:
+            while True:
+                if job_id is None:
+                    row = connection.execute(
+                        f"SELECT id, filename, content_hash, attempts FROM jobs WHERE {claimable} "
+                        "ORDER BY id LIMIT 1", (now,)).fetchone()
+                else:
+                    row = connection.execute(
+                        f"SELECT id, filename, content_hash, attempts FROM jobs WHERE id = ? AND {claimable}",
+                        (job_id, now)).fetchone()
+                if row is None:
+                    return None
+
+                job = Job(row[0], row[1], row[2], row[3] + 1)
+                if job.attempts <= self.max_attempts:
+                    break
+                # Its workers kept dying before finishing it
+                connection.execute(
+                    "UPDATE jobs SET status = 'failed', owner = NULL, lease_expires = NULL, finished = ?, "
+                    "error = COALESCE(error, 'Lease expired too often') WHERE id = ?", (now, job.id))
+                if job_id is not None:
+                    return None
+
+            connection.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, lease_expires = ?, attempts = ?, started = ? "
+                "WHERE id = ?", (owner, now + self.lease_seconds, job.attempts, now, job.id))
+        return job
+
+    def renew(self, job_id: int, owner: str) -> bool:
+        """Extend a lease. Returns False if the job is no longer leased to `owner`."""
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id, owner))
+        return cursor.rowcount == 1
+
+    @contextmanager
+    def keep_alive(self, job_id: int, owner: str):
+        """Renew the lease in the background while the block runs, for jobs longer than a lease."""
+        stop = threading.Event()
+
+        def renew_until_stopped():
+            while not stop.wait(self.lease_seconds / 3):
+                if not self.renew(job_id, owner):
+                    logging.warning(f"Lost the lease on job {job_id}.")
+                    return
+
+        thread = threading.Thread(target=renew_until_stopped, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, job_id: int, owner: str, result: str, deduplicated: bool = False) -> bool:
+        """Mark a leased job done and store its result. Returns False if the lease was lost."""
+        return self._finish(job_id, owner, "status = 'done', result = ?, deduplicated = ?",
+                            (result, int(deduplicated)))
+
+    def fail(self, job_id: int, owner: str, error: str) -> bool:
+        """
+        Record a failed attempt. The job is retried until it has used `max_attempts`.
+
+        Returns:
+            bool: False if the lease was lost.
+        """
+        return self._finish(job_id, owner,
+                            "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, error = ?",
+                            (self.max_attempts, error))
+
+    def cancel(self, job_id: int, owner: str, reason: str) -> bool:
+        """Close a leased job without a result, e.g. because its request file is gone."""
+        return self._finish(job_id, owner, "status = 'cancelled', error = ?", (reason,))
+
+    def find_result(self, content_hash: str) -> Optional[str]:
+        """Return the result of an earlier job with the same content, if one finished."""
+        row = self._connection().execute(
+            "SELECT result FROM jobs WHERE content_hash = ? AND status = 'done' ORDER BY id DESC LIMIT 1",
+            (content_hash,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of jobs in each status."""
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def jobs(self, status: Optional[str] = None) -> List[Dict]:
+        """Return every job, or those with `status`, oldest first, with attempts and timings."""
+        query = ("SELECT id, filename, content_hash, status, attempts, owner, created, started, finished, "
+                 "deduplicated, error FROM jobs")
+        if status is None:
+            cursor = self._connection().execute(query + " ORDER BY id")
+        else:
+            cursor = self._connection().execute(query + " WHERE status = ? ORDER BY id", (status,))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        """Close this thread's connection."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _finish(self, job_id: int, owner: str, assignments: str, parameters: tuple) -> bool:
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                f"UPDATE jobs SET {assignments}, owner = NULL, lease_expires = NULL, finished = ? "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                parameters + (time.time(), job_id, owner))
+        if cursor.rowcount != 1:
+            logging.warning(f"Job {job_id} is no longer leased to {owner}.")
+            return False
+        return True
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit mode; writes are grouped explicitly by `_transaction`
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=FULL")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in one write transaction on this thread's connection."""
+        connection = self._connection()
+        # IMMEDIATE takes the write lock up front, so two claims cannot pick the same job
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
@@ -0,0 +1,90 @@
+import threading
+from typing import Callable, Dict, List, Optional
+from .tokens import TOKENS_PER_MESSAGE, estimate_tokens
+
+class ConversationMemory:
+    """Class to keep the recent turns of a conversation within a token budget."""
+
+    SUMMARY_PREFIX = 'Summary of the earlier conversation: '
+
+    def __init__(self, max_tokens: int = 4000,
+                 summarizer: Optional[Callable[[str, List[Dict]], str]] = None):
+        """
+        Initialize an empty memory.
+
+        Parameters:
+            max_tokens (int): Estimated token budget for the remembered messages. Defaults to 4000.
+            summarizer (Callable[[str, List[Dict]], str], optional): Called with the previous
+                summary and the evicted messages, returns the new summary. Defaults to dropping
+                evicted turns.
+        """
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.summary = ''
+        self._turns: List[List[Dict]] = []
+        self._token_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def token_count(self) -> int:
+        """Estimated tokens of the messages returned by `messages`."""
+        with self._lock:
+            return self._token_count + self._summary_tokens()
+
+    def add_turn(self, user_content: str, assistant_content: str):
+        """
+        Record a user query and the assistant's answer, evicting older turns if needed.
+
+        Parameters:
+            user_content (str): The query that was sent.
+            assistant_content (str): The response that was received.
+        """
+        turn = [{'role': 'user', 'content': user_content},
+                {'role': 'assistant', 'content': assistant_content}]
+        with self._lock:
+            self._turns.append(turn)
+            self._token_count += self._turn_tokens(turn)
+            self._evict()
+
+    def messages(self) -> List[Dict]:
+        """
+        Return the remembered messages, oldest first.
+
+        Returns:
+            List[Dict]: A summary message if turns were summarized, followed by the kept turns.
+        """
+        with self._lock:
+            messages = []
+            if self.summary:
+                messages.append({'role': 'system', 'content': self.SUMMARY_PREFIX + self.summary})
+            for turn in self._turns:
+                messages.extend(dict(message) for message in turn)
+            return messages
+
+    def clear(self):
+        """Forget every turn and the summary."""
+        with self._lock:
+            self._turns = []
+            self._token_count = 0
+            self.summary = ''
+
+    def _evict(self):
+        evicted = []
+        while self._turns and self._token_count + self._summary_tokens() > self.max_tokens:
+            turn = self._turns.pop(0)
+            self._token_count -= self._turn_tokens(turn)
+            evicted.extend(turn)
+
+        if evicted and self.summarizer is not None:
+            self.summary = self.summarizer(self.summary, evicted)
+            if self._token_count + self._summary_tokens() > self.max_tokens:
+                self.summary = ''
+
+    def _summary_tokens(self) -> int:
+        if not self.summary:
+            return 0
+        return TOKENS_PER_MESSAGE + estimate_tokens(self.SUMMARY_PREFIX + self.summary)
+
+    @staticmethod
+    def _turn_tokens(turn: List[Dict]) -> int:
+        return sum(TOKENS_PER_MESSAGE + estimate_tokens(message['content']) for message in turn)
@@ -0,0 +1,212 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+class _Span:
+    """Times a block and records the duration under the span's name."""
+
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics.add(f'{self.name}.errors')
+        return False
+
+class _NullSpan:
+    """Shared span used when metrics are disabled, so a disabled span allocates nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class Metrics:
+    """Class for collecting stage latencies and counters, exportable as JSON lines or Prometheus text."""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, enabled: bool = True, max_samples: int = 2048):
+        """
+        Initialize a Metrics registry.
+
+        Parameters:
+            enabled (bool): Whether anything is recorded. A disabled registry returns a
+                            shared no-op span and ignores counters. Defaults to True.
+            max_samples (int): Latest durations kept per span for the percentiles. The
+                               count and sum always cover every observation. Defaults to 2048.
+        """
+        self.enabled = enabled
+        self.max_samples = max_samples
+        # Maps span name -> [count, total seconds, recent durations]
+        self._spans: Dict[str, list] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str):
+        """
+        Time a block of code.
+
+        Usage:
+            with metrics.span('gpt.request'):
+                ...
+
+        Parameters:
+            name (str): Dotted stage name, e.g. 'codebase.directory_structure'.
+
+        Returns:
+            A context manager. If the block raises, '<name>.errors' is incremented too.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name: str, seconds: float):
+        """Record one duration for a span."""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._spans.get(name)
+            if entry is None:
+                entry = self._spans[name] = [0, 0.0, deque(maxlen=self.max_samples)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2].append(seconds)
+
+    def add(self, name: str, value: float = 1):
+        """Increase a counter, e.g. 'gpt.request_bytes'."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def summary(self, name: str) -> Optional[Dict]:
+        """
+        Summarize a span.
+
+        Parameters:
+            name (str): The span name.
+
+        Returns:
+            Dict: 'count', 'sum', 'p50', 'p95' and 'p99' in seconds, or None if never observed.
+        """
+        with self._lock:
+            entry = self._spans.get(name)
+            if entry is None:
+                return None
+            count, total, samples = entry[0], entry[1], sorted(entry[2])
+        result = {'count': count, 'sum': total}
+        for quantile in self.QUANTILES:
+            result[f'p{round(quantile * 100)}'] = _percentile(samples, quantile)
+        return result
+
+    def snapshot(self) -> Dict:
+        """
+        Return every span summary and counter.
+
+        Returns:
+            Dict: {'spans': {name: summary}, 'counters': {name: value}}.
+        """
+        with self._lock:
+            names = sorted(self._spans)
+            counters = dict(sorted(self._counters.items()))
+        return {'spans': {name: self.summary(name) for name in names}, 'counters': counters}
+
+    def to_json_lines(self) -> str:
+        """
+        Export the metrics as JSON lines, one object per span or counter.
+
+        Returns:
+            str: Lines such as {"type": "span", "name": ..., "count": ..., "p95": ...}.
+        """
+        timestamp = time.time()
+        snapshot = self.snapshot()
+        lines = []
+        for name, summary in snapshot['spans'].items():
+            lines.append(json.dumps({'type': 'span', 'name': name, 'timestamp': timestamp, **summary}))
+        for name, value in snapshot['counters'].items():
+            lines.append(json.dumps({'type': 'counter', 'name': name, 'timestamp': timestamp, 'value': value}))
+        return ''.join(line + '\n' for line in lines)
+
+    def write_json_lines(self, path: str):
+        """Append the JSON lines export to a file."""
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(self.to_json_lines())
+
+    def to_prometheus(self, prefix: str = 'saga') -> str:
+        """
+        Export the metrics in the Prometheus text format.
+
+        Spans become summaries named '<prefix>_<name>_seconds' with quantile labels,
+        and counters become '<prefix>_<name>_total'.
+
+        Parameters:
+            prefix (str): Prepended to every metric name. Defaults to 'saga'.
+
+        Returns:
+            str: The exposition text.
+        """
+        snapshot = self.snapshot()
+        lines: List[str] = []
+        for name, summary in snapshot['spans'].items():
+            metric = f'{prefix}_{_metric_name(name)}_seconds'
+            lines.append(f'# TYPE {metric} summary')
+            for quantile in self.QUANTILES:
+                value = summary[f'p{round(quantile * 100)}']
+                lines.append(f'{metric}{{quantile="{quantile}"}} {_format_value(value)}')
+            lines.append(f'{metric}_sum {_format_value(summary["sum"])}')
+            lines.append(f'{metric}_count {summary["count"]}')
+        for name, value in snapshot['counters'].items():
+            metric = f'{prefix}_{_metric_name(name)}_total'
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {_format_value(value)}')
+        return ''.join(line + '\n' for line in lines)
+
+    def reset(self):
+        """Forget every recorded value."""
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+def _percentile(sorted_samples: List[float], quantile: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return math.nan
+    rank = max(1, math.ceil(quantile * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+def _metric_name(name: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and math.isnan(value):
+        return 'NaN'
+    return repr(value) if isinstance(value, float) else str(value)
+
+_default_metrics = Metrics(enabled=os.environ.get('SAGA_METRICS', '1') != '0')
+
+def get_metrics() -> Metrics:
+    """
+    Return the registry shared by all agents.
+
+    It is enabled unless the SAGA_METRICS environment variable is set to '0'.
+    """
+    return _default_metrics
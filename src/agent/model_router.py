@@ -0,0 +1,172 @@
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque, namedtuple
+from typing import Dict, List, Optional
+from .metrics import Metrics, get_metrics
+from .tokens import estimate_message_tokens
+
+# A routing rule: use `model` for prompts up to `max_prompt_tokens` (None for any size)
+Route = namedtuple('Route', ['model', 'max_prompt_tokens'])
+
+class ModelRouter:
+    """Class for choosing the model for each request by role and prompt size, avoiding slow or failing models."""
+
+    def __init__(self, routes: Optional[Dict[str, List[Route]]] = None, default_model: str = 'gpt-4',
+                 fallbacks: Optional[Dict[str, str]] = None, latency_slo: Optional[Dict[str, float]] = None,
+                 window: int = 20, min_samples: int = 5, max_errors: int = 3, cooldown: float = 60.0,
+                 metrics: Optional[Metrics] = None):
+        """
+        Initialize a ModelRouter.
+
+        Parameters:
+            routes (Dict[str, List[Route]], optional): Maps a role name, e.g. 'programmer', to
+                                                       its rules. The first rule whose size limit
+                                                       fits the prompt is used. Defaults to none.
+            default_model (str): Model for roles without a matching rule. Defaults to 'gpt-4'.
+            fallbacks (Dict[str, str], optional): Maps a model to the faster model used when it
+                                                  is failing or too slow. Defaults to none.
+            latency_slo (Dict[str, float], optional): Maps a model to the p95 latency, in seconds,
+                                                      it must stay under. Defaults to none.
+            window (int): Recent latencies per model the p95 is computed from. Defaults to 20.
+            min_samples (int): Latencies needed before the SLO is checked. Defaults to 5.
+            max_errors (int): Consecutive errors after which a model is avoided. Defaults to 3.
+            cooldown (float): Seconds a slow or failing model is avoided before it is tried
+                              again. Defaults to 60.
+            metrics (Metrics, optional): Registry for decisions and latencies. Defaults to the
+                                         shared registry.
+        """
+        self.routes = routes or {}
+        self.default_model = default_model
+        self.fallbacks = fallbacks or {}
+        self.latency_slo = latency_slo or {}
+        self.window = window
+        self.min_samples = min_samples
+        self.max_errors = max_errors
+        self.cooldown = cooldown
+        self.metrics = metrics or get_metrics()
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        self._consecutive_errors: Dict[str, int] = {}
+        # Maps model -> monotonic time until which it is avoided
+        self._degraded_until: Dict[str, float] = {}
+
+    @classmethod
+    def from_dict(cls, config: Dict, metrics: Optional[Metrics] = None) -> 'ModelRouter':
+        """
+        Build a router from a routing table, e.g. one loaded from JSON.
+
+        Example:
+            {"routes": {"programmer": [{"model": "gpt-3.5-turbo", "max_prompt_tokens": 1500},
+                                       {"model": "gpt-4"}],
+                        "jokester": [{"model": "gpt-3.5-turbo"}]},
+             "fallbacks": {"gpt-4": "gpt-3.5-turbo"},
+             "latency_slo": {"gpt-4": 20.0}}
+
+        Parameters:
+            config (Dict): 'routes' and optionally any other constructor argument.
+            metrics (Metrics, optional): Registry for decisions and latencies.
+
+        Returns:
+            ModelRouter: The configured router.
+        """
+        options = dict(config)
+        routes = {role: [Route(rule['model'], rule.get('max_prompt_tokens')) for rule in rules]
+                  for role, rules in options.pop('routes', {}).items()}
+        return cls(routes=routes, metrics=metrics, **options)
+
+    @classmethod
+    def from_file(cls, path: str, metrics: Optional[Metrics] = None) -> 'ModelRouter':
+        """Build a router from a JSON routing table; see `from_dict`."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f), metrics=metrics)
+
+    def choose(self, role: str, messages: List[Dict]) -> str:
+        """
+        Choose the model for a request.
+
+        Parameters:
+            role (str): The role name, e.g. 'programmer'.
+            messages (List[Dict]): The full message list, used to estimate the prompt size.
+
+        Returns:
+            str: The model to send the request to.
+        """
+        prompt_tokens = estimate_message_tokens(messages)
+        model = self.default_model
+        for route in self.routes.get(role, []):
+            if route.max_prompt_tokens is None or prompt_tokens <= route.max_prompt_tokens:
+                model = route.model
+                break
+
+        chosen = self._avoid_degraded(model)
+        self.metrics.add(f'router.decisions.{role}.{chosen}')
+        if chosen != model:
+            self.metrics.add(f'router.rerouted.{model}')
+        return chosen
+
+    def fallback(self, model: str) -> Optional[str]:
+        """Return the model to retry a failed request on, or None if `model` has no fallback."""
+        return self.fallbacks.get(model)
+
+    def record(self, model: str, seconds: float, ok: bool = True):
+        """
+        Record the outcome of a request, avoiding the model for `cooldown` seconds if it
+        breaks its latency SLO or keeps failing.
+
+        Parameters:
+            model (str): The model the request was sent to.
+            seconds (float): How long the request took.
+            ok (bool): Whether it succeeded. Defaults to True.
+        """
+        self.metrics.observe(f'router.latency.{model}', seconds)
+        if not ok:
+            self.metrics.add(f'router.errors.{model}')
+
+        with self._lock:
+            if not ok:
+                errors = self._consecutive_errors.get(model, 0) + 1
+                self._consecutive_errors[model] = errors
+                if errors >= self.max_errors:
+                    self._degrade(model, f'{errors} consecutive errors')
+                return
+
+            self._consecutive_errors[model] = 0
+            slo = self.latency_slo.get(model)
+            if slo is None:
+                return
+            latencies = self._latencies.get(model)
+            if latencies is None:
+                latencies = self._latencies[model] = deque(maxlen=self.window)
+            latencies.append(seconds)
+            if len(latencies) >= self.min_samples:
+                p95 = sorted(latencies)[max(1, math.ceil(0.95 * len(latencies))) - 1]
+                if p95 > slo:
+                    self._degrade(model, f'p95 latency {p95:.1f}s is over its {slo:.1f}s SLO')
+
+    def is_degraded(self, model: str) -> bool:
+        """Whether `model` is currently being avoided."""
+        with self._lock:
+            return self._degraded_until.get(model, 0.0) > time.monotonic()
+
+    def _avoid_degraded(self, model: str) -> str:
+        """Follow the fallbacks from `model` to the first model that is not being avoided."""
+        candidate, seen = model, set()
+        while candidate is not None and candidate not in seen:
+            if not self.is_degraded(candidate):
+                return candidate
+            seen.add(candidate)
+            candidate = self.fallbacks.get(candidate)
+        # Everything is degraded; the primary is the best guess
+        return model
+
+    def _degrade(self, model: str, reason: str):
+        """Avoid `model` for `cooldown` seconds. Called with the lock held."""
+        self._degraded_until[model] = time.monotonic() + self.cooldown
+        # Start over so the model is judged on fresh requests after the cooldown
+        self._latencies.pop(model, None)
+        self._consecutive_errors[model] = 0
+        self.metrics.add(f'router.degraded.{model}')
+        logging.warning(f'Avoiding {model} for {self.cooldown:.0f}s: {reason}.')
@@ -0,0 +1,382 @@
+import ast
+import difflib
+import os
+import re
+import tempfile
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+# One '@@' block of a diff: where it claims to start in the old file, and its
+# lines as (op, text) pairs with op ' ' for context, '-' for removed and '+' for added
+Hunk = namedtuple('Hunk', ['old_start', 'lines'])
+# The changes to one file. A path is None on the /dev/null side of a created or deleted file
+FilePatch = namedtuple('FilePatch', ['old_path', 'new_path', 'hunks'])
+
+_FENCE_PATTERN = re.compile(r'```([a-zA-Z]*)[ \t]*\n(.*?)```', re.DOTALL)
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+# One lock per repository, held while files are checked and swapped into place
+_root_locks: Dict[str, threading.Lock] = {}
+_root_locks_guard = threading.Lock()
+
+class PatchError(ValueError):
+    """Raised when a diff cannot be parsed or does not apply."""
+
+class PatchConflict(PatchError):
+    """Raised when a file changed on disk after its new content was worked out."""
+
+    def __init__(self, relative_path: str):
+        super().__init__(f"{relative_path} changed while the patch was being prepared")
+        self.relative_path = relative_path
+
+def extract_diff(reply: str) -> str:
+    """
+    Return the unified diff in a model reply.
+
+    Parameters:
+        reply (str): The reply, with the diff in ```diff fences or bare.
+
+    Returns:
+        str: The diff text, several fenced diffs joined together.
+    """
+    fenced = [body for language, body in _FENCE_PATTERN.findall(reply) if language in ('diff', 'patch', '')]
+    diffs = [body for body in fenced if '\n+++ ' in body or body.startswith('--- ')]
+    if diffs:
+        return '\n'.join(diffs)
+    start = reply.find('--- ')
+    return reply[start:] if start >= 0 else reply
+
+def extract_code_block(reply: str) -> str:
+    """Return the contents of the first fenced block in a reply, or the whole reply if it has none."""
+    match = _FENCE_PATTERN.search(reply)
+    return match.group(2) if match else reply
+
+def parse_unified_diff(text: str) -> List[FilePatch]:
+    """
+    Parse a unified diff that may span several files.
+
+    Hunk line counts are not trusted, since models often get them wrong; a
+    hunk runs until the next hunk or file header.
+
+    Parameters:
+        text (str): The diff.
+
+    Returns:
+        List[FilePatch]: The changes per file, in order.
+
+    Raises:
+        PatchError: If the text has no file changes or a hunk is outside a file header.
+    """
+    lines = text.rstrip().splitlines()
+    patches = []
+    hunks = None
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith('--- ') and i + 1 < len(lines) and lines[i + 1].startswith('+++ '):
+            hunks = []
+            patches.append(FilePatch(_diff_path(line[4:]), _diff_path(lines[i + 1][4:]), hunks))
+            i += 2
+            continue
+        match = _HUNK_HEADER.match(line)
+        if match:
+            if hunks is None:
+                raise PatchError(f"Hunk '{line}' comes before any '---'/'+++' file header")
+            hunks.append(Hunk(int(match.group(1)), []))
+        elif hunks and line[:1] in (' ', '-', '+', ''):
+            hunks[-1].lines.append((line[:1], line[1:]))
+        # Anything else, e.g. 'diff --git', 'index' or '\ No newline at end of file', is skipped
+        i += 1
+
+    for patch in patches:
+        for hunk in patch.hunks:
+            # Blank lines are context whose leading space was lost, unless they trail the
+            # hunk, where they are the gap before the next file or fence
+            while hunk.lines and hunk.lines[-1][0] == '':
+                hunk.lines.pop()
+            hunk.lines[:] = [(op or ' ', text) for op, text in hunk.lines]
+
+    if not patches:
+        raise PatchError('No file changes found; expected --- and +++ headers')
+    for patch in patches:
+        if not patch.hunks and patch.new_path is not None:
+            raise PatchError(f"The changes to {patch.new_path} have no hunks")
+    return patches
+
+def apply_hunks(content: str, hunks: List[Hunk]) -> str:
+    """
+    Apply a file's hunks to its content.
+
+    Each hunk's removed and context lines must appear in the file in order. The
+    closest match to the line the hunk names is used, so wrong line numbers are
+    tolerated; trailing whitespace differences are too if there is no exact match.
+
+    Parameters:
+        content (str): The current file content.
+        hunks (List[Hunk]): The hunks, in file order.
+
+    Returns:
+        str: The new content.
+
+    Raises:
+        PatchError: If a hunk's lines are not in the file.
+    """
+    lines = content.splitlines()
+    offset = 0
+    position = 0
+    for hunk in hunks:
+        old = [text for op, text in hunk.lines if op != '+']
+        new = [text for op, text in hunk.lines if op != '-']
+        if old:
+            index = _find_block(lines, old, hunk.old_start - 1 + offset, position)
+            if index is None:
+                raise PatchError(f"The hunk at line {hunk.old_start} does not match the file: "
+                                 f"{old[0].strip()!r} not found where expected")
+        else:
+            # A pure insertion after line `old_start`
+            index = min(max(hunk.old_start + offset, position), len(lines))
+        lines[index:index + len(old)] = new
+        offset += len(new) - len(old)
+        position = index + len(new)
+
+    result = '\n'.join(lines)
+    if lines and (content.endswith('\n') or not content):
+        result += '\n'
+    return result
+
+def resolve_path(root: str, relative_path: str) -> str:
+    """
+    Return the absolute path of a file inside `root`.
+
+    Raises:
+        PatchError: If the path is absolute or leads outside `root`.
+    """
+    real_root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(real_root, relative_path))
+    if os.path.isabs(relative_path) or os.path.commonpath([path, real_root]) != real_root:
+        raise PatchError(f"{relative_path} is outside the repository")
+    return path
+
+def prepare_changes(root: str, patches: List[FilePatch]) -> Tuple[Dict[str, Optional[str]],
+                                                                  Dict[str, Optional[str]], Dict[str, str]]:
+    """
+    Work out the new content of every patched file without writing anything.
+
+    Python files must still parse after patching. A file whose patch does not
+    apply or breaks it is reported in the failures rather than raising, so it
+    can be handled on its own.
+
+    Parameters:
+        root (str): The repository the diff paths are relative to.
+        patches (List[FilePatch]): The parsed diff.
+
+    Returns:
+        Tuple[Dict, Dict, Dict]: The original and new content of each path, None for a
+                                 file that does not exist or is deleted, and the reason
+                                 each failed path could not be patched.
+
+    Raises:
+        PatchError: If a path is outside the repository.
+    """
+    originals: Dict[str, Optional[str]] = {}
+    updated: Dict[str, Optional[str]] = {}
+    failures: Dict[str, str] = {}
+
+    def current(relative_path):
+        if relative_path not in originals:
+            originals[relative_path] = _read_text(resolve_path(root, relative_path))
+        return updated.get(relative_path, originals[relative_path])
+
+    for patch in patches:
+        source = patch.old_path if patch.old_path is not None else patch.new_path
+        target = patch.new_path
+        content = current(source)
+        if target is not None and target != source:
+            current(target)
+
+        if target is None:
+            try:
+                # The removed lines must be the whole file as it is now, so a stale or wrong
+                # deletion does not throw away changes the diff never saw
+                if patch.hunks and apply_hunks(content or '', patch.hunks).strip():
+                    raise PatchError(f"The diff deletes {source} but does not remove all of its lines")
+            except PatchError as e:
+                failures[source] = str(e)
+                continue
+            updated[source] = None
+            continue
+        if target in failures:
+            # The file will be replaced whole, so later changes to it are moot
+            continue
+        try:
+            if content is None and patch.old_path is not None:
+                raise PatchError(f"{source} does not exist")
+            if content is not None and patch.old_path is None:
+                raise PatchError(f"{target} already exists")
+            new_content = apply_hunks(content or '', patch.hunks)
+            validate_content(target, new_content)
+        except PatchError as e:
+            failures[target] = str(e)
+            continue
+        updated[target] = new_content
+        if target != source:
+            updated[source] = None
+    return originals, updated, failures
+
+def validate_content(relative_path: str, content: str):
+    """
+    Check that new file content is usable. Python files must parse.
+
+    Raises:
+        PatchError: If the content is not valid for the file's type.
+    """
+    if relative_path.endswith('.py'):
+        try:
+            ast.parse(content)
+        except SyntaxError as e:
+            raise PatchError(f"{relative_path} would not be valid Python: {e.msg} on line {e.lineno}")
+
+def write_files_atomically(root: str, files: Dict[str, Optional[str]],
+                           expected: Optional[Dict[str, Optional[str]]] = None):
+    """
+    Write or delete several files so that either every change is made or none is.
+
+    Every new file is written to a temporary file beside it first. Only then are
+    the files swapped into place; if that fails partway, the swapped files are
+    restored. A file that already exists keeps its line endings, so a CRLF file
+    is not rewritten with LF.
+
+    Writers to the same repository in this process take turns. With `expected`,
+    the files are compared with the content the changes were worked out from
+    before anything is swapped, so a change made by another writer in the
+    meantime is not silently overwritten.
+
+    Parameters:
+        root (str): The repository the paths are relative to.
+        files (Dict[str, Optional[str]]): Maps a relative path to its new content, or
+                                          None to delete it.
+        expected (Dict[str, Optional[str]], optional): Maps a relative path to the content
+                                                       it must still have, None if it must
+                                                       not exist.
+
+    Raises:
+        PatchConflict: If a file no longer has its expected content. Nothing is written.
+    """
+    staged = []
+    try:
+        for relative_path, content in files.items():
+            path = resolve_path(root, relative_path)
+            if content is None:
+                continue
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+            staged.append((temp_path, path))
+            newline = _newline_of(path)
+            with os.fdopen(descriptor, 'w', encoding='utf-8', newline=newline) as f:
+                f.write(content.replace('\r\n', '\n') if newline == '\r\n' else content)
+            # mkstemp creates the file readable only by its owner
+            os.chmod(temp_path, os.stat(path).st_mode if os.path.exists(path) else 0o644)
+    except BaseException:
+        for temp_path, _ in staged:
+            os.remove(temp_path)
+        raise
+
+    with _lock_for(root):
+        try:
+            for relative_path, content in (expected or {}).items():
+                if _read_text(resolve_path(root, relative_path)) != content:
+                    raise PatchConflict(relative_path)
+        except BaseException:
+            for temp_path, _ in staged:
+                os.remove(temp_path)
+            raise
+        _swap_files(root, files, staged)
+
+def render_diff(originals: Dict[str, Optional[str]], updated: Dict[str, Optional[str]]) -> str:
+    """Return a unified diff of the changes that were made, for the record."""
+    pieces = []
+    for relative_path in sorted(updated):
+        before, after = originals.get(relative_path), updated[relative_path]
+        if before == after:
+            continue
+        pieces.extend(difflib.unified_diff(
+            (before or '').splitlines(keepends=True), (after or '').splitlines(keepends=True),
+            fromfile='/dev/null' if before is None else f'a/{relative_path}',
+            tofile='/dev/null' if after is None else f'b/{relative_path}'))
+    return ''.join(pieces)
+
+def _diff_path(header: str) -> Optional[str]:
+    """Turn a '---'/'+++' header path into a repository-relative path, or None for /dev/null."""
+    path = header.split('\t')[0].strip()
+    if path == '/dev/null':
+        return None
+    if path.startswith(('a/', 'b/')):
+        path = path[2:]
+    return path
+
+def _find_block(lines: List[str], block: List[str], expected: int, start: int) -> Optional[int]:
+    """Return the index at or after `start` where `block` occurs, closest to `expected`."""
+    for normalize in (lambda line: line, str.rstrip):
+        target = [normalize(line) for line in block]
+        matches = [i for i in range(start, len(lines) - len(block) + 1)
+                   if normalize(lines[i]) == target[0]
+                   and [normalize(line) for line in lines[i:i + len(block)]] == target]
+        if matches:
+            return min(matches, key=lambda i: abs(i - expected))
+    return None
+
+def _swap_files(root: str, files: Dict[str, Optional[str]], staged: List[Tuple[str, str]]):
+    """Move the staged temporary files into place and make the deletions, restoring everything on failure."""
+    # Maps path -> original bytes, or None if it did not exist
+    backups: Dict[str, Optional[bytes]] = {}
+    deletions = [resolve_path(root, relative_path) for relative_path, content in files.items() if content is None]
+    try:
+        for temp_path, path in staged:
+            backups[path] = _read_bytes(path)
+            os.replace(temp_path, path)
+        for path in deletions:
+            backups[path] = _read_bytes(path)
+            if backups[path] is not None:
+                os.remove(path)
+    except BaseException:
+        for path, data in backups.items():
+            if data is None:
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                with open(path, 'wb') as f:
+                    f.write(data)
+        for temp_path, _ in staged:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+
+def _lock_for(root: str) -> threading.Lock:
+    real_root = os.path.realpath(root)
+    with _root_locks_guard:
+        return _root_locks.setdefault(real_root, threading.Lock())
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _newline_of(path: str) -> str:
+    """Return the line ending a file uses, judged by its first line; LF if it has none or does not exist."""
+    try:
+        with open(path, 'rb') as f:
+            first_line = f.readline()
+    except FileNotFoundError:
+        return '\n'
+    return '\r\n' if first_line.endswith(b'\r\n') else '\n'
+
+def _read_bytes(path: str) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
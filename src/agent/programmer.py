@@ -1,44 +1,290 @@
-import json
 import logging
 from .codebase import CodebaseAgent
 from .gpt_agent import GPTAgent, Role
+from .metrics import get_metrics
+from .patching import (PatchConflict, PatchError, extract_code_block, extract_diff, parse_unified_diff, prepare_changes,
+                       render_diff, validate_content, write_files_atomically)
+from .streaming import JSONStringFieldDecoder
+from .structured_output import PROGRAMMER_SCHEMA, JSONObjectExtractor, parse_structured, repair_structured
+from .tokens import estimate_tokens
+from .tree_renderer import render_tree
+
+# 'code' asks for a JSON code blob; 'patch' asks for a unified diff and applies it to the repository
+MODES = ('code', 'patch')
+# Times a diff is applied again after another writer changed one of its files first
+PATCH_CONFLICT_RETRIES = 3
 
 class ProgrammerAgent:
-    def __init__(self, codebase_repo_path, gpt_api_key):
-        self.codebase_agent = CodebaseAgent(codebase_repo_path)
-        self.gpt_agent = GPTAgent(api_key=gpt_api_key, role=Role.PROGRAMMER,enable_memory=True)
+    def __init__(self, codebase_repo_path, gpt_api_key, structure_token_budget=2000, context_token_budget=0,
+                 metrics=None, max_repairs=1, router=None, rate_limiter=None, outline_token_budget=0,
+                 mode='code', patch_token_budget=3000, directory_index_path=None, hedger=None):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}.")
+
+        self.structure_token_budget = structure_token_budget
+        self.context_token_budget = context_token_budget
+        self.outline_token_budget = outline_token_budget
+        self.patch_token_budget = patch_token_budget
+        self.mode = mode
+        self.max_repairs = max_repairs
+        self.metrics = metrics or get_metrics()
+        # The directory index lives as long as the agent, so repeated tasks only rescan changed directories
+        self.codebase_agent = CodebaseAgent(codebase_repo_path, index_path=directory_index_path, metrics=self.metrics)
+        role = Role.PATCHER if mode == 'patch' else Role.PROGRAMMER
+        self.gpt_agent = GPTAgent(api_key=gpt_api_key, role=role,enable_memory=True, metrics=self.metrics,
+                                  router=router, rate_limiter=rate_limiter, hedger=hedger)
 
-    def get_code(self, task_description):
+    def get_code(self, task_description, on_chunk=None):
         """Get code from a task description by querying a directory structure.
 
         This function gathers the project info using a CodebaseAgent, then asks
-        a GPTAgent for the code. The function also handles JSONDecodeError and
-        general exceptions, logging the errors when they occur.
+        a GPTAgent for the code. The JSON object is extracted from the reply even
+        when it is wrapped in a markdown fence or prose. Only if that fails is the
+        model asked to correct its reply, up to `max_repairs` times. Errors are
+        logged when they occur.
+
+        When `on_chunk` is given the response is streamed, and each newly decoded
+        piece of the code is passed to `on_chunk` as it arrives.
+
+        In 'patch' mode the model is shown the most relevant files whole and
+        asks for a unified diff instead, which is far shorter than re-emitted
+        code. The diff is validated and applied to the repository atomically;
+        a file whose patch does not apply is replaced with full content the
+        model is asked for separately. `on_chunk` then receives the raw diff.
+        If another agent changes one of the files before the diff is written,
+        the diff is applied again on top of that change rather than dropping it.
+
+        The whole call is timed as the 'programmer.get_code' span and, per mode,
+        as 'programmer.<mode>.get_code', with 'programmer.build_query' and
+        'programmer.parse' for its own stages. The estimated tokens the model
+        wrote are counted in 'programmer.<mode>.output_tokens'.
 
         Args:
             task_description (str): The task description to get code for.
+            on_chunk (Callable[[str], None], optional): Receives the code incrementally.
 
         Returns:
-            code_content (str): The requested code content, or 'No code found' if unavailable.
+            code_content (str): The requested code content. In 'patch' mode, a unified diff of
+                                the changes that were made. None if no usable reply was received
+                                after `max_repairs` corrections, or on an unexpected error.
         """
-        try:
-            # Gather project info
-            project_structure = self.codebase_agent.get_directory_structure()
+        with self.metrics.span('programmer.get_code'), self.metrics.span(f'programmer.{self.mode}.get_code'):
+            self.metrics.add(f'programmer.{self.mode}.requests')
+            if self.mode == 'patch':
+                return self._get_patch(task_description, on_chunk)
+            return self._get_code(task_description, on_chunk)
 
+    def _get_code(self, task_description, on_chunk):
+        try:
             # Formulate query for GPTAgent
-            query = f'Given the project structure {project_structure}, {task_description}.'
-            response_content_str = self.gpt_agent.ask_query(query)
+            with self.metrics.span('programmer.build_query'):
+                query = self._build_query(task_description)
+            extracted = None
+            if on_chunk is None:
+                response_content_str = self.gpt_agent.ask_query(query)
+            else:
+                response_content_str, extracted = self._stream_query(query, on_chunk)
+            self._record_output(response_content_str)
             logging.info(f'Raw Response: {response_content_str}')
 
             # Deserialize the response
-            response_content = json.loads(response_content_str)
+            with self.metrics.span('programmer.parse'):
+                response_content, problem = parse_structured(response_content_str, PROGRAMMER_SCHEMA, extracted)
+            if response_content is None:
+                response_content = repair_structured(self.gpt_agent, response_content_str, problem,
+                                                     PROGRAMMER_SCHEMA, self.max_repairs)
+            if response_content is None:
+                logging.error(f'Failed Task Description: {task_description}')
+                return None
 
-            # Retrieve code from response
-            code_content = response_content.get('code', 'No code found')
-            return code_content
+            # Retrieve code from response; parse_structured guarantees the field
+            return response_content['code']
 
-        except json.JSONDecodeError as e:
-            logging.error(f'JSON Decode Error: {e}')
-            logging.error(f'Failed Task Description: {task_description}')
         except Exception as e:
-            logging.error(f'An unexpected error occurred: {e}')
\ No newline at end of file
+            logging.error(f'An unexpected error occurred: {e}')
+
+    def reset(self):
+        """Forget the conversation so far, so the next task starts fresh.
+
+        The codebase indexes and HTTP connections are kept, which is what makes
+        reusing one agent across tasks cheaper than building a new one.
+        """
+        self.gpt_agent.clear_memory()
+
+    def _build_query(self, task_description):
+        """Build the GPTAgent query with the project structure and any relevant code.
+
+        With an `outline_token_budget` the query also lists the classes and
+        functions of the project's Python files, most relevant first. That
+        describes the code's API in far fewer tokens than `context_token_budget`
+        spends on file snippets, so the two can be traded off.
+
+        Args:
+            task_description (str): The task description to get code for.
+
+        Returns:
+            str: The query text.
+        """
+        query = self._structure_query()
+
+        if self.outline_token_budget > 0:
+            outline = self.codebase_agent.get_api_outline(task_description, max_tokens=self.outline_token_budget)
+            if outline:
+                query += f'and this outline of its Python code:\n{outline}\n\n'
+
+        if self.context_token_budget > 0:
+            context = self.codebase_agent.find_relevant_context(
+                task_description, max_tokens=self.context_token_budget)
+            if context:
+                query += f'and these relevant files:\n{context}\n\n'
+
+        return query + f'{task_description}.'
+
+    def _build_patch_query(self, task_description):
+        """Build the patch mode query with the project structure and the files to patch, whole.
+
+        Args:
+            task_description (str): The task description to get changes for.
+
+        Returns:
+            str: The query text.
+        """
+        query = self._structure_query()
+        files = self.codebase_agent.find_relevant_files(task_description, max_tokens=self.patch_token_budget)
+        if files:
+            listing = '\n\n'.join(f'==> {path} <==\n{content}' for path, content in files.items())
+            query += f'and these files:\n{listing}\n\n'
+        return query + f'{task_description}.'
+
+    def _structure_query(self):
+        """Start a query with the project structure, kept within its token budget."""
+        project_structure = self.codebase_agent.get_directory_structure()
+        with self.metrics.span('programmer.render_tree'):
+            rendered_structure = render_tree(project_structure, max_tokens=self.structure_token_budget)
+        return f'Given the project structure:\n{rendered_structure}\n\n'
+
+    def _get_patch(self, task_description, on_chunk):
+        try:
+            with self.metrics.span('programmer.build_query'):
+                query = self._build_patch_query(task_description)
+            reply = self._ask(query, on_chunk)
+            logging.info(f'Raw Response: {reply}')
+
+            with self.metrics.span('programmer.parse'):
+                patches, problem = self._parse_patch(reply)
+            for _ in range(self.max_repairs):
+                if patches is not None:
+                    break
+                logging.warning(f'Asking for a corrected diff: {problem}')
+                self.metrics.add('programmer.patch.repairs')
+                reply = self._ask(f'Your reply was not a usable unified diff: {problem}. '
+                                  'Reply with only the corrected diff in one ```diff block.')
+                patches, problem = self._parse_patch(reply)
+            if patches is None:
+                logging.error(f'Failed Task Description: {task_description}')
+                return None
+
+            root = self.codebase_agent.repo_path
+            # Full content asked for when a file's patch did not apply, kept across conflict retries
+            replacements = {}
+            for _ in range(PATCH_CONFLICT_RETRIES + 1):
+                with self.metrics.span('programmer.validate_patch'):
+                    originals, updated, failures = prepare_changes(root, patches)
+                for relative_path, reason in failures.items():
+                    if relative_path not in replacements:
+                        logging.warning(f'The patch for {relative_path} did not apply ({reason}); '
+                                        'asking for its full content.')
+                        self.metrics.add('programmer.patch.fallbacks')
+                        replacements[relative_path] = self._ask_full_content(relative_path, reason)
+                    if replacements[relative_path] is None:
+                        logging.error(f'Failed Task Description: {task_description}')
+                        return None
+                    updated[relative_path] = replacements[relative_path]
+
+                try:
+                    with self.metrics.span('programmer.apply_patch'):
+                        write_files_atomically(root, updated, expected=originals)
+                except PatchConflict as e:
+                    self.metrics.add('programmer.patch.conflicts')
+                    if e.relative_path in replacements:
+                        # The full content was written against the old file and would undo the change
+                        logging.error(f'{e}; its replacement content is out of date.')
+                        return None
+                    logging.warning(f'{e}; applying the patch again.')
+                    continue
+                self.metrics.add('programmer.patch.files_changed', len(updated))
+                return render_diff(originals, updated)
+
+            logging.error(f'Failed Task Description: {task_description}: its files kept changing.')
+            return None
+
+        except Exception as e:
+            logging.error(f'An unexpected error occurred: {e}')
+
+    def _parse_patch(self, reply):
+        """Return the parsed diff in a reply and None, or None and what is wrong with it."""
+        try:
+            return parse_unified_diff(extract_diff(reply)), None
+        except PatchError as e:
+            return None, str(e)
+
+    def _ask_full_content(self, relative_path, reason):
+        """Ask for the complete new content of a file whose patch did not apply.
+
+        Args:
+            relative_path (str): The file's path in the repository.
+            reason (str): Why its patch did not apply.
+
+        Returns:
+            Optional[str]: The content, or None if the reply is not valid for the file.
+        """
+        reply = self._ask(f'The patch for {relative_path} could not be applied: {reason}. '
+                          f'Reply with the complete new content of {relative_path} in one ``` block.')
+        content = extract_code_block(reply)
+        if not content.endswith('\n'):
+            content += '\n'
+        try:
+            validate_content(relative_path, content)
+        except PatchError as e:
+            logging.error(f'The new content of {relative_path} is unusable: {e}')
+            return None
+        return content
+
+    def _ask(self, query, on_chunk=None):
+        """Send a query, streaming the raw reply to `on_chunk` if given, and count its size."""
+        if on_chunk is None:
+            reply = self.gpt_agent.ask_query(query)
+        else:
+            pieces = []
+            for piece in self.gpt_agent.stream_query(query):
+                pieces.append(piece)
+                on_chunk(piece)
+            reply = ''.join(pieces)
+        self._record_output(reply)
+        return reply
+
+    def _record_output(self, reply):
+        if reply:
+            self.metrics.add(f'programmer.{self.mode}.output_tokens', estimate_tokens(reply))
+
+    def _stream_query(self, query, on_chunk):
+        """Stream a query, passing decoded pieces of the code field to `on_chunk`.
+
+        Args:
+            query (str): The query for the GPTAgent.
+            on_chunk (Callable[[str], None]): Receives the code incrementally.
+
+        Returns:
+            Tuple[str, Optional[Dict]]: The complete raw response content, and the JSON
+                                        object in it if one was found while streaming.
+        """
+        decoder = JSONStringFieldDecoder('code')
+        extractor = JSONObjectExtractor()
+        pieces = []
+        for piece in self.gpt_agent.stream_query(query):
+            pieces.append(piece)
+            extractor.feed(piece)
+            code_piece = decoder.feed(piece)
+            if code_piece:
+                on_chunk(code_piece)
+        return ''.join(pieces), extractor.close()
@@ -0,0 +1,68 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+PROMPT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'system_prompts')
+
+class PromptRegistry:
+    """Class for loading role prompts once and reloading them only when the file changes."""
+
+    def __init__(self, directory: str = PROMPT_DIRECTORY):
+        """
+        Initialize a PromptRegistry. Nothing is read until a prompt is requested.
+
+        Parameters:
+            directory (str): Folder holding the prompt files. Defaults to the package's
+                             `system_prompts` folder, wherever the process was started.
+        """
+        self.directory = directory
+        self.loads = 0
+        # Maps file name -> (mtime_ns, size, text)
+        self._prompts: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> str:
+        """
+        Return the text of a prompt file, re-reading it only if its mtime or size changed.
+
+        Parameters:
+            name (str): File name inside the prompt directory, e.g. 'programmer.txt'.
+
+        Returns:
+            str: The prompt text.
+
+        Raises:
+            FileNotFoundError: If the prompt file does not exist.
+        """
+        file_path = os.path.join(self.directory, name)
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"File {file_path} does not exist.") from None
+
+        with self._lock:
+            cached = self._prompts.get(name)
+            if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                return cached[2]
+
+            with open(file_path, "r") as f:
+                text = f.read()
+            self._prompts[name] = (stat.st_mtime_ns, stat.st_size, text)
+            self.loads += 1
+            return text
+
+    def clear(self):
+        """Forget every loaded prompt."""
+        with self._lock:
+            self._prompts.clear()
+
+_default_registry: Optional[PromptRegistry] = None
+_default_registry_lock = threading.Lock()
+
+def get_prompt_registry() -> PromptRegistry:
+    """Return the registry shared by all agents, creating it on first use."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = PromptRegistry()
+        return _default_registry
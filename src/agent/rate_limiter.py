@@ -0,0 +1,105 @@
+import threading
+import time
+from typing import Dict, Optional
+from .metrics import Metrics, get_metrics
+
+class RateLimiter:
+    """Class for keeping API calls under requests-per-minute and tokens-per-minute limits."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 completion_tokens: int = 500, burst_seconds: float = 1.0, metrics: Optional[Metrics] = None):
+        """
+        Initialize a RateLimiter. Share one instance between every agent using the same API key.
+
+        Parameters:
+            requests_per_minute (float, optional): The account's RPM limit. Defaults to no limit.
+            tokens_per_minute (float, optional): The account's TPM limit. Defaults to no limit.
+            completion_tokens (int): Initial guess of the tokens in each reply, counted against
+                                     the TPM limit until replies report their usage. Defaults to 500.
+            burst_seconds (float): How many seconds of each limit may be spent at once. Kept
+                                   small so calls are paced evenly; a burst of a whole minute's
+                                   quota would break a provider's sliding one-minute window
+                                   for the rest of that minute. Defaults to 1.
+            metrics (Metrics, optional): Registry for waits and token counts. Defaults to the
+                                         shared registry.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.completion_tokens = float(completion_tokens)
+        self.burst_seconds = burst_seconds
+        self.metrics = metrics or get_metrics()
+        self._lock = threading.Lock()
+        # Both buckets start full, refill continuously and may go negative: a caller that
+        # takes more than is left waits until its share has refilled
+        self._request_capacity = None if requests_per_minute is None else requests_per_minute * burst_seconds / 60.0
+        self._token_capacity = None if tokens_per_minute is None else tokens_per_minute * burst_seconds / 60.0
+        self._requests = self._request_capacity
+        self._tokens = self._token_capacity
+        self._updated = time.monotonic()
+
+    def acquire(self, prompt_tokens: int) -> int:
+        """
+        Wait until a request fits under both limits, and reserve its share.
+
+        Callers are admitted in the order they call, each waiting only as long as
+        the buckets need to refill for it.
+
+        Parameters:
+            prompt_tokens (int): Estimated tokens of the request's messages.
+
+        Returns:
+            int: The tokens reserved, prompt plus expected reply. Pass this to `record_usage`.
+        """
+        reserved = prompt_tokens + round(self.completion_tokens)
+        with self._lock:
+            self._refill()
+            wait = 0.0
+            if self.requests_per_minute is not None:
+                self._requests -= 1
+                wait = max(wait, -self._requests * 60.0 / self.requests_per_minute)
+            if self.tokens_per_minute is not None:
+                self._tokens -= reserved
+                wait = max(wait, -self._tokens * 60.0 / self.tokens_per_minute)
+
+        self.metrics.observe('ratelimit.wait', wait)
+        if wait > 0:
+            time.sleep(wait)
+        return reserved
+
+    def record_usage(self, reserved: int, usage: Optional[Dict] = None):
+        """
+        Correct a reservation with the tokens the request actually used.
+
+        Parameters:
+            reserved (int): The value `acquire` returned.
+            usage (Dict, optional): The response's 'usage' object. Pass {'total_tokens': 0}
+                                    for a request that was rejected and used no tokens.
+                                    Defaults to keeping the estimate.
+        """
+        if not usage:
+            return
+        actual = usage.get('total_tokens')
+        if actual is None:
+            actual = usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0)
+        completion = usage.get('completion_tokens')
+
+        with self._lock:
+            self._refill()
+            if self.tokens_per_minute is not None:
+                self._tokens = min(self._token_capacity, self._tokens + reserved - actual)
+            if completion is not None:
+                # A moving average, so the next estimates follow the replies actually seen
+                self.completion_tokens += 0.2 * (completion - self.completion_tokens)
+        self.metrics.add('ratelimit.reserved_tokens', reserved)
+        self.metrics.add('ratelimit.used_tokens', actual)
+
+    def _refill(self):
+        """Add what the buckets earned since the last update. Called with the lock held."""
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute is not None:
+            self._requests = min(self._request_capacity,
+                                 self._requests + elapsed * self.requests_per_minute / 60.0)
+        if self.tokens_per_minute is not None:
+            self._tokens = min(self._token_capacity, self._tokens + elapsed * self.tokens_per_minute / 60.0)
@@ -0,0 +1,278 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from .snapshot import load_snapshot, save_snapshot
+from .tokens import estimate_tokens
+from .walker import iter_files
+
+_WORD_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+_CAMEL_PATTERN = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lower-case search terms.
+
+    Identifiers are indexed whole and by their snake_case and camelCase parts,
+    so 'getDirectoryStructure' also matches 'directory'.
+
+    Parameters:
+        text (str): The text to split.
+
+    Returns:
+        List[str]: The terms, with repeats.
+    """
+    return list(count_terms(text).elements())
+
+def count_terms(text: str) -> Counter:
+    """
+    Count the search terms in a piece of text. See `tokenize`.
+
+    Parameters:
+        text (str): The text to split.
+
+    Returns:
+        Counter: Maps each term to its frequency.
+    """
+    counts = Counter()
+    for word, count in Counter(_WORD_PATTERN.findall(text)).items():
+        for term in _word_terms(word):
+            counts[term] += count
+    return counts
+
+@lru_cache(maxsize=65536)
+def _word_terms(word: str) -> Tuple[str, ...]:
+    terms = [word.lower()] if len(word) > 1 else []
+    parts = [part.lower() for piece in word.split('_') for part in _CAMEL_PATTERN.findall(piece)]
+    if len(parts) > 1:
+        terms.extend(part for part in parts if len(part) > 1)
+    return tuple(terms)
+
+class RelevanceIndex:
+    """Class for ranking repository files against a task description with BM25."""
+
+    VERSION = 2
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, root: str, index_path: Optional[str] = None,
+                 exclusions: Iterable[str] = ('.git', '__pycache__', 'node_modules', 'venv', '.venv'),
+                 max_file_bytes: int = 1_000_000, respect_gitignore: bool = True):
+        """
+        Initialize the index, loading the snapshot at `index_path` if it exists.
+
+        Parameters:
+            root (str): Root folder of the repository to index.
+            index_path (str, optional): File where the index is persisted. Defaults to memory only.
+            exclusions (Iterable[str]): Folder or file names that are not indexed.
+            max_file_bytes (int): Files larger than this are skipped. Defaults to 1 MB.
+            respect_gitignore (bool): Skip files matched by .gitignore files. Defaults to True.
+        """
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
+        self.exclusions = set(exclusions)
+        self.respect_gitignore = respect_gitignore
+        self.max_file_bytes = max_file_bytes
+        # Maps relative path -> {'mtime_ns', 'size', 'hash', 'length', 'terms'}
+        self._documents: Dict[str, Dict] = {}
+        # Maps relative path -> [mtime_ns, size] for large, binary or unreadable files
+        self._skipped: Dict[str, List[int]] = {}
+        # Maps term -> {relative path: term frequency}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        if index_path is not None and os.path.exists(index_path):
+            self._load()
+
+    def update(self) -> int:
+        """
+        Bring the index up to date with the files on disk.
+
+        Files whose size and mtime are unchanged are skipped without being read.
+        Changed files are hashed and only re-tokenized if their content differs.
+
+        Returns:
+            int: The number of files that were (re)indexed or removed.
+        """
+        with self._lock:
+            changed = 0
+            seen = set()
+            for relative_path, stat in iter_files(self.root, self.exclusions, self.respect_gitignore):
+                seen.add(relative_path)
+                signature = [stat.st_mtime_ns, stat.st_size]
+                document = self._documents.get(relative_path)
+                if document is not None and [document['mtime_ns'], document['size']] == signature:
+                    continue
+                if self._skipped.get(relative_path) == signature:
+                    continue
+
+                content = self._read_text(relative_path)
+                if content is None:
+                    self._skipped[relative_path] = signature
+                    self._dirty = True
+                    if document is not None:
+                        self._remove(relative_path)
+                        changed += 1
+                    continue
+                if self._skipped.pop(relative_path, None) is not None:
+                    self._dirty = True
+
+                digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+                if document is not None and document['hash'] == digest:
+                    document['mtime_ns'], document['size'] = stat.st_mtime_ns, stat.st_size
+                    self._dirty = True
+                    continue
+
+                self._remove(relative_path)
+                self._add(relative_path, stat, digest, count_terms(relative_path + '\n' + content))
+                changed += 1
+
+            for relative_path in set(self._documents) - seen:
+                self._remove(relative_path)
+                changed += 1
+            for relative_path in set(self._skipped) - seen:
+                del self._skipped[relative_path]
+                self._dirty = True
+            return changed
+
+    def search(self, query: str, top_k: Optional[int] = 5) -> List[Tuple[str, float]]:
+        """
+        Rank the indexed files against a query.
+
+        Parameters:
+            query (str): Free text, e.g. a task description.
+            top_k (int, optional): Number of results to return, or None for every match. Defaults to 5.
+
+        Returns:
+            List[Tuple[str, float]]: Relative paths and BM25 scores, best first.
+        """
+        with self._lock:
+            count = len(self._documents)
+            if count == 0:
+                return []
+            average_length = self._total_length / count
+
+            scores: Dict[str, float] = {}
+            for term in count_terms(query):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for relative_path, frequency in postings.items():
+                    length = self._documents[relative_path]['length']
+                    norm = self.K1 * (1 - self.B + self.B * length / average_length)
+                    scores[relative_path] = scores.get(relative_path, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            return ranked[:top_k]
+
+    def relevant_context(self, query: str, top_k: int = 5, max_tokens: int = 1500,
+                         snippet_lines: int = 40) -> str:
+        """
+        Return the best-matching snippets of the most relevant files within a token budget.
+
+        Parameters:
+            query (str): Free text, e.g. a task description.
+            top_k (int): Maximum number of files to include. Defaults to 5.
+            max_tokens (int): Estimated token budget for the whole context. Defaults to 1500.
+            snippet_lines (int): Maximum lines taken from each file. Defaults to 40.
+
+        Returns:
+            str: Snippets headed by '# <path> (lines a-b)', separated by blank lines.
+        """
+        query_terms = set(count_terms(query))
+        sections = []
+        used = 0
+        for relative_path, _ in self.search(query, top_k):
+            snippet = self._best_snippet(relative_path, query_terms, snippet_lines)
+            if snippet is None:
+                continue
+            start, text = snippet
+            end = start + text.count('\n')
+            section = f"# {relative_path} (lines {start}-{end})\n{text}"
+            cost = estimate_tokens(section + '\n\n')
+            if used + cost > max_tokens:
+                continue
+            sections.append(section)
+            used += cost
+        return '\n\n'.join(sections)
+
+    def save(self):
+        """Persist the index to `index_path` if it changed since it was loaded or saved."""
+        with self._lock:
+            if self.index_path is None or not self._dirty:
+                return
+            # The postings are rebuilt from each document's terms on load, which keeps the file small
+            save_snapshot(self.index_path, {'version': self.VERSION, 'root': self.root, 'documents': self._documents,
+                                            'skipped': self._skipped})
+            self._dirty = False
+
+    def _read_text(self, relative_path: str) -> Optional[str]:
+        """Read a file as text, returning None for large, binary or unreadable files."""
+        path = os.path.join(self.root, relative_path)
+        try:
+            if os.path.getsize(path) > self.max_file_bytes:
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if b'\0' in data[:8192]:
+            return None
+        return data.decode('utf-8', errors='replace')
+
+    def _best_snippet(self, relative_path: str, query_terms: set, snippet_lines: int) -> Optional[Tuple[int, str]]:
+        """Return the 1-based start line and text of the window with the most query term hits."""
+        content = self._read_text(relative_path)
+        if content is None:
+            return None
+        lines = content.splitlines()
+        if len(lines) <= snippet_lines:
+            return 1, '\n'.join(lines)
+
+        hits = [sum(count for term, count in count_terms(line).items() if term in query_terms) for line in lines]
+        window = best = sum(hits[:snippet_lines])
+        best_start = 0
+        for start in range(1, len(lines) - snippet_lines + 1):
+            window += hits[start + snippet_lines - 1] - hits[start - 1]
+            if window > best:
+                best, best_start = window, start
+        return best_start + 1, '\n'.join(lines[best_start:best_start + snippet_lines])
+
+    def _add(self, relative_path: str, stat: os.stat_result, digest: str, terms: Counter):
+        self._documents[relative_path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': digest,
+                                          'length': sum(terms.values()), 'terms': dict(terms)}
+        self._total_length += sum(terms.values())
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[relative_path] = frequency
+        self._dirty = True
+
+    def _remove(self, relative_path: str):
+        document = self._documents.pop(relative_path, None)
+        if document is None:
+            return
+        self._total_length -= document['length']
+        for term in document['terms']:
+            postings = self._postings[term]
+            del postings[relative_path]
+            if not postings:
+                del self._postings[term]
+        self._dirty = True
+
+    def _load(self):
+        data = load_snapshot(self.index_path, self.VERSION, self.root, 'relevance index')
+        if data is None:
+            return
+        self._documents = data['documents']
+        self._skipped = data['skipped']
+        self._postings = {}
+        for relative_path, document in self._documents.items():
+            for term, frequency in document['terms'].items():
+                self._postings.setdefault(term, {})[relative_path] = frequency
+        self._total_length = sum(document['length'] for document in self._documents.values())
@@ -0,0 +1,301 @@
+import logging
+import os
+import shutil
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from .job_journal import Job, JobJournal
+from .metrics import Metrics, get_metrics
+
+
+class RequestProcessor:
+    """Class for turning queued request files into results using a ProgrammerAgent."""
+
+    def __init__(self, request_folder: str, results_folder: str,
+                 agent_factory: Callable, max_workers: int = 1, stream_results: bool = False,
+                 metrics: Optional[Metrics] = None, reuse_agents: bool = True,
+                 journal: Optional[JobJournal] = None, reuse_results: bool = True):
+        """
+        Initialize a RequestProcessor instance.
+
+        Parameters:
+            request_folder (str): Folder containing the request files.
+            results_folder (str): Folder where results are written.
+            agent_factory (Callable): Returns an object exposing `get_code(task_description)`.
+            max_workers (int, optional): Number of request files processed in parallel. Defaults to 1.
+            stream_results (bool, optional): Write each result to disk while it is generated.
+                                             Defaults to False.
+            metrics (Metrics, optional): Registry for request timings. Defaults to the shared registry.
+            reuse_agents (bool, optional): Keep one agent per worker thread instead of calling
+                                           `agent_factory` for every file. A reused agent's `reset()`
+                                           is called, if it has one, before each file. Defaults to True.
+            journal (JobJournal, optional): Records every request with its content hash, status,
+                                            attempts and timings. Requests are claimed through
+                                            leases, so several processes can share the folder, and
+                                            a request whose text was already answered reuses that
+                                            result. Defaults to no journal.
+            reuse_results (bool, optional): Let the journal answer a request with the result of an
+                                            identical earlier one. Turn it off when the agent changes
+                                            files as a side effect, e.g. in patch mode, because the
+                                            reused result is only written to the results folder.
+                                            Defaults to True.
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+
+        self.request_folder = request_folder
+        self.results_folder = results_folder
+        self.agent_factory = agent_factory
+        self.max_workers = max_workers
+        self.stream_results = stream_results
+        self.metrics = metrics or get_metrics()
+        self.reuse_agents = reuse_agents
+        self.journal = journal
+        self.reuse_results = reuse_results
+        self._local = threading.local()
+
+    def pending_requests(self) -> List[str]:
+        """
+        List the request files that have not been processed yet.
+
+        Returns:
+            List[str]: Sorted file names, ignoring folders and files starting with '_'.
+        """
+        pending = []
+        for filename in os.listdir(self.request_folder):
+            filepath = os.path.join(self.request_folder, filename)
+            if os.path.isdir(filepath) or filename.startswith('_'):
+                continue
+            pending.append(filename)
+        return sorted(pending)
+
+    def process_all(self) -> Dict[str, bool]:
+        """
+        Process every pending request file.
+
+        A failure in one file is logged and does not stop the others. Failed
+        files keep their name so they are picked up again on the next run.
+
+        Returns:
+            Dict[str, bool]: Maps each file name to whether it was processed successfully.
+        """
+        if not os.path.exists(self.results_folder):
+            os.makedirs(self.results_folder)
+            logging.info(f"Created results folder at {self.results_folder}")
+
+        if self.journal is not None:
+            return self._process_journal()
+
+        filenames = self.pending_requests()
+        if self.max_workers == 1 or len(filenames) <= 1:
+            return {filename: self.process_file(filename) for filename in filenames}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            outcomes = executor.map(self.process_file, filenames)
+            return dict(zip(filenames, outcomes))
+
+    def process_file(self, filename: str) -> bool:
+        """
+        Process a single request file.
+
+        The result is written to the results folder and the request file is then
+        renamed to `_<filename>` so it is not processed again. When streaming, the
+        result is written to `<filename>.part` as it arrives and moved into place
+        once complete.
+
+        Parameters:
+            filename (str): Name of the file inside the request folder.
+
+        Returns:
+            bool: True if the result was written and the file renamed, otherwise False.
+        """
+        if self.journal is not None:
+            try:
+                job_id = self.journal.enqueue(filename, self._read_task(filename))
+            except OSError as e:
+                logging.error(f"Failed to read {filename}: {e}")
+                return False
+            job = self.journal.claim(self._owner(), job_id)
+            if job is None:
+                logging.info(f"{filename} is being processed by another worker.")
+                return False
+            return bool(self._process_job(job))
+
+        with self.metrics.span('request.process'):
+            succeeded = self._process_file(filename) is not None
+        self.metrics.add('request.succeeded' if succeeded else 'request.failed')
+        return succeeded
+
+    def _process_journal(self) -> Dict[str, bool]:
+        """Journal every pending file, then claim and process jobs until none are left.
+
+        Jobs left running by a crashed worker are picked up once their lease expires.
+        """
+        for filename in self.pending_requests():
+            try:
+                self.journal.enqueue(filename, self._read_task(filename))
+            except OSError as e:
+                logging.error(f"Failed to read {filename}: {e}")
+
+        outcomes = {}
+
+        def work():
+            while True:
+                job = self.journal.claim(self._owner())
+                if job is None:
+                    return
+                outcome = self._process_job(job)
+                if outcome is not None:
+                    outcomes[job.filename] = outcome
+
+        if self.max_workers == 1:
+            work()
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for future in [executor.submit(work) for _ in range(self.max_workers)]:
+                    future.result()
+        return outcomes
+
+    def _process_job(self, job: Job) -> Optional[bool]:
+        """
+        Process a claimed job and record the outcome in the journal.
+
+        Returns:
+            Optional[bool]: Whether it succeeded, or None if the job was cancelled
+                            because its file is gone or changed.
+        """
+        owner = self._owner()
+        try:
+            task_description = self._read_task(job.filename)
+        except OSError:
+            self.journal.cancel(job.id, owner, 'Request file no longer exists')
+            return None
+        if JobJournal.hash_content(task_description) != job.content_hash:
+            self.journal.cancel(job.id, owner, 'Request file changed')
+            self.journal.enqueue(job.filename, task_description)
+            return None
+
+        with self.metrics.span('request.process'):
+            cached = self.journal.find_result(job.content_hash) if self.reuse_results else None
+            if cached is not None:
+                result = self._reuse_result(job.filename, cached)
+                deduplicated = True
+            else:
+                with self.journal.keep_alive(job.id, owner):
+                    result = self._process_file(job.filename, task_description)
+                deduplicated = False
+
+        if result is None:
+            self.metrics.add('request.failed')
+            self.journal.fail(job.id, owner, 'No result')
+            return False
+        self.metrics.add('request.deduplicated' if deduplicated else 'request.succeeded')
+        self.journal.complete(job.id, owner, result, deduplicated=deduplicated)
+        return True
+
+    def _reuse_result(self, filename: str, result: str) -> Optional[str]:
+        """Write the result of an identical earlier request instead of asking the agent again."""
+        logging.info(f"Reusing the result of an identical request for {filename}")
+        try:
+            with open(os.path.join(self.results_folder, filename), 'w') as result_file:
+                result_file.write(result)
+            self._mark_processed(filename)
+            return result
+        except OSError as e:
+            logging.error(f"Failed to reuse the result for {filename}: {e}")
+            return None
+
+    def _process_file(self, filename: str, task_description: Optional[str] = None) -> Optional[str]:
+        filepath = os.path.join(self.request_folder, filename)
+        logging.info(f"Processing file: {filepath}")
+
+        try:
+            if task_description is None:
+                task_description = self._read_task(filename)
+
+            result_filepath = os.path.join(self.results_folder, filename)
+            agent = self._acquire_agent()
+            if self.stream_results:
+                result = self._stream_result(agent, task_description, result_filepath)
+            else:
+                result = agent.get_code(task_description)
+                if result is not None:
+                    with open(result_filepath, 'w') as result_file:
+                        result_file.write(result)
+
+            if result is None:
+                logging.error(f"No result returned for {filepath}")
+                return None
+            logging.info(f"Saved result to {result_filepath}")
+
+            self._mark_processed(filename)
+            return result
+        except Exception as e:
+            logging.error(f"Failed to process {filepath}: {e}")
+            # The agent may be in a bad state, so the next file gets a new one
+            self._local.agent = None
+            return None
+
+    def _read_task(self, filename: str) -> str:
+        with open(os.path.join(self.request_folder, filename), 'r') as file:
+            return file.read().strip()
+
+    def _mark_processed(self, filename: str):
+        """Rename the request file to `_<filename>` so it is not processed again."""
+        processed_filepath = os.path.join(self.request_folder, f"_{filename}")
+        shutil.move(os.path.join(self.request_folder, filename), processed_filepath)
+        logging.info(f"Renamed processed file to {processed_filepath}")
+
+    def _owner(self) -> str:
+        """Identify this worker thread in journal leases."""
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+    def _acquire_agent(self):
+        """Return this thread's agent, reset for a new task, creating it on first use."""
+        if not self.reuse_agents:
+            return self.agent_factory()
+
+        agent = getattr(self._local, 'agent', None)
+        if agent is None:
+            agent = self._local.agent = self.agent_factory()
+        else:
+            reset = getattr(agent, 'reset', None)
+            if callable(reset):
+                reset()
+        return agent
+
+    def _stream_result(self, agent, task_description: str, result_filepath: str):
+        """
+        Stream the agent's code into `result_filepath`, going through a `.part` file.
+
+        Parameters:
+            agent: Object exposing `get_code(task_description, on_chunk)`.
+            task_description (str): The task to get code for.
+            result_filepath (str): Final location of the result.
+
+        Returns:
+            Optional[str]: The final result, or None if the agent returned none.
+        """
+        partial_filepath = f"{result_filepath}.part"
+        streamed = []
+        try:
+            with open(partial_filepath, 'w') as partial_file:
+                def write_chunk(chunk):
+                    streamed.append(chunk)
+                    partial_file.write(chunk)
+                    partial_file.flush()
+
+                result = agent.get_code(task_description, on_chunk=write_chunk)
+                if result is None:
+                    return None
+                if ''.join(streamed) != result:
+                    # The streamed text differs from the final result, e.g. no code field
+                    partial_file.seek(0)
+                    partial_file.truncate()
+                    partial_file.write(result)
+            os.replace(partial_filepath, result_filepath)
+            return result
+        finally:
+            if os.path.exists(partial_filepath):
+                os.remove(partial_filepath)
@@ -0,0 +1,285 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import signal
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set, Tuple
+from .request_processor import RequestProcessor
+
+class InotifyWatcher:
+    """Class for waiting on file changes in one directory with Linux inotify."""
+
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_Q_OVERFLOW = 0x4000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, path: str):
+        """
+        Start watching `path`.
+
+        Parameters:
+            path (str): The directory to watch. Sub-directories are not watched.
+
+        Raises:
+            OSError: If inotify is unavailable, e.g. on a non-Linux system.
+        """
+        library = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available on this system.")
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def wait(self, timeout: float) -> Optional[Set[str]]:
+        """
+        Wait up to `timeout` seconds for changes.
+
+        Returns:
+            Optional[Set[str]]: Names of the files that changed, or None if events
+                                were lost and the directory must be rescanned.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = self._EVENT.unpack_from(data, offset)
+                offset += self._EVENT.size
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if name:
+                    names.add(os.fsdecode(name))
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Class for detecting file changes in one directory by comparing listings."""
+
+    def __init__(self, path: str, interval: float = 0.5):
+        """
+        Start watching `path`.
+
+        Parameters:
+            path (str): The directory to watch. Sub-directories are not watched.
+            interval (float): Seconds between listings. Defaults to 0.5.
+        """
+        self.path = path
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def wait(self, timeout: float) -> Optional[Set[str]]:
+        """Sleep up to `timeout` seconds, then return the names of new or changed files."""
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._scan()
+        names = {name for name, signature in snapshot.items() if self._snapshot.get(name) != signature}
+        self._snapshot = snapshot
+        return names
+
+    def close(self):
+        pass
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError as e:
+            logging.warning(f"Could not list {self.path}: {e}")
+        return snapshot
+
+def create_watcher(path: str, poll_interval: float = 0.5):
+    """Return an InotifyWatcher for `path`, or a PollingWatcher where inotify is unavailable."""
+    try:
+        return InotifyWatcher(path)
+    except (OSError, AttributeError, TypeError) as e:
+        logging.info(f"inotify unavailable ({e}); polling {path} every {poll_interval}s.")
+        return PollingWatcher(path, poll_interval)
+
+class RequestWatcher:
+    """Class for processing request files as they appear, until stopped."""
+
+    def __init__(self, processor: RequestProcessor, debounce: float = 0.1, poll_interval: float = 0.5,
+                 watcher=None):
+        """
+        Initialize a RequestWatcher.
+
+        Parameters:
+            processor (RequestProcessor): Processes each request file. Its `max_workers`
+                                          sets how many files are processed at once.
+            debounce (float): Seconds a file must go unchanged before it is processed, so
+                              partially written files are not picked up. Defaults to 0.1.
+            poll_interval (float): Seconds between listings when inotify is unavailable.
+                                   Defaults to 0.5.
+            watcher (optional): Object with `wait(timeout)` and `close()`. Defaults to
+                                `create_watcher` on the request folder.
+        """
+        self.processor = processor
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.watcher = watcher
+        self.processed = 0
+        self.failed = 0
+        self._stop_event = threading.Event()
+        # Set when a file finishes, so a full pool can take the next one
+        self._slot_freed = threading.Event()
+        # Maps file name -> (time of the last change, (mtime_ns, size))
+        self._pending: Dict[str, Tuple[float, Optional[Tuple[int, int]]]] = {}
+        self._in_flight: Set[str] = set()
+        # Failed files are retried only once they change
+        self._failed_signatures: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def run(self, install_signal_handlers: bool = True):
+        """
+        Process request files until `stop` is called or SIGTERM/SIGINT is received.
+
+        Files already in the folder are processed first. At most `max_workers`
+        files are handed to the pool at a time; the rest stay pending, so on
+        shutdown no new files are started, and the call returns once the files
+        in progress are finished. Files left pending are picked up by the next run.
+
+        Parameters:
+            install_signal_handlers (bool): Stop on SIGTERM and SIGINT. Only possible
+                                            from the main thread. Defaults to True.
+        """
+        os.makedirs(self.processor.results_folder, exist_ok=True)
+        if self.watcher is None:
+            self.watcher = create_watcher(self.processor.request_folder, self.poll_interval)
+
+        previous_handlers = {}
+        if install_signal_handlers and threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous_handlers[signum] = signal.signal(signum, self._handle_signal)
+
+        logging.info(f"Watching {self.processor.request_folder} for requests.")
+        executor = ThreadPoolExecutor(max_workers=self.processor.max_workers)
+        try:
+            self._queue(self.processor.pending_requests())
+            while not self._stop_event.is_set():
+                self._slot_freed.clear()
+                if self._at_capacity():
+                    # Changes keep in the watcher until there is a free worker
+                    self._slot_freed.wait(self.poll_interval)
+                    continue
+                names = self.watcher.wait(self._next_timeout())
+                if names is None:
+                    names = self.processor.pending_requests()
+                self._queue(name for name in names if self._is_request(name))
+                for name in self._ready_files():
+                    with self._lock:
+                        self._in_flight.add(name)
+                    executor.submit(self._process, name)
+        finally:
+            logging.info("Stopping; waiting for requests in progress.")
+            executor.shutdown(wait=True)
+            self.watcher.close()
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+            logging.info(f"Stopped after processing {self.processed} requests ({self.failed} failed).")
+
+    def stop(self):
+        """Ask `run` to return once the files in progress are finished. Safe from any thread."""
+        self._stop_event.set()
+        self._slot_freed.set()
+
+    def _handle_signal(self, signum, frame):
+        logging.info(f"Received signal {signum}.")
+        self.stop()
+
+    def _is_request(self, name: str) -> bool:
+        return not name.startswith('_') and not os.path.isdir(os.path.join(self.processor.request_folder, name))
+
+    def _queue(self, names):
+        now = time.monotonic()
+        for name in names:
+            if name not in self._pending:
+                self._pending[name] = (now, self._signature(name))
+            else:
+                self._pending[name] = (now, self._pending[name][1])
+
+    def _next_timeout(self) -> float:
+        """Wake up when the earliest pending file is due, and regularly to notice `stop`."""
+        timeout = self.poll_interval
+        now = time.monotonic()
+        for last_change, _ in self._pending.values():
+            timeout = min(timeout, max(0.0, last_change + self.debounce - now))
+        return timeout
+
+    def _at_capacity(self) -> bool:
+        with self._lock:
+            return len(self._in_flight) >= self.processor.max_workers
+
+    def _ready_files(self):
+        """Yield the pending files that have not changed for `debounce` seconds, while workers are free."""
+        now = time.monotonic()
+        for name, (last_change, signature) in list(self._pending.items()):
+            if self._at_capacity():
+                return
+            if now - last_change < self.debounce:
+                continue
+            current = self._signature(name)
+            if current is None:
+                del self._pending[name]  # Removed or already renamed
+            elif current != signature:
+                self._pending[name] = (now, current)  # Still being written
+            else:
+                del self._pending[name]
+                with self._lock:
+                    skip = name in self._in_flight or self._failed_signatures.get(name) == current
+                if not skip:
+                    yield name
+
+    def _process(self, name: str):
+        signature = self._signature(name)
+        try:
+            succeeded = self.processor.process_file(name)
+        except Exception as e:
+            logging.error(f"Failed to process {name}: {e}")
+            succeeded = False
+        with self._lock:
+            self._in_flight.discard(name)
+            if succeeded:
+                self.processed += 1
+                self._failed_signatures.pop(name, None)
+            else:
+                self.failed += 1
+                if signature is not None:
+                    self._failed_signatures[name] = signature
+        self._slot_freed.set()
+
+    def _signature(self, name: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(self.processor.request_folder, name))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
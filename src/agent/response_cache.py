@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+class ResponseCache:
+    """Class for caching GPT API responses on disk, keyed by a hash of the request."""
+
+    def __init__(self, directory: str, max_entries: int = 1000,
+                 max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        """
+        Initialize the cache, loading any entries already stored in `directory`.
+
+        Parameters:
+            directory (str): Folder where cached responses are stored.
+            max_entries (int): Maximum number of cached responses. Defaults to 1000.
+            max_bytes (int, optional): Maximum total size of the cached files. Defaults to no limit.
+            ttl (float, optional): Seconds after which an entry expires. Defaults to never.
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        # Maps key -> file size, ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_entries()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict]) -> str:
+        """
+        Build the cache key for a request.
+
+        Parameters:
+            model (str): The model the request is sent to.
+            messages (List[Dict]): The full message list, including the system prompt.
+
+        Returns:
+            str: A SHA-256 hex digest of the model and messages.
+        """
+        payload = json.dumps({'model': model, 'messages': messages}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Return the cached response for `key`, or None on a miss or an expired entry.
+
+        Parameters:
+            key (str): A key from `make_key`.
+
+        Returns:
+            Optional[Dict]: The cached API response.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Dropping unreadable cache entry {path}: {e}")
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            if self.ttl is not None and time.time() - entry['created'] > self.ttl:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            os.utime(path)
+            self.hits += 1
+            self.saved_seconds += entry.get('elapsed', 0.0)
+            return entry['response']
+
+    def put(self, key: str, response: Dict, elapsed: float = 0.0):
+        """
+        Store a response and evict the least recently used entries that exceed the limits.
+
+        Parameters:
+            key (str): A key from `make_key`.
+            response (Dict): The API response to store.
+            elapsed (float): Seconds the original request took, counted as saved on each hit.
+        """
+        data = json.dumps({'created': time.time(), 'elapsed': elapsed, 'response': response})
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+
+        with self._lock:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+            self._total_bytes -= self._entries.pop(key, 0)
+            size = os.path.getsize(path)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> Dict:
+        """
+        Return the cache counters.
+
+        Returns:
+            Dict: Hits, misses, hit rate, seconds saved by hits, entry count and total bytes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'saved_seconds': self.saved_seconds,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_entries(self):
+        """Index the files already on disk, oldest access first."""
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.json'):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name[:-len('.json')], stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or
+                                 (self.max_bytes is not None and self._total_bytes > self.max_bytes)):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+class SingleFlight:
+    """Class for sharing one in-flight call among concurrent callers that use the same key."""
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        # Maps key -> the Future of the call in progress for it
+        self._in_flight: Dict[str, Future] = {}
+
+    def do(self, key: str, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Call `function`, unless a call with the same key is already in progress.
+
+        Callers that arrive while a call is in progress wait for it and receive its
+        result, or its exception. Once the call finishes the next caller starts a new one.
+
+        Parameters:
+            key (str): Identifies calls whose results are interchangeable.
+            function (Callable): Makes the call. Only run by the first caller.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it was shared from another caller's call.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            value = function()
+        except BaseException as e:
+            self._settle(key, future, exception=e)
+            raise
+        self._settle(key, future, value)
+        return value, False
+
+    async def do_async(self, key: str, function: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """
+        Await `function()`, unless a call with the same key is already in progress.
+
+        Shares calls with `do`, so coroutines and threads asking for the same key
+        wait on one call. The call runs in its own task, so cancelling any waiting
+        coroutine, the first caller included, does not cancel it for the others.
+
+        Parameters:
+            key (str): Identifies calls whose results are interchangeable.
+            function (Callable): Returns the awaitable that makes the call. Only run by the first caller.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it was shared from another caller's call.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+        try:
+            task = asyncio.ensure_future(function())
+        except BaseException as e:
+            self._settle(key, future, exception=e)
+            raise
+        task.add_done_callback(lambda task: self._settle_task(key, future, task))
+        return await asyncio.shield(task), False
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of calls made and the number of callers that shared one."""
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._in_flight)}
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """Return the Future for `key` and whether the caller must make the call."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            # A running Future cannot be cancelled, so a follower giving up leaves the others waiting
+            future.set_running_or_notify_cancel()
+            self._in_flight[key] = future
+            self.calls += 1
+            return future, True
+
+    def _settle(self, key: str, future: Future, value: Any = None, exception: BaseException = None):
+        with self._lock:
+            del self._in_flight[key]
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(value)
+
+    def _settle_task(self, key: str, future: Future, task: asyncio.Future):
+        if task.cancelled():
+            self._settle(key, future, exception=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._settle(key, future, exception=task.exception())
+        else:
+            self._settle(key, future, task.result())
+
+_default_single_flight = None
+_default_single_flight_lock = threading.Lock()
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide SingleFlight shared by agents that are not given their own."""
+    global _default_single_flight
+    with _default_single_flight_lock:
+        if _default_single_flight is None:
+            _default_single_flight = SingleFlight()
+        return _default_single_flight
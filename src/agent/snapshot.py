@@ -0,0 +1,48 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+def save_snapshot(path: str, data: Dict[str, Any]):
+    """
+    Save an index snapshot as JSON, replacing the file at `path` atomically.
+
+    JSON rather than pickle, so loading a shared or checked-in snapshot cannot
+    run code.
+
+    Parameters:
+        path (str): The snapshot file.
+        data (Dict[str, Any]): The snapshot, with the 'version' and 'root' that `load_snapshot` checks.
+                               Tuples come back as lists.
+    """
+    # Unique per writer, since agents in several threads or processes may share the file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+def load_snapshot(path: str, version: int, root: str, name: str) -> Optional[Dict[str, Any]]:
+    """
+    Load an index snapshot saved by `save_snapshot`.
+
+    Parameters:
+        path (str): The snapshot file.
+        version (int): The format version the caller understands.
+        root (str): The repository the snapshot must describe.
+        name (str): What the index is, for the warning about an unreadable file.
+
+    Returns:
+        Optional[Dict[str, Any]]: The snapshot, or None if it is unreadable, from another
+                                  version or of another repository.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable {name} {path}: {e}")
+        return None
+
+    if not isinstance(data, dict) or data.get('version') != version or data.get('root') != root:
+        return None
+    return data
@@ -0,0 +1,147 @@
+import json
+import re
+import string
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+def iter_sse_data(lines: Iterable[Union[bytes, str]]) -> Iterator[Dict]:
+    """
+    Parse server-sent event lines from a streaming chat completion.
+
+    Parameters:
+        lines (Iterable[Union[bytes, str]]): Raw lines, e.g. from `Response.iter_lines()`.
+
+    Returns:
+        Iterator[Dict]: The JSON payload of each `data:` event, stopping at `[DONE]`.
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.startswith('data:'):
+            continue  # Blank separators, comments and other fields
+
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            return
+        yield json.loads(data)
+
+def iter_content_deltas(lines: Iterable[Union[bytes, str]]) -> Iterator[str]:
+    """
+    Extract the content fragments from a streaming chat completion.
+
+    Parameters:
+        lines (Iterable[Union[bytes, str]]): Raw server-sent event lines.
+
+    Returns:
+        Iterator[str]: The non-empty content deltas, in order.
+    """
+    for event in iter_sse_data(lines):
+        delta = event.get('choices', [{}])[0].get('delta', {}).get('content')
+        if delta:
+            yield delta
+
+class JSONStringFieldDecoder:
+    """Class to decode one string field of a JSON object while the object is still arriving."""
+
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+    # Replaces a malformed \\u escape or a surrogate without its pair, instead of failing the stream
+    REPLACEMENT = '\ufffd'
+
+    def __init__(self, field: str):
+        """
+        Initialize the decoder.
+
+        Parameters:
+            field (str): Name of the string field to decode, e.g. 'code'.
+        """
+        self._start_pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ''
+        self._position: Optional[int] = None
+        self.done = False
+
+    def feed(self, text: str) -> str:
+        """
+        Add more raw JSON text and return the newly decoded part of the field value.
+
+        A `\\u` escape without four hex digits, or a surrogate that is not part
+        of a pair, is decoded as U+FFFD rather than raising.
+
+        Parameters:
+            text (str): The next fragment of the JSON document.
+
+        Returns:
+            str: Decoded characters of the field value that were not returned before.
+        """
+        self._buffer += text
+        if self.done:
+            return ''
+
+        if self._position is None:
+            match = self._start_pattern.search(self._buffer)
+            if match is None:
+                return ''
+            self._position = match.end()
+
+        decoded = []
+        buffer, i = self._buffer, self._position
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != '\\':
+                decoded.append(char)
+                i += 1
+                continue
+
+            # Wait for the rest of an escape sequence split across fragments
+            if i + 1 >= len(buffer):
+                break
+            escape = buffer[i + 1]
+            if escape != 'u':
+                decoded.append(self._ESCAPES.get(escape, escape))
+                i += 2
+                continue
+            code_point, length = self._hex(buffer, i + 2)
+            if code_point is None and i + 2 + length >= len(buffer):
+                break
+            if code_point is None:
+                # Skip only the hex digits, so a closing quote among the four characters still ends the value
+                decoded.append(self.REPLACEMENT)
+                i += 2 + length
+                continue
+            if 0xD800 <= code_point < 0xDC00:
+                # A high surrogate must be combined with the low surrogate that follows
+                follows = buffer[i + 6:i + 8]
+                if len(follows) < 2 and '\\u'.startswith(follows):
+                    break
+                low = None
+                if follows == '\\u':
+                    if i + 12 > len(buffer):
+                        break
+                    low, _ = self._hex(buffer, i + 8)
+                if low is None or not 0xDC00 <= low < 0xE000:
+                    # Leave whatever follows to be decoded on its own
+                    decoded.append(self.REPLACEMENT)
+                    i += 6
+                    continue
+                code_point = 0x10000 + ((code_point - 0xD800) << 10) + (low - 0xDC00)
+                i += 6
+            elif 0xDC00 <= code_point < 0xE000:
+                code_point = ord(self.REPLACEMENT)
+            decoded.append(chr(code_point))
+            i += 6
+
+        self._position = i
+        return ''.join(decoded)
+
+    @staticmethod
+    def _hex(buffer: str, start: int):
+        """Parse four hex digits at `start` into (code point, 4), or (None, count of leading hex digits)."""
+        digits = buffer[start:start + 4]
+        length = 0
+        while length < len(digits) and digits[length] in string.hexdigits:
+            length += 1
+        if length < 4:
+            return None, length
+        return int(digits, 16), 4
@@ -0,0 +1,244 @@
+import itertools
+import json
+import logging
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+from .gpt_agent import GPTAgent, Role
+
+# Required fields and their types for the JSON object each role is asked to reply with
+PROGRAMMER_SCHEMA = {'code': str}
+JOKESTER_SCHEMA = {'joke': str, 'answer': str}
+ROLE_SCHEMAS = {Role.PROGRAMMER: PROGRAMMER_SCHEMA, Role.JOKESTER: JOKESTER_SCHEMA}
+
+# strict=False accepts raw newlines and tabs inside strings, which models often emit in code
+_DECODER = json.JSONDecoder(strict=False)
+_FENCE_PATTERN = re.compile(r'```[a-zA-Z]*[ \t]*\n(.*?)```', re.DOTALL)
+
+class JSONObjectExtractor:
+    """Class to find the first complete JSON object in text that may arrive in pieces."""
+
+    def __init__(self):
+        self.result: Optional[Dict] = None
+        self._buffer = ''
+        self._position = 0
+        self._depth = 0
+        self._start = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> Optional[Dict]:
+        """
+        Add more text and return the object once its closing brace has arrived.
+
+        Text around the object, such as a markdown fence or a sentence of
+        preamble, is skipped. Brace groups that are not valid JSON are passed over.
+
+        Parameters:
+            text (str): The next fragment of the reply.
+
+        Returns:
+            Optional[Dict]: The first complete object, or None while it is still incomplete.
+        """
+        self._buffer += text
+        if self.result is not None:
+            return self.result
+
+        buffer = self._buffer
+        for i in range(self._position, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                # Quotes in the surrounding prose are not JSON strings
+                self._in_string = self._depth > 0
+            elif char == '{':
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.result = _decode_object(buffer[self._start:i + 1])
+                    if self.result is not None:
+                        self._position = i + 1
+                        return self.result
+        self._position = len(buffer)
+        return None
+
+    def close(self) -> Optional[Dict]:
+        """
+        Finish the input and return the object, trying harder if the scan found none.
+
+        A stray brace in the preamble can leave the scan inside an object that
+        never closes, so every remaining brace is tried as the start of one.
+
+        Returns:
+            Optional[Dict]: The first JSON object in the text, or None if there is none.
+        """
+        if self.result is None:
+            index = self._buffer.find('{')
+            while index != -1 and self.result is None:
+                try:
+                    value, _ = _DECODER.raw_decode(self._buffer, index)
+                    if isinstance(value, dict):
+                        self.result = value
+                except json.JSONDecodeError:
+                    pass
+                index = self._buffer.find('{', index + 1)
+        return self.result
+
+def extract_json(text: str) -> Optional[Dict]:
+    """
+    Extract the JSON object from a model reply.
+
+    A reply that is exactly a JSON object is decoded directly. Otherwise a
+    fenced code block holding an object is preferred, and then the first
+    balanced object anywhere in the text.
+
+    Parameters:
+        text (str): The raw reply.
+
+    Returns:
+        Optional[Dict]: The object, or None if the reply holds none.
+    """
+    return next(_iter_json_candidates(text), None)
+
+def validate(data: Dict, schema: Dict[str, type]) -> List[str]:
+    """
+    Check that `data` has every field in `schema` with the right type.
+
+    Parameters:
+        data (Dict): The decoded reply.
+        schema (Dict[str, type]): Maps each required field to its type.
+
+    Returns:
+        List[str]: One message per problem; empty if the data is valid.
+    """
+    problems = []
+    for field, field_type in schema.items():
+        if field not in data:
+            problems.append(f'missing field "{field}"')
+        elif not isinstance(data[field], field_type):
+            problems.append(f'field "{field}" must be a {field_type.__name__}, '
+                            f'not {type(data[field]).__name__}')
+    return problems
+
+def parse_structured(text: str, schema: Dict[str, type],
+                     extracted: Optional[Dict] = None) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Extract and validate the JSON object in a reply.
+
+    Parameters:
+        text (str): The raw reply.
+        schema (Dict[str, type]): The fields the object must have.
+        extracted (Dict, optional): The object, if a JSONObjectExtractor already
+                                    found it while the reply streamed in. It is tried first.
+
+    Returns:
+        Tuple[Optional[Dict], Optional[str]]: The valid object and None, or None and
+                                              a description of what is wrong.
+    """
+    # An object that does not fit the schema, e.g. an example in the preamble, does not
+    # rule out a valid one later in the reply, so each extraction strategy is tried in turn
+    candidates = _iter_json_candidates(text)
+    if extracted is not None:
+        candidates = itertools.chain([extracted], candidates)
+
+    first_problems = None
+    tried = []
+    for data in candidates:
+        if data in tried:
+            continue
+        tried.append(data)
+        problems = validate(data, schema)
+        if not problems:
+            return data, None
+        if first_problems is None:
+            first_problems = problems
+    if first_problems is None:
+        return None, 'the reply did not contain a JSON object'
+    return None, '; '.join(first_problems)
+
+def repair_structured(agent: GPTAgent, reply: str, problem: str, schema: Dict[str, type],
+                      max_repairs: int = 1) -> Optional[Dict]:
+    """
+    Ask the model to correct a reply that could not be used.
+
+    This costs another round-trip, so it is only worth doing once tolerant
+    extraction has failed.
+
+    Parameters:
+        agent (GPTAgent): The agent that produced `reply`.
+        reply (str): The unusable reply.
+        problem (str): What is wrong with it, from `parse_structured`.
+        schema (Dict[str, type]): The fields the object must have.
+        max_repairs (int): Number of corrections to ask for. Defaults to 1.
+
+    Returns:
+        Optional[Dict]: The corrected object, or None if every correction failed.
+    """
+    fields = ', '.join(f'"{field}" ({field_type.__name__})' for field, field_type in schema.items())
+    for _ in range(max_repairs):
+        agent.metrics.add('structured.repairs')
+        correction = (f'Your previous reply could not be used: {problem}. '
+                      f'Reply with only a JSON object with the fields {fields}, and no other text.')
+        if agent.memory is None:
+            # Without memory the model cannot see what it replied
+            correction += f'\n\nPrevious reply:\n{reply}'
+        reply = agent.ask_query(correction)
+        data, problem = parse_structured(reply, schema)
+        if data is not None:
+            return data
+
+    agent.metrics.add('structured.failures')
+    logging.error(f'Could not get a valid structured reply: {problem}')
+    return None
+
+def ask_structured(agent: GPTAgent, query: str, schema: Optional[Dict[str, type]] = None,
+                   max_repairs: int = 1) -> Optional[Dict]:
+    """
+    Send a query and return the JSON object in the reply.
+
+    Parameters:
+        agent (GPTAgent): The agent to ask.
+        query (str): The query.
+        schema (Dict[str, type], optional): The fields the object must have. Defaults
+                                            to the schema for the agent's role.
+        max_repairs (int): Corrections to ask for if the reply is unusable. Defaults to 1.
+
+    Returns:
+        Optional[Dict]: The object, or None if no valid reply was received.
+    """
+    schema = schema if schema is not None else ROLE_SCHEMAS[agent.role]
+    reply = agent.ask_query(query)
+    data, problem = parse_structured(reply, schema)
+    if data is not None:
+        return data
+    return repair_structured(agent, reply, problem, schema, max_repairs)
+
+def _iter_json_candidates(text: str) -> Iterator[Dict]:
+    """Yield the objects in a reply, best first: the whole text, fenced blocks, then the first in the text."""
+    result = _decode_object(text.strip())
+    if result is not None:
+        yield result
+    for match in _FENCE_PATTERN.finditer(text):
+        result = _decode_object(match.group(1).strip())
+        if result is not None:
+            yield result
+    extractor = JSONObjectExtractor()
+    extractor.feed(text)
+    result = extractor.close()
+    if result is not None:
+        yield result
+
+def _decode_object(text: str) -> Optional[Dict]:
+    try:
+        value = _DECODER.decode(text)
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
@@ -0,0 +1,272 @@
+import ast
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from .snapshot import load_snapshot, save_snapshot
+from .tokens import estimate_tokens
+from .walker import iter_files
+
+# A class or function definition. `depth` is how many classes it is nested in,
+# `signature` is '(bases)' for a class and '(arguments) -> returns' for a function
+Symbol = namedtuple('Symbol', ['kind', 'name', 'signature', 'doc', 'line', 'depth'])
+
+if hasattr(ast, 'unparse'):
+    _unparse = ast.unparse
+else:
+    # Python < 3.9 has no ast.unparse
+    import astor
+
+    def _unparse(node):
+        return astor.to_source(node).strip()
+
+def _first_line(docstring: Optional[str]) -> str:
+    return docstring.strip().splitlines()[0].strip() if docstring and docstring.strip() else ''
+
+def parse_symbols(source: str) -> Optional[Dict]:
+    """
+    List the classes and functions defined in Python source.
+
+    Functions nested inside functions are implementation details and are left out.
+
+    Parameters:
+        source (str): The contents of a Python file.
+
+    Returns:
+        Dict: {'doc': first line of the module docstring, 'symbols': List[Symbol]} in
+              source order, or None if the source does not parse.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    symbols = []
+
+    def visit(body, depth):
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                bases = [_unparse(base) for base in node.bases] + [_unparse(keyword) for keyword in node.keywords]
+                signature = f"({', '.join(bases)})" if bases else ''
+                kind = 'class'
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                signature = f'({_unparse(node.args)})'
+                if node.returns is not None:
+                    signature += f' -> {_unparse(node.returns)}'
+                kind = 'async def' if isinstance(node, ast.AsyncFunctionDef) else 'def'
+            else:
+                continue
+            decorators = ''.join(f'@{_unparse(decorator)} ' for decorator in node.decorator_list)
+            symbols.append(Symbol(decorators + kind, node.name, signature,
+                                  _first_line(ast.get_docstring(node)), node.lineno, depth))
+            if kind == 'class':
+                visit(node.body, depth + 1)
+
+    visit(tree.body, 0)
+    return {'doc': _first_line(ast.get_docstring(tree)), 'symbols': symbols}
+
+def _is_private(name: str) -> bool:
+    return name.startswith('_') and not (name.startswith('__') and name.endswith('__'))
+
+def render_outline(relative_path: str, parsed: Dict, include_private: bool = False) -> str:
+    """
+    Render one file's symbols as an indented outline.
+
+    Parameters:
+        relative_path (str): The file's path, used as the heading.
+        parsed (Dict): The value `parse_symbols` returned for the file.
+        include_private (bool): Also list '_private' names and their members. Defaults to False.
+
+    Returns:
+        str: '# <path>' followed by one 'def name(arguments) -> returns  # docstring' line per symbol.
+    """
+    lines = [f"# {relative_path}" + (f": {parsed['doc']}" if parsed['doc'] else '')]
+    hidden_depth = None
+    for symbol in parsed['symbols']:
+        if hidden_depth is not None:
+            if symbol.depth > hidden_depth:
+                continue
+            hidden_depth = None
+        if not include_private and _is_private(symbol.name):
+            hidden_depth = symbol.depth
+            continue
+        line = f"{'  ' * symbol.depth}{symbol.kind} {symbol.name}{symbol.signature}"
+        lines.append(line + (f"  # {symbol.doc}" if symbol.doc else ''))
+    return '\n'.join(lines)
+
+class SymbolIndex:
+    """Class for outlining the classes and functions of a repository's Python files."""
+
+    VERSION = 2
+
+    def __init__(self, root: str, index_path: Optional[str] = None,
+                 exclusions: Iterable[str] = ('.git', '__pycache__', 'node_modules', 'venv', '.venv'),
+                 max_file_bytes: int = 1_000_000, workers: Optional[int] = None, parallel_threshold: int = 64,
+                 respect_gitignore: bool = True):
+        """
+        Initialize the index, loading the snapshot at `index_path` if it exists.
+
+        Parameters:
+            root (str): Root folder of the repository to index.
+            index_path (str, optional): File where the index is persisted. Defaults to memory only.
+            exclusions (Iterable[str]): Folder or file names that are not indexed.
+            max_file_bytes (int): Files larger than this are skipped. Defaults to 1 MB.
+            workers (int, optional): Processes parsing files in parallel. Defaults to one per CPU.
+            parallel_threshold (int): Fewest files worth starting the process pool for; smaller
+                                      updates are parsed in this process. Defaults to 64.
+            respect_gitignore (bool): Skip files matched by .gitignore files. Defaults to True.
+        """
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
+        self.exclusions = set(exclusions)
+        self.max_file_bytes = max_file_bytes
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel_threshold = parallel_threshold
+        self.respect_gitignore = respect_gitignore
+        # Maps relative path -> {'mtime_ns', 'size', 'hash'}; the hash is None for skipped files
+        self._files: Dict[str, Dict] = {}
+        # Maps content hash -> parse_symbols() result, so identical files are parsed once
+        self._parsed: Dict[str, Optional[Dict]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        if index_path is not None and os.path.exists(index_path):
+            self._load()
+
+    def update(self) -> int:
+        """
+        Bring the index up to date with the Python files on disk.
+
+        Files whose size and mtime are unchanged are skipped without being read.
+        Changed files are hashed and only parsed if no file with the same content
+        has been parsed before.
+
+        Returns:
+            int: The number of distinct file contents that were parsed.
+        """
+        with self._lock:
+            seen = set()
+            pending: Dict[str, str] = {}
+            for relative_path, stat in iter_files(self.root, self.exclusions, self.respect_gitignore, ('.py',)):
+                seen.add(relative_path)
+                record = self._files.get(relative_path)
+                if record is not None and (record['mtime_ns'], record['size']) == (stat.st_mtime_ns, stat.st_size):
+                    continue
+
+                source = self._read_source(relative_path)
+                # Large or unreadable files are recorded without a hash, so they are not read again until they change
+                digest = None if source is None else hashlib.sha1(source.encode('utf-8')).hexdigest()
+                self._files[relative_path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': digest}
+                self._dirty = True
+                if digest is not None and digest not in self._parsed:
+                    pending[digest] = source
+
+            for relative_path in set(self._files) - seen:
+                del self._files[relative_path]
+                self._dirty = True
+
+            self._parsed.update(self._parse_all(pending))
+            # Forget the outlines of content no file has any more
+            live = {record['hash'] for record in self._files.values()}
+            for digest in set(self._parsed) - live:
+                del self._parsed[digest]
+            return len(pending)
+
+    def paths(self) -> List[str]:
+        """Return the relative paths of the indexed files that parsed, sorted."""
+        with self._lock:
+            return sorted(path for path, record in self._files.items() if self._parsed.get(record['hash']))
+
+    def symbols(self, relative_path: str) -> Optional[Dict]:
+        """Return the `parse_symbols` result for an indexed file, or None if it is unknown or did not parse."""
+        with self._lock:
+            record = self._files.get(relative_path)
+            return None if record is None else self._parsed.get(record['hash'])
+
+    def outline(self, paths: Optional[Iterable[str]] = None, max_tokens: Optional[int] = None,
+                include_private: bool = False) -> str:
+        """
+        Outline the given files within a token budget.
+
+        Parameters:
+            paths (Iterable[str], optional): Relative paths in order of importance. Defaults
+                                             to every indexed file, sorted.
+            max_tokens (int, optional): Estimated token budget; files that do not fit are
+                                        left out. Defaults to no limit.
+            include_private (bool): Also list '_private' names. Defaults to False.
+
+        Returns:
+            str: The outlines of the files, separated by blank lines.
+        """
+        sections = []
+        used = 0
+        for relative_path in (self.paths() if paths is None else paths):
+            parsed = self.symbols(relative_path)
+            if not parsed:
+                continue
+            section = render_outline(relative_path, parsed, include_private)
+            cost = estimate_tokens(section + '\n\n')
+            if max_tokens is not None and used + cost > max_tokens:
+                continue
+            sections.append(section)
+            used += cost
+        return '\n\n'.join(sections)
+
+    def save(self):
+        """Persist the index to `index_path` if it changed since it was loaded or saved."""
+        with self._lock:
+            if self.index_path is None or not self._dirty:
+                return
+            save_snapshot(self.index_path, {'version': self.VERSION, 'root': self.root, 'files': self._files,
+                                            'parsed': self._parsed})
+            self._dirty = False
+
+    def _parse_all(self, sources: Dict[str, str]) -> Dict[str, Optional[Dict]]:
+        """Parse sources keyed by content hash, across a process pool when there are enough of them."""
+        if self.workers > 1 and len(sources) >= self.parallel_threshold:
+            digests = list(sources)
+            chunksize = max(1, len(digests) // (self.workers * 4))
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers, mp_context=_process_context()) as executor:
+                    results = executor.map(parse_symbols, (sources[digest] for digest in digests), chunksize=chunksize)
+                    return dict(zip(digests, results))
+            except Exception as e:
+                # E.g. a platform without working multiprocessing; parsing here is only slower
+                logging.warning(f"Parsing {len(digests)} files in one process, the process pool failed: {e}")
+        return {digest: parse_symbols(source) for digest, source in sources.items()}
+
+    def _read_source(self, relative_path: str) -> Optional[str]:
+        """Read a Python file, returning None for large or unreadable files."""
+        path = os.path.join(self.root, relative_path)
+        try:
+            if os.path.getsize(path) > self.max_file_bytes:
+                return None
+            with open(path, 'rb') as f:
+                return f.read().decode('utf-8', errors='replace')
+        except OSError:
+            return None
+
+    def _load(self):
+        data = load_snapshot(self.index_path, self.VERSION, self.root, 'symbol index')
+        if data is None:
+            return
+        self._files = data['files']
+        # JSON stores each Symbol as a list
+        self._parsed = {digest: parsed if parsed is None else
+                        {'doc': parsed['doc'], 'symbols': [Symbol(*symbol) for symbol in parsed['symbols']]}
+                        for digest, parsed in data['parsed'].items()}
+
+def _process_context():
+    """
+    Return a multiprocessing context that is safe to start from a threaded process.
+
+    Forking copies whatever locks other threads hold at that moment, which can
+    deadlock the children, so a fresh interpreter is started instead.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
@@ -0,0 +1,35 @@
+import math
+from typing import Dict, List
+
+# Rough average for English text and code with the GPT tokenizers
+CHARS_PER_TOKEN = 4
+# Per-message framing tokens added by the chat completions format
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text.
+
+    Parameters:
+        text (str): The text to measure.
+
+    Returns:
+        int: An estimate that errs on the high side for typical code and prose.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def estimate_message_tokens(messages: List[Dict]) -> int:
+    """
+    Estimate the prompt tokens of a chat completion message list.
+
+    Parameters:
+        messages (List[Dict]): Messages with 'role' and 'content' keys.
+
+    Returns:
+        int: The estimated prompt size, including message framing.
+    """
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + estimate_tokens(message.get('content') or '')
+    return total
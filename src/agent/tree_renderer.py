@@ -0,0 +1,141 @@
+import math
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from .tokens import estimate_tokens
+
+INDENT = '  '
+
+def render_tree(structure: dict, max_tokens: Optional[int] = None,
+                max_children: Optional[int] = None) -> str:
+    """
+    Render a `CodebaseAgent` directory structure as a compact indented listing.
+
+    Directories end with '/'. When a token budget is given, directories are
+    expanded breadth first while they fit, so the top of the tree is always
+    shown. Directories that do not fit are collapsed into a one-line summary
+    such as 'venv/ (1523 files, 210 dirs)'. Wide directories are cut short
+    with a '... (N more)' line.
+
+    Parameters:
+        structure (dict): Nested dictionary where directories map to dictionaries
+                          and files map to None.
+        max_tokens (int, optional): Estimated token budget for the output. Defaults to no limit.
+        max_children (int, optional): Maximum entries listed per directory. Defaults to no limit.
+
+    Returns:
+        str: The rendered tree, one entry per line.
+    """
+    renderer = _TreeRenderer(structure, max_children)
+    renderer.plan(math.inf if max_tokens is None else max_tokens)
+    return '\n'.join(renderer.render())
+
+class _TreeRenderer:
+    """Helper that decides which directories to expand and renders the result."""
+
+    def __init__(self, structure: dict, max_children: Optional[int]):
+        self.structure = structure
+        self.max_children = max_children
+        self.totals: Dict[int, Tuple[int, int]] = {}
+        # Maps id(directory) -> number of children shown, for expanded directories
+        self.shown: Dict[int, int] = {}
+        self._count(structure)
+
+    def plan(self, budget: float):
+        used = 0
+        queue = deque([(self.structure, None, 0)])
+
+        while queue:
+            node, name, depth = queue.popleft()
+            children = self._children(node)
+            limit = len(children) if self.max_children is None else min(len(children), self.max_children)
+            indent = INDENT * depth
+
+            # Expanding a directory replaces its summary line with a plain one
+            refund = 0
+            if name is not None:
+                line_indent = INDENT * (depth - 1)
+                refund = _cost(self._collapsed_line(name, node, line_indent)) - _cost(f"{line_indent}{name}/")
+            available = budget - used + refund
+
+            prefix_costs = [0]
+            for child_name, child in children[:limit]:
+                prefix_costs.append(prefix_costs[-1] + _cost(self._child_line(child_name, child, indent)))
+
+            for shown in range(limit, -1, -1):
+                spent = prefix_costs[shown]
+                if shown < len(children):
+                    spent += _cost(_more_line(len(children) - shown, indent))
+                if spent <= available:
+                    break
+            else:
+                continue  # Not even a '... (N more)' line fits
+
+            if shown == 0 and name is not None:
+                continue  # Keep the directory collapsed rather than show only '...'
+
+            self.shown[id(node)] = shown
+            used += spent - refund
+            for child_name, child in children[:shown]:
+                if child:
+                    queue.append((child, child_name, depth + 1))
+
+    def render(self) -> List[str]:
+        lines = []
+        if id(self.structure) in self.shown:
+            self._render(self.structure, '', lines)
+        return lines
+
+    def _render(self, node: dict, indent: str, lines: List[str]):
+        children = self._children(node)
+        shown = self.shown[id(node)]
+        for name, child in children[:shown]:
+            if child is None:
+                lines.append(f"{indent}{name}")
+            elif not child or id(child) in self.shown:
+                lines.append(f"{indent}{name}/")
+                if child:
+                    self._render(child, indent + INDENT, lines)
+            else:
+                lines.append(self._collapsed_line(name, child, indent))
+        if shown < len(children):
+            lines.append(_more_line(len(children) - shown, indent))
+
+    def _child_line(self, name: str, child: Optional[dict], indent: str) -> str:
+        if child is None:
+            return f"{indent}{name}"
+        return self._collapsed_line(name, child, indent)
+
+    def _collapsed_line(self, name: str, node: dict, indent: str) -> str:
+        if not node:
+            return f"{indent}{name}/"
+        files, dirs = self.totals[id(node)]
+        parts = [_plural(files, 'file')] if files else []
+        if dirs:
+            parts.append(_plural(dirs, 'dir'))
+        return f"{indent}{name}/ ({', '.join(parts)})"
+
+    def _count(self, node: dict) -> Tuple[int, int]:
+        files, dirs = 0, 0
+        for child in node.values():
+            if child is None:
+                files += 1
+            else:
+                child_files, child_dirs = self._count(child)
+                files += child_files
+                dirs += child_dirs + 1
+        self.totals[id(node)] = (files, dirs)
+        return files, dirs
+
+    @staticmethod
+    def _children(node: dict) -> List[Tuple[str, Optional[dict]]]:
+        """Return the entries of a directory, sub-directories first, each group sorted by name."""
+        return sorted(node.items(), key=lambda item: (item[1] is None, item[0].lower(), item[0]))
+
+def _cost(line: str) -> int:
+    return estimate_tokens(line + '\n')
+
+def _more_line(count: int, indent: str) -> str:
+    return f"{indent}... ({count} more)"
+
+def _plural(count: int, noun: str) -> str:
+    return f"{count} {noun}" if count == 1 else f"{count} {noun}s"
@@ -0,0 +1,284 @@
+import logging
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+def scan_directory(path: str) -> Tuple[List[str], List[str], List[str]]:
+    """
+    List a directory with a single `os.scandir` call.
+
+    Parameters:
+        path (str): The directory to list.
+
+    Returns:
+        Tuple[List[str], List[str], List[str]]: Sub-directories, files and symlinked
+                                                directories. Empty if unreadable.
+    """
+    dirs, files, linked_dirs = [], [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    files.append(entry.name)
+                elif entry.is_symlink():
+                    linked_dirs.append(entry.name)
+                else:
+                    dirs.append(entry.name)
+    except OSError:
+        return [], [], []
+    return dirs, files, linked_dirs
+
+class GitIgnore:
+    """Class for matching paths against gitignore-style patterns."""
+
+    def __init__(self, patterns: Iterable[str] = (), base: str = ''):
+        """
+        Initialize the matcher.
+
+        Parameters:
+            patterns (Iterable[str]): Lines in .gitignore syntax.
+            base (str): Directory of the .gitignore file, relative to the walk root,
+                        using '/' separators. Defaults to the root.
+        """
+        self.base = base.strip('/')
+        self.rules = []
+        for line in patterns:
+            rule = self._parse(line)
+            if rule is not None:
+                self.rules.append(rule)
+
+    @classmethod
+    def from_file(cls, path: str, base: str = '') -> 'GitIgnore':
+        """Load the patterns of a .gitignore file."""
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return cls(f.read().splitlines(), base)
+        except OSError as e:
+            logging.warning(f"Could not read {path}: {e}")
+            return cls((), base)
+
+    def match(self, relative_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Check a path against the patterns.
+
+        Parameters:
+            relative_path (str): Path relative to the walk root, using '/' separators.
+            is_dir (bool): Whether the path is a directory.
+
+        Returns:
+            Optional[bool]: True if ignored, False if re-included by a negated pattern,
+                            None if no pattern matches.
+        """
+        if self.base:
+            if not relative_path.startswith(self.base + '/'):
+                return None
+            relative_path = relative_path[len(self.base) + 1:]
+
+        name = relative_path.rpartition('/')[2]
+        result = None
+        for regex, negated, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(relative_path if anchored else name):
+                result = not negated
+        return result
+
+    @classmethod
+    def _parse(cls, line: str):
+        line = line.rstrip('\n')
+        if not line.strip() or line.startswith('#'):
+            return None
+        if not line.endswith('\\ '):
+            line = line.rstrip()
+
+        negated = line.startswith('!')
+        if negated or line.startswith('\\!') or line.startswith('\\#'):
+            line = line[1:]
+
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+
+        # Patterns with a slash before the end are relative to the .gitignore directory,
+        # the others are matched against the last path component only
+        anchored = '/' in line
+        line = line.lstrip('/')
+        return re.compile(cls._translate(line), re.DOTALL), negated, dir_only, anchored
+
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        regex, i, length = [], 0, len(pattern)
+        while i < length:
+            if pattern.startswith('**/', i) and (i == 0 or pattern[i - 1] == '/'):
+                regex.append('(?:.*/)?')
+                i += 3
+            elif pattern.startswith('**', i) and i + 2 == length and (i == 0 or pattern[i - 1] == '/'):
+                regex.append('.*')
+                i += 2
+            elif pattern[i] == '*':
+                regex.append('[^/]*')
+                i += 1
+            elif pattern[i] == '?':
+                regex.append('[^/]')
+                i += 1
+            elif pattern[i] == '[':
+                end = pattern.find(']', i + 2)
+                if end == -1:
+                    regex.append(re.escape('['))
+                    i += 1
+                    continue
+                body = pattern[i + 1:end].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                regex.append(f'[{body}]')
+                i = end + 1
+            elif pattern[i] == '\\' and i + 1 < length:
+                regex.append(re.escape(pattern[i + 1]))
+                i += 2
+            else:
+                regex.append(re.escape(pattern[i]))
+                i += 1
+        return ''.join(regex)
+
+def walk_directory_structure(start_path: str, exclusions: Iterable[str] = (),
+                             respect_gitignore: bool = False, ignore_patterns: Iterable[str] = (),
+                             max_depth: Optional[int] = None, workers: int = 1,
+                             list_dir: Callable[[str], Tuple[List[str], List[str], List[str]]] = scan_directory) -> dict:
+    """
+    Build the nested directory structure rooted at `start_path`.
+
+    The result has the same shape as `CodebaseAgent.get_directory_structure`:
+    directories map to dictionaries and files map to None. Symlinked directories
+    are listed but not followed. Excluded and ignored directories are never read.
+
+    Parameters:
+        start_path (str): The directory to start scanning from.
+        exclusions (Iterable[str]): Folder or file names to exclude.
+        respect_gitignore (bool): Apply the .gitignore files found while walking and
+                                  skip '.git'. Defaults to False.
+        ignore_patterns (Iterable[str]): Extra gitignore-style patterns, relative to `start_path`.
+        max_depth (int, optional): Deepest level whose contents are listed; 0 lists only
+                                   `start_path` itself. Defaults to no limit.
+        workers (int): Number of threads listing directories in parallel. Defaults to 1.
+        list_dir (Callable): Lists one directory. Defaults to `scan_directory`.
+
+    Returns:
+        dict: A dictionary representing the directory structure.
+    """
+    exclusions = set(exclusions)
+    if respect_gitignore:
+        exclusions.add('.git')
+    base_rules = [GitIgnore(ignore_patterns)] if ignore_patterns else []
+
+    def scan(path, relative_path, subtree, rules, depth):
+        dirs, files, linked_dirs = list_dir(path)
+        if respect_gitignore and '.gitignore' in files:
+            rules = rules + [GitIgnore.from_file(os.path.join(path, '.gitignore'), relative_path)]
+
+        def keep(name, is_dir):
+            return name not in exclusions and not _is_ignored(rules, prefix + name, is_dir)
+
+        if rules:
+            prefix = f"{relative_path}/" if relative_path else ''
+            dirs = [name for name in dirs if keep(name, True)]
+            linked_dirs = [name for name in linked_dirs if keep(name, True)]
+            files = [name for name in files if keep(name, False)]
+        elif exclusions:
+            dirs = [name for name in dirs if name not in exclusions]
+            linked_dirs = [name for name in linked_dirs if name not in exclusions]
+            files = [name for name in files if name not in exclusions]
+
+        children = []
+        descend = max_depth is None or depth < max_depth
+        for name in dirs:
+            subtree[name] = {}
+            if descend:
+                child_relative = f"{relative_path}/{name}" if relative_path else name
+                children.append((os.path.join(path, name), child_relative, subtree[name], rules, depth + 1))
+        for name in linked_dirs:
+            subtree[name] = {}
+        subtree.update(dict.fromkeys(files))
+        return children
+
+    structure = {}
+    root_task = (os.path.abspath(start_path), '', structure, base_rules, 0)
+
+    if workers <= 1:
+        stack = [root_task]
+        while stack:
+            stack.extend(scan(*stack.pop()))
+        return structure
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(scan, *root_task)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for task in future.result():
+                    pending.add(executor.submit(scan, *task))
+    return structure
+
+def iter_files(root: str, exclusions: Iterable[str] = (), respect_gitignore: bool = True,
+               suffixes: Optional[Tuple[str, ...]] = None) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    Yield every regular file under `root` with its stat, e.g. to update an index incrementally.
+
+    Symlinks are skipped, and unreadable directories are logged and skipped.
+
+    Parameters:
+        root (str): The directory to walk.
+        exclusions (Iterable[str]): Folder or file names to skip.
+        respect_gitignore (bool): Apply the .gitignore files found while walking and
+                                  skip '.git'. Defaults to True.
+        suffixes (Tuple[str, ...], optional): Only yield files ending in one of these,
+                                              e.g. ('.py',). Defaults to every file.
+
+    Returns:
+        Iterator[Tuple[str, os.stat_result]]: The path relative to `root`, using '/'
+                                              separators, and the stat of each file.
+    """
+    exclusions = set(exclusions)
+    if respect_gitignore:
+        exclusions.add('.git')
+
+    stack = [(os.path.abspath(root), '', [])]
+    while stack:
+        path, relative_path, rules = stack.pop()
+        try:
+            with os.scandir(path) as entries:
+                entries = list(entries)
+        except OSError as e:
+            logging.warning(f"Skipping unreadable directory {path}: {e}")
+            continue
+        if respect_gitignore and any(entry.name == '.gitignore' for entry in entries):
+            rules = rules + [GitIgnore.from_file(os.path.join(path, '.gitignore'), relative_path)]
+
+        prefix = f"{relative_path}/" if relative_path else ''
+        for entry in entries:
+            if entry.name in exclusions:
+                continue
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if not is_dir and not (entry.is_file(follow_symlinks=False)
+                                       and (suffixes is None or entry.name.endswith(suffixes))):
+                    continue
+                if _is_ignored(rules, prefix + entry.name, is_dir):
+                    continue
+                if is_dir:
+                    stack.append((entry.path, prefix + entry.name, rules))
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            yield prefix + entry.name, stat
+
+def _is_ignored(rules: List[GitIgnore], relative_path: str, is_dir: bool) -> bool:
+    """Apply .gitignore rules in order, so a deeper file's patterns override a shallower one's."""
+    ignored = None
+    for rule in rules:
+        matched = rule.match(relative_path, is_dir)
+        if matched is not None:
+            ignored = matched
+    return bool(ignored)
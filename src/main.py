@@ -1,140 +1,336 @@
-import json
-import os
-import shutil
-import pyperclip
-from agent.codebase import CodebaseAgent
-from agent.git_agent import GitAgent  # Assuming your GitAgent class is in a file called git_agent.py
-from agent.gpt_agent import GPTAgent, Role
+"""Command line entry point.
+
+Usage:
+    python src/main.py process-requests [--workers 4] [--stream] [--watch] [--journal jobs.db] [--mode patch]
+    python src/main.py show-structure [PATH] [--all]
+    python src/main.py setup-repo USERNAME REPOSITORY [--private]
+    python src/main.py open-pr USERNAME REPOSITORY --branch NAME --message MESSAGE [--title T] [--body B]
+
+Only the standard library is imported up front. Each command imports the agents,
+`requests` and the local `config` module when it runs, so `--help` and commands
+that need no API access start quickly and work without a config file.
+"""
+import argparse
 import logging
-from agent.programmer import ProgrammerAgent
-import config  # Import your config file
+import os
+import sys
+
+def main(argv=None):
+    """Run the command given on the command line.
 
-def main():
+    Parameters:
+        argv (List[str], optional): The arguments. Defaults to `sys.argv[1:]`.
+
+    Returns:
+        int: The process exit code.
+    """
+    args = build_parser().parse_args(argv)
     logging.basicConfig(level=logging.INFO)
+    return args.handler(args)
+
+def build_parser():
+    """Build the argument parser with one sub-parser per command."""
+    parser = argparse.ArgumentParser(
+        prog='main.py', description='Generate code with GPT agents and manage the GitHub workflow around it.')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND', required=True)
+
+    process = subparsers.add_parser('process-requests', help='Generate code for the files in the requests folder.')
+    process.add_argument('--workers', type=int, default=1, help='Request files processed in parallel.')
+    process.add_argument('--stream', action='store_true', help='Write each result to disk while it is generated.')
+    process.add_argument('--watch', action='store_true',
+                         help='Keep running and process new files as they arrive, until SIGTERM or Ctrl+C.')
+    process.add_argument('--debounce', type=float, default=0.1,
+                         help='With --watch, seconds a file must stay unchanged before it is processed.')
+    process.add_argument('--journal', metavar='PATH', help='SQLite job journal shared by every worker process.')
+    process.add_argument('--metrics', metavar='PATH', help='Append the stage timings to this JSON lines file.')
+    process.add_argument('--mode', choices=('code', 'patch'), default='code',
+                         help="'code' saves the generated code; 'patch' asks for a unified diff and applies it "
+                              "to the output project.")
+    process.add_argument('--index', metavar='PATH',
+                         help="Keep the output project's directory index in this file between runs.")
+    process.add_argument('--hedge', nargs='?', const='auto', type=hedge_delay, metavar='SECONDS',
+                         help="Send a duplicate of a GPT request that is slower than SECONDS, or, with "
+                              "'auto' or no value, than the 95th percentile of recent requests.")
+    process.set_defaults(handler=run_process_requests)
+
+    structure = subparsers.add_parser('show-structure', help='Print a directory structure as JSON.')
+    structure.add_argument('path', nargs='?', help='Directory to show. Defaults to the current directory.')
+    structure.add_argument('--all', action='store_true', help='Include files ignored by .gitignore.')
+    structure.set_defaults(handler=run_show_structure)
+
+    setup = subparsers.add_parser('setup-repo',
+                                  help='Create a GitHub repository for the current directory and push it.')
+    setup.add_argument('username')
+    setup.add_argument('repository')
+    setup.add_argument('--private', action='store_true', help='Make the repository private.')
+    setup.set_defaults(handler=run_setup_repo)
+
+    pull_request = subparsers.add_parser('open-pr',
+                                         help='Commit the changed files to a new branch, push it and open a pull request.')
+    pull_request.add_argument('username')
+    pull_request.add_argument('repository')
+    pull_request.add_argument('--branch', required=True, help='Feature branch to create.')
+    pull_request.add_argument('--message', required=True, help='Commit message.')
+    pull_request.add_argument('--title', help='Pull request title. Defaults to the commit message.')
+    pull_request.add_argument('--body', default='', help="Pull request description; '-' reads it from stdin.")
+    pull_request.set_defaults(handler=run_open_pr)
+    return parser
+
+def hedge_delay(value):
+    """Parse a --hedge value: seconds, or 'auto' for a delay learned from recent requests."""
+    if value == 'auto':
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected seconds or 'auto', got {value!r}")
+
+def run_process_requests(args):
+    if args.watch:
+        watch_requests(args.workers, args.stream, args.debounce, args.metrics, args.journal, args.mode, args.index,
+                       args.hedge)
+        return 0
+    succeeded = process_request(args.workers, args.stream, args.metrics, args.journal, args.mode, args.index,
+                                args.hedge)
+    return 0 if succeeded else 1
+
+def run_show_structure(args):
+    display_current_directory_structure(args.path, respect_gitignore=not args.all)
+    return 0
+
+def run_setup_repo(args):
+    return 0 if setup_github_repository(create_git_agent(), args.username, args.repository, args.private) else 1
+
+def run_open_pr(args):
+    body = sys.stdin.read() if args.body == '-' else args.body
+    succeeded = setup_branch_and_pr(create_git_agent(), args.branch, args.message, args.title or args.message,
+                                    body, args.username, args.repository)
+    return 0 if succeeded else 1
+
+def load_config():
+    """Import the local config module holding the API tokens, only when a command needs it."""
+    import config  # Import your config file
+    return config
+
+def create_git_agent():
+    """Create a GitAgent for the current directory."""
+    from agent.git_agent import GitAgent
+    config = load_config()
+    return GitAgent(api_key=config.GIT_ACCESS_TOKEN, local_directory=os.getcwd())
+
+def create_hedger(hedge=None):
+    """Create the Hedger shared by every worker, or None without hedging.
 
-    git_agent = GitAgent(api_key=config.GIT_ACCESS_TOKEN, local_directory=os.getcwd())
-    
-    #setup_github_repository(git_agent,"csmathguy","SAGA", False)
-    #setup_branch_and_pr(git_agent, "AddGitBranch","Add Git Branching and PR creation to code-base", "Add Git Branch and PR Creation","Add Git Branch and PR Creation", "csmathguy", "SAGA")
-    
-    #ask_jokester_about_ai()
-    #ask_programmer_for_algorithm()
-    #create_branch_GPTAgent(git_agent)
+    Parameters:
+        hedge (float or str, optional): Seconds after which a duplicate GPT request is sent, or
+                                        'auto' to learn the delay from recent requests.
+                                        Defaults to no hedging.
+    """
+    if hedge is None:
+        return None
+    from agent.hedging import Hedger
+    return Hedger(delay=None if hedge == 'auto' else hedge)
 
-    #display_current_directory_structure()
-    #create_branch_CodebaseAgent(git_agent)
+def create_request_processor(max_workers=1, stream_results=False, journal_path=None, mode='code', index_path=None,
+                             hedger=None):
+    """Create the RequestProcessor for the requests folder next to this file.
 
-    #programmer_test()
-    create_pr_for_programmer_agent(git_agent)
-    process_request()
+    Parameters:
+        max_workers (int): Number of request files processed in parallel. Defaults to 1.
+        stream_results (bool): Write each result to disk while it is generated. Defaults to False.
+        journal_path (str, optional): SQLite job journal shared by every process working on
+                                      the folder. Defaults to no journal.
+        mode (str): 'code' for a code blob per request, or 'patch' to apply a unified diff to
+                    the output project. Defaults to 'code'.
+        index_path (str, optional): File the output project's directory index is kept in
+                                    between runs. Defaults to memory only.
+        hedger (Hedger, optional): Sends a duplicate of slow GPT requests; shared like the router,
+                                   so the learned delay and the duplicate budget cover every
+                                   worker. See `create_hedger`. Defaults to no hedging.
+    """
+    from agent.job_journal import JobJournal
+    from agent.model_router import ModelRouter
+    from agent.programmer import ProgrammerAgent
+    from agent.rate_limiter import RateLimiter
+    from agent.request_processor import RequestProcessor
+    config = load_config()
 
-def process_request():
     current_directory = os.path.dirname(os.path.abspath(__file__))
     request_folder = os.path.join(current_directory, 'requests')
     results_folder = os.path.join(current_directory, 'requests/results')
 
-    logging.info("Starting process_request function.")
+    # An optional routing table in config picks the model per request; one router is shared
+    # so every worker learns which models are slow or failing
+    routing_table = getattr(config, 'MODEL_ROUTING', None)
+    router = ModelRouter.from_dict(routing_table) if routing_table else None
+    # Optional account limits in config, e.g. {'requests_per_minute': 500, 'tokens_per_minute': 30000};
+    # every worker admits its calls through the same limiter
+    rate_limits = getattr(config, 'RATE_LIMITS', None)
+    rate_limiter = RateLimiter(**rate_limits) if rate_limits else None
+    # Optional token budget for an outline of the output project's classes and functions
+    outline_token_budget = getattr(config, 'OUTLINE_TOKEN_BUDGET', 0)
+
+    # RequestProcessor keeps one agent per worker and resets it between files
+    def create_programmer_agent():
+        return ProgrammerAgent(
+            codebase_repo_path=f"{current_directory}/output",
+            gpt_api_key=config.CHATGPT_ACCESS_TOKEN,
+            router=router,
+            rate_limiter=rate_limiter,
+            outline_token_budget=outline_token_budget,
+            mode=mode,
+            directory_index_path=index_path,
+            hedger=hedger
+        )
 
-    # Create results_folder if it doesn't exist
-    if not os.path.exists(results_folder):
-        os.makedirs(results_folder)
-        logging.info(f"Created results folder at {results_folder}")
+    journal = JobJournal(journal_path) if journal_path is not None else None
+    # A reused diff would not be applied to the output project, so patch requests always run
+    return RequestProcessor(request_folder, results_folder, create_programmer_agent,
+                            max_workers=max_workers, stream_results=stream_results, journal=journal,
+                            reuse_results=mode != 'patch')
 
-    for filename in os.listdir(request_folder):
-        filepath = os.path.join(request_folder, filename)
+def process_request(max_workers=1, stream_results=False, metrics_path=None, journal_path=None, mode='code',
+                    index_path=None, hedge=None):
+    """Process every pending file in the requests folder.
 
-        if os.path.isdir(filepath) or filename.startswith('_'):  # Ignore folders and files starting with _
-            continue
+    Parameters:
+        max_workers (int): Number of request files processed in parallel. Defaults to 1.
+        stream_results (bool): Write each result to disk while it is generated. Defaults to False.
+        metrics_path (str, optional): Append the stage timings to this file as JSON lines.
+        journal_path (str, optional): SQLite job journal; see `create_request_processor`.
+        mode (str): 'code' or 'patch'; see `create_request_processor`.
+        index_path (str, optional): Directory index file; see `create_request_processor`.
+        hedge (float or str, optional): Hedging delay; see `create_hedger`.
 
-        logging.info(f"Processing file: {filepath}")
+    Returns:
+        bool: True if every request file was processed successfully.
+    """
+    logging.info("Starting process_request function.")
 
-        with open(filepath, 'r') as file:
-            task_description = file.read().strip()
+    hedger = create_hedger(hedge)
+    try:
+        processor = create_request_processor(max_workers, stream_results, journal_path, mode, index_path, hedger)
+        outcomes = processor.process_all()
+    finally:
+        if hedger is not None:
+            hedger.close()
 
-        # Initialize ProgrammerAgent and get code
-        programmer_agent = ProgrammerAgent(
-            codebase_repo_path=f"{current_directory}/output",
-            gpt_api_key=config.CHATGPT_ACCESS_TOKEN
-        )
-        result = programmer_agent.get_code(task_description)
-        logging.info("Received code from ProgrammerAgent.")
+    failed = [filename for filename, succeeded in outcomes.items() if not succeeded]
+    logging.info(f"Processed {len(outcomes) - len(failed)} of {len(outcomes)} request files.")
+    if failed:
+        logging.error(f"Failed request files: {', '.join(failed)}")
+
+    log_metrics(metrics_path)
+    return not failed
 
-        # Save the result to a new file in /requests/results folder
-        result_filepath = os.path.join(results_folder, filename)
-        with open(result_filepath, 'w') as result_file:
-            result_file.write(result)
-        logging.info(f"Saved result to {result_filepath}")
+def watch_requests(max_workers=1, stream_results=False, debounce=0.1, metrics_path=None, journal_path=None,
+                   mode='code', index_path=None, hedge=None):
+    """Process request files as they are added, until SIGTERM or Ctrl+C.
 
-        # Rename the original file to indicate it has been processed
-        processed_filepath = os.path.join(request_folder, f"_{filename}")
-        shutil.move(filepath, processed_filepath)
-        logging.info(f"Renamed processed file to {processed_filepath}")
+    Parameters:
+        max_workers (int): Number of request files processed in parallel. Defaults to 1.
+        stream_results (bool): Write each result to disk while it is generated. Defaults to False.
+        debounce (float): Seconds a file must stay unchanged before it is processed. Defaults to 0.1.
+        metrics_path (str, optional): Append the stage timings to this file as JSON lines on exit.
+        journal_path (str, optional): SQLite job journal; see `create_request_processor`.
+        mode (str): 'code' or 'patch'; see `create_request_processor`.
+        index_path (str, optional): Directory index file; see `create_request_processor`.
+        hedge (float or str, optional): Hedging delay; see `create_hedger`.
+    """
+    from agent.request_watcher import RequestWatcher
+
+    hedger = create_hedger(hedge)
+    try:
+        processor = create_request_processor(max_workers, stream_results, journal_path, mode, index_path, hedger)
+        RequestWatcher(processor, debounce=debounce).run()
+    finally:
+        if hedger is not None:
+            hedger.close()
+    log_metrics(metrics_path)
+
+def log_metrics(metrics_path=None):
+    """Log the stage latency percentiles and counters, and optionally append them to a JSON lines file."""
+    from agent.metrics import get_metrics
+
+    metrics = get_metrics()
+    snapshot = metrics.snapshot()
+    for name, summary in snapshot['spans'].items():
+        logging.info(f"{name}: n={summary['count']} p50={summary['p50']:.3f}s "
+                     f"p95={summary['p95']:.3f}s p99={summary['p99']:.3f}s")
+    for name, value in snapshot['counters'].items():
+        logging.info(f"{name}: {value:g}")
+    if metrics_path is not None:
+        metrics.write_json_lines(metrics_path)
 
 
 def programmer_test():
+    import pyperclip
+    from agent.programmer import ProgrammerAgent
+    config = load_config()
+
     current_directory = os.getcwd()
     programmer_agent = ProgrammerAgent(codebase_repo_path=f"{current_directory}/output", gpt_api_key=config.CHATGPT_ACCESS_TOKEN)
     result = programmer_agent.get_code("create a function that checks if a number is prime.")
     print (result)
     pyperclip.copy(result)
 
-def display_current_directory_structure():
-    # Initialize the CodebaseAgent with the current working directory
-    current_directory = os.getcwd()
-    agent = CodebaseAgent(current_directory)
-    structure = agent.get_directory_structure(exclusions=["__pycache__", "venv",".git", "objects"])
+def display_current_directory_structure(path=None, respect_gitignore=True):
+    import json
+    from agent.codebase import CodebaseAgent
+
+    # Initialize the CodebaseAgent with the given directory, or the current working directory
+    agent = CodebaseAgent(path or os.getcwd())
+    structure = agent.get_directory_structure(respect_gitignore=respect_gitignore)
     
     # Use JSON.dumps for pretty-printing the dictionary
-    print("Directory Structure of Current Working Directory:")
     print(json.dumps(structure, indent=4))
 
 def ask_jokester_about_ai():
+    from agent.gpt_agent import GPTAgent, Role
+    from agent.structured_output import ask_structured
+    config = load_config()
+
     # Initialize GPTAgent with JOKESTER role
     jokester_agent = GPTAgent(api_key=config.CHATGPT_ACCESS_TOKEN, role=Role.JOKESTER)
     
     # Send a query about "AI"
     query = "Tell me a joke about AI."
-    response_content_str = jokester_agent.ask_query(query)
-    
-    # Deserialize the string into a Python dictionary
-    response_content = json.loads(response_content_str)
-    
-    # Now this should work
+    response_content = ask_structured(jokester_agent, query)
+    if response_content is None:
+        print("No joke found")
+        return
+
     joke_content = response_content.get('joke', 'No joke found')
     answer_content = response_content.get('answer', 'No answer found')
     
     print(f"Joke: {joke_content}\nAnswer: {answer_content}")
 
 def ask_programmer_for_algorithm():
+    from agent.gpt_agent import GPTAgent, Role
+    from agent.structured_output import ask_structured
+    config = load_config()
+
     # Initialize GPTAgent with PROGRAMMER role
     programmer_agent = GPTAgent(api_key=config.CHATGPT_ACCESS_TOKEN, role=Role.PROGRAMMER)
 
     # Send a query about "Sorting Algorithm"
     query = "Can you provide a Python code snippet for a bubble sort algorithm?"
-    response_content_str = programmer_agent.ask_query(query)
-
-    # Deserialize the string into a Python dictionary
-    # Note: This step may not be necessary if ask_query() returns a string directly
-    response_content = json.loads(response_content_str) if isinstance(response_content_str, str) else response_content_str
+    response_content = ask_structured(programmer_agent, query)
+    if response_content is None:
+        print("No code found")
+        return
 
-    # Now this should work
     code_content = response_content.get('code', 'No code found')
 
     print(f"Code: {code_content}")
 
 def setup_branch_and_pr(git_agent, branch_name, commit_message, pr_title, pr_description, username, repository):
-    # Create and switch to a new feature branch
-    git_agent.create_new_branch(branch_name)
-
-    # Add files and commit changes (you already have methods for these)
-    git_agent.add_files_to_index()
-    git_agent.commit_changes(commit_message)
-
-    # Push new feature branch to remote
-    git_agent.push_new_branch(branch_name)
+    # Create the feature branch, stage only changed files, commit and push in one batch
+    if not git_agent.commit_and_push_branch(branch_name, commit_message):
+        return False
 
     # Create a pull request
-    git_agent.create_pull_request(git_agent.default_branch, branch_name, pr_title, pr_description, username, repository)
+    return git_agent.create_pull_request(git_agent.default_branch, branch_name, pr_title, pr_description, username, repository)
 
 def create_branch_GPTAgent(git_agent):
     """Get details for git operations like commit message, PR title, and PR description.
@@ -228,19 +424,27 @@ def setup_github_repository(git_agent, username, repo_name, private):
         username (str): The GitHub username.
         repo_name (str): The name of the GitHub repository.
         private (bool): Whether the repository should be private.
+
+    Returns:
+        bool: False if the repository had to be created and that failed.
     """
-    if not git_agent.check_repository_exists(username, repo_name):
-        github_url = git_agent.create_github_repo(repo_name, private)
-        if github_url:
-            logging.info(f"Successfully created repository at {github_url}")
-            git_agent.initialize_local_repo()
-            git_agent.add_files_to_index()
-            git_agent.commit_changes()
-            git_agent.create_or_rename_branch_to_main()
-            git_agent.add_remote_origin(github_url)
-            git_agent.push_to_remote()
-        else:
-            logging.error("Failed to create repository.")
+    if git_agent.check_repository_exists(username, repo_name):
+        logging.info(f"Repository {username}/{repo_name} already exists.")
+        return True
+
+    github_url = git_agent.create_github_repo(repo_name, private)
+    if not github_url:
+        logging.error("Failed to create repository.")
+        return False
+
+    logging.info(f"Successfully created repository at {github_url}")
+    git_agent.initialize_local_repo()
+    git_agent.add_files_to_index()
+    git_agent.commit_changes()
+    git_agent.create_or_rename_branch_to_main()
+    git_agent.add_remote_origin(github_url)
+    git_agent.push_to_remote()
+    return True
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import TestCase
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.codebase import CodebaseAgent
+from src.agent.directory_index import DirectoryIndex
+from src.agent.walker import walk_directory_structure
+
+class TestDirectoryIndex(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.temp_dir, 'repo')
+        self.index_path = os.path.join(self.temp_dir, 'index.json')
+        for relative in ['a.txt', 'src/main.py', 'src/agent/gpt.py', 'venv/lib/site.py', 'empty/']:
+            path = os.path.join(self.root, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not relative.endswith('/'):
+                open(path, 'w').close()
+        self._age_tree()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _age_tree(self):
+        """Move every mtime out of the racy window so cached listings are trusted."""
+        for root, dirs, _ in os.walk(self.root):
+            for name in dirs + ['']:
+                os.utime(os.path.join(root, name), ns=(0, 1_000_000_000))
+
+    def test_matches_os_walk_structure(self):
+        expected = walk_directory_structure(self.root, ['venv'])
+        index = DirectoryIndex()
+        self.assertEqual(index.get_directory_structure(self.root, ['venv']), expected)
+        self.assertEqual(expected['empty'], {})
+        self.assertNotIn('venv', expected)
+
+    def test_unchanged_directories_are_reused_from_snapshot(self):
+        index = DirectoryIndex(self.index_path)
+        index.get_directory_structure(self.root)
+        index.save()
+
+        index = DirectoryIndex(self.index_path)
+        index.get_directory_structure(self.root)
+        self.assertEqual(index.rescanned, 0)
+        self.assertEqual(index.reused, 6)
+
+    def test_changed_directory_is_rescanned(self):
+        agent = CodebaseAgent(self.root, index_path=self.index_path)
+        agent.get_directory_structure()
+
+        open(os.path.join(self.root, 'src', 'new.py'), 'w').close()
+        shutil.rmtree(os.path.join(self.root, 'src', 'agent'))
+        os.utime(os.path.join(self.root, 'src'), ns=(0, 2_000_000_000))
+
+        agent = CodebaseAgent(self.root, index_path=self.index_path)
+        structure = agent.get_directory_structure()
+        self.assertEqual(structure['src'], {'main.py': None, 'new.py': None})
+        self.assertEqual(agent.directory_index.rescanned, 1)
+
+    def test_agent_reuses_in_memory_index_across_calls(self):
+        agent = CodebaseAgent(self.root)
+        first = agent.get_directory_structure()
+        self.assertEqual(agent.get_directory_structure(), first)
+        self.assertEqual(agent.directory_index.rescanned, 6)
+        self.assertEqual(agent.directory_index.reused, 6)
+        self.assertEqual(os.listdir(self.temp_dir), ['repo'])
+
+    def test_recent_changes_are_not_trusted(self):
+        index = DirectoryIndex()
+        index.get_directory_structure(self.root)
+        os.utime(self.root)
+        index.get_directory_structure(self.root)
+        index.rescanned = 0
+        index.get_directory_structure(self.root)
+        self.assertEqual(index.rescanned, 1)
+
+    def test_missing_start_path(self):
+        self.assertEqual(DirectoryIndex().get_directory_structure(os.path.join(self.root, 'missing')), {})
+
+if __name__ == '__main__':
+    unittest.main()
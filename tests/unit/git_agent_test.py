@@ -1,30 +1,77 @@
 import json
 import os
+import shutil
+import subprocess
 import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest import TestCase, mock
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
 from src.agent.git_agent import GitAgent
+from src.agent.github_client import GitHubClient
+
+class _GitHubHandler(BaseHTTPRequestHandler):
+    """Stand-in for the GitHub API that records requests and replies with canned responses."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path, dict(self.headers), None))
+        self._reply()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests.append(('POST', self.path, dict(self.headers), body))
+        self._reply()
+
+    def _reply(self):
+        status, payload = self.server.response
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
 
 class GitAgentTest(TestCase):
     def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _GitHubHandler)
+        self.server.requests = []
+        self.server.response = (200, {})
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        github_client = GitHubClient('fake_api_key', base_url=f'http://127.0.0.1:{self.server.server_address[1]}')
         self.git_agent = GitAgent(
             api_key="fake_api_key",
             local_directory="/fake/path",
+            github_client=github_client,
         )
 
-    @mock.patch('requests.post')
-    def test_create_github_repo(self, mock_post):
-        mock_post.return_value.status_code = 201
-        mock_post.return_value.json.return_value = {'html_url': 'https://github.com/test/repo'}
+    def tearDown(self):
+        self.git_agent.github.http_client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_create_github_repo(self):
+        self.server.response = (201, {'html_url': 'https://github.com/test/repo'})
         result = self.git_agent.create_github_repo('repo', True)
         self.assertEqual(result, 'https://github.com/test/repo')
 
-    @mock.patch('requests.get')
-    def test_check_repository_exists(self, mock_get):
-        mock_get.return_value.status_code = 200
+        method, path, headers, body = self.server.requests[0]
+        self.assertEqual((method, path), ('POST', '/user/repos'))
+        self.assertEqual(json.loads(body), {'name': 'repo', 'private': True})
+
+    def test_check_repository_exists(self):
         exists = self.git_agent.check_repository_exists('test', 'repo')
         self.assertTrue(exists)
+        self.assertEqual(self.server.requests[0][:2], ('GET', '/repos/test/repo'))
+
+    def test_check_repository_missing(self):
+        self.server.response = (404, {'message': 'Not Found'})
+        self.assertFalse(self.git_agent.check_repository_exists('test', 'missing'))
 
     @mock.patch('os.path.exists')
     @mock.patch('subprocess.run')
@@ -36,12 +83,12 @@ class GitAgentTest(TestCase):
     @mock.patch('subprocess.run')
     def test_commit_changes(self, mock_run):
         self.git_agent.commit_changes('Initial commit')
-        mock_run.assert_called_with(['git', 'commit', '-m', 'Initial commit'], check=True)
+        mock_run.assert_called_with(['git', 'commit', '-m', 'Initial commit'], cwd='/fake/path', check=True)
     
     @mock.patch('subprocess.run')
     def test_add_files_to_index(self, mock_run):
         self.git_agent.add_files_to_index()
-        mock_run.assert_called_with(['git', 'add', '.'], check=True)
+        mock_run.assert_called_with(['git', 'add', '.'], cwd='/fake/path', check=True)
     
     @mock.patch('subprocess.run')
     def test_create_or_rename_branch_to_main(self, mock_run):
@@ -51,12 +98,13 @@ class GitAgentTest(TestCase):
     @mock.patch('subprocess.run')
     def test_add_remote_origin(self, mock_run):
         self.git_agent.add_remote_origin('https://github.com/test/repo')
-        mock_run.assert_called_with(['git', 'remote', 'add', 'origin', 'https://github.com/test/repo'], check=True)
+        mock_run.assert_called_with(['git', 'remote', 'add', 'origin', 'https://github.com/test/repo'],
+                                    cwd='/fake/path', check=True)
 
     @mock.patch('subprocess.run')
     def test_push_to_remote(self, mock_run):
         self.git_agent.push_to_remote('main')
-        mock_run.assert_called_with(['git', 'push', '-u', 'origin', 'main'], check=True)
+        mock_run.assert_called_with(['git', 'push', '-u', 'origin', 'main'], cwd='/fake/path', check=True)
 
     @mock.patch('subprocess.run')
     def test_create_new_branch(self, mock_run):
@@ -68,24 +116,99 @@ class GitAgentTest(TestCase):
         self.git_agent.push_new_branch('feature')
         mock_run.assert_called_with(['git', 'push', '-u', 'origin', 'feature'], cwd='/fake/path', check=True)
 
-    @mock.patch('requests.post')
-    def test_create_pull_request(self, mock_post):
-        mock_post.return_value.status_code = 201
+    def test_create_pull_request(self):
+        self.server.response = (201, {})
         username = 'username'
         test_repo = 'test_repo'
 
         self.git_agent.create_pull_request('main', 'feature', 'New Features', 'Added some new features.', username, test_repo)
-        
-        mock_post.assert_called_with(
-            f'https://api.github.com/repos/{username}/{test_repo}/pulls',
-            headers={
-                'Authorization': f'BEARER fake_api_key',
-                'Content-Type': 'application/json'
-            },
-            data=json.dumps({
-                'title': 'New Features',
-                'body': 'Added some new features.',
-                'head': 'feature',
-                'base': 'main'
-            })
-        )
+
+        method, path, headers, body = self.server.requests[0]
+        self.assertEqual((method, path), ('POST', f'/repos/{username}/{test_repo}/pulls'))
+        self.assertEqual(headers['Authorization'], 'BEARER fake_api_key')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertEqual(body.decode('utf-8'), json.dumps({
+            'title': 'New Features',
+            'body': 'Added some new features.',
+            'head': 'feature',
+            'base': 'main'
+        }))
+
+    @mock.patch('subprocess.run')
+    def test_stage_changed_files_in_chunks(self, mock_run):
+        paths = [f'dir/file{i:04d}.py' for i in range(5000)]
+        self.git_agent.stage_changed_files(paths)
+
+        staged = []
+        for call in mock_run.call_args_list:
+            args = call.args[0]
+            self.assertEqual(args[:4], ['git', 'add', '-A', '--'])
+            self.assertLessEqual(sum(len(arg) + 1 for arg in args[4:]), GitAgent.MAX_ARG_BYTES)
+            self.assertEqual(call.kwargs['cwd'], '/fake/path')
+            self.assertTrue(all(arg.startswith(':(top,literal)') for arg in args[4:]))
+            staged.extend(arg[len(':(top,literal)'):] for arg in args[4:])
+        self.assertGreater(mock_run.call_count, 1)
+        self.assertEqual(staged, paths)
+
+class GitAgentRepositoryTest(TestCase):
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+        self.git_agent = GitAgent(local_directory=self.repo)
+        self._git('init', '-q')
+        self._git('config', 'user.email', 'test@example.com')
+        self._git('config', 'user.name', 'Test')
+        for name in ['keep.txt', 'old.txt', 'edit.txt']:
+            self._write(name, name)
+        self._git('add', '.')
+        self._git('commit', '-q', '-m', 'initial')
+
+    def tearDown(self):
+        shutil.rmtree(self.repo)
+
+    def _git(self, *args):
+        return subprocess.run(['git'] + list(args), cwd=self.repo, check=True,
+                              stdout=subprocess.PIPE).stdout.decode('utf-8')
+
+    def _write(self, name, content):
+        path = os.path.join(self.repo, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_get_changed_paths(self):
+        self._write('edit.txt', 'changed')
+        self._write('new dir/new file.txt', 'new')
+        os.remove(os.path.join(self.repo, 'old.txt'))
+
+        self.assertEqual(sorted(self.git_agent.get_changed_paths()), ['edit.txt', 'new dir/', 'old.txt'])
+
+    def test_commit_and_push_branch_stages_only_changes(self):
+        self._write('edit.txt', 'changed')
+        self._write('src/new.py', 'print(1)')
+        os.remove(os.path.join(self.repo, 'old.txt'))
+
+        self.assertTrue(self.git_agent.commit_and_push_branch('feature', 'Batch commit', push=False))
+
+        self.assertEqual(self._git('rev-parse', '--abbrev-ref', 'HEAD').strip(), 'feature')
+        self.assertEqual(self._git('status', '--porcelain'), '')
+        changed = self._git('show', '--name-status', '--format=%s', 'HEAD').split()
+        self.assertEqual(changed, ['Batch', 'commit', 'M', 'edit.txt', 'D', 'old.txt', 'A', 'src/new.py'])
+
+    def test_stage_from_subdirectory(self):
+        self._write('sub/a.txt', 'a')
+        agent = GitAgent(local_directory=os.path.join(self.repo, 'sub'))
+
+        self.assertEqual(agent.stage_changed_files(), ['sub/'])
+        self.assertEqual(self._git('diff', '--cached', '--name-only').split(), ['sub/a.txt'])
+
+    def test_stage_paths_literally(self):
+        self._write('sub/f[1].txt', 'glob')
+        self._write('sub/f1.txt', 'other')
+
+        self.git_agent.stage_changed_files(['sub/f[1].txt'])
+
+        self.assertEqual(self._git('diff', '--cached', '--name-only').split(), ['sub/f[1].txt'])
+
+    def test_commit_and_push_branch_without_changes(self):
+        self.assertTrue(self.git_agent.commit_and_push_branch('empty', 'Nothing', push=False))
+        self.assertEqual(self._git('log', '--format=%s').split(), ['initial'])
@@ -0,0 +1,127 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase, mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.github_client import GitHubClient
+
+class _GitHubHandler(BaseHTTPRequestHandler):
+    """Stand-in for the GitHub API: answers GETs with an ETag and honors If-None-Match."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+        etag = '"v1"'
+        server.remaining -= 1
+        if self.headers.get('If-None-Match') == etag:
+            server.remaining += 1  # Conditional hits are free on GitHub
+            self._reply(304, b'', etag)
+        else:
+            self._reply(200, json.dumps({'full_name': self.path}).encode('utf-8'), etag)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server.requests.append((self.path, dict(self.headers), body))
+        server.remaining -= 1
+        self._reply(201, body)
+
+    def _reply(self, status, body, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('X-RateLimit-Remaining', str(self.server.remaining))
+        self.send_header('X-RateLimit-Reset', str(self.server.reset))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class GitHubClientTest(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _GitHubHandler)
+        self.server.requests = []
+        self.server.remaining = 5000
+        self.server.reset = int(time.time()) + 3600
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        self.client = GitHubClient('token', base_url=f'http://127.0.0.1:{self.server.server_address[1]}')
+
+    def tearDown(self):
+        self.client.http_client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_sends_auth_headers(self):
+        response = self.client.post('/user/repos', data='{"name": "repo"}')
+        self.assertEqual(response.status_code, 201)
+        path, headers, body = self.server.requests[0]
+        self.assertEqual(path, '/user/repos')
+        self.assertEqual(headers['Authorization'], 'BEARER token')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertEqual(body, b'{"name": "repo"}')
+
+    def test_repeated_get_is_revalidated_with_etag(self):
+        first = self.client.get('/repos/owner/repo')
+        second = self.client.get('/repos/owner/repo')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertIs(second, first)
+        self.assertEqual(second.json(), {'full_name': '/repos/owner/repo'})
+        self.assertNotIn('If-None-Match', self.server.requests[0][1])
+        self.assertEqual(self.server.requests[1][1]['If-None-Match'], '"v1"')
+        self.assertEqual(self.client.not_modified, 1)
+        self.assertEqual(self.client.rate_limit_remaining, 4999)
+
+    def test_cache_is_bounded(self):
+        self.client.max_cached = 2
+        for name in ['a', 'b', 'c']:
+            self.client.get(f'/repos/owner/{name}')
+        self.assertEqual(list(self.client._etag_cache), [f'{self.client.base_url}/repos/owner/{name}' for name in 'bc'])
+
+    def test_waits_for_reset_when_rate_limit_is_used_up(self):
+        self.server.remaining = 1
+        self.server.reset = time.time() + 5
+        self.client.post('/user/repos', data='{}')
+        self.assertEqual(self.client.rate_limit_remaining, 0)
+
+        with mock.patch('src.agent.github_client.time.sleep') as mock_sleep:
+            self.client.post('/user/repos', data='{}')
+        delay = mock_sleep.call_args.args[0]
+        self.assertGreater(delay, 3)
+        self.assertLessEqual(delay, 5)
+
+    def test_does_not_wait_beyond_max_rate_limit_wait(self):
+        self.client.rate_limit_remaining = 0
+        self.client.rate_limit_reset = time.time() + 3600
+
+        with mock.patch('src.agent.github_client.time.sleep') as mock_sleep:
+            response = self.client.get('/repos/owner/repo')
+        mock_sleep.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+
+    def test_posts_are_sent_as_non_idempotent(self):
+        with mock.patch.object(self.client.http_client, 'request', wraps=self.client.http_client.request) as mock_request:
+            self.client.post('/user/repos', data='{}')
+            self.client.get('/repos/owner/repo')
+        self.assertFalse(mock_request.call_args_list[0].kwargs['idempotent'])
+        self.assertNotIn('idempotent', mock_request.call_args_list[1].kwargs)
+
+    def test_malformed_rate_limit_headers_disable_throttling(self):
+        self.server.remaining = 0
+        self.server.reset = 'soon'
+        self.client.post('/user/repos', data='{}')
+        self.assertIsNone(self.client.rate_limit_reset)
+
+        with mock.patch('src.agent.github_client.time.sleep') as mock_sleep:
+            response = self.client.get('/repos/owner/repo')
+        mock_sleep.assert_not_called()
+        self.assertEqual(response.status_code, 200)
@@ -1,25 +1,54 @@
+import asyncio
 import os
+import shutil
 import sys
+import tempfile
+import threading
+import time
 import unittest
 from unittest import TestCase, mock
 import json
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
 from src.agent.gpt_agent import GPTAgent, Role
+from src.agent.hedging import Hedger
+from src.agent.http_client import HTTPClient
+from src.agent.metrics import Metrics
+from src.agent.model_router import ModelRouter, Route
+from src.agent.prompt_registry import PromptRegistry
+from src.agent.rate_limiter import RateLimiter
+from src.agent.response_cache import ResponseCache
+from src.agent.single_flight import SingleFlight
 
 class GPTAgentTest(TestCase):
 
     def setUp(self):
         self.gpt_agent = GPTAgent(api_key='fake_token', role=Role.JOKESTER, enable_memory=False)
 
-    @mock.patch('builtins.open', new_callable=mock.mock_open, read_data="System prompt for programmer.")
-    def test_load_system_prompt(self, mock_file):
-        role = Role.PROGRAMMER
-        prompt = self.gpt_agent._load_system_prompt(role)
-        mock_file.assert_called()
+    def test_load_system_prompt(self):
+        prompt_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, prompt_dir)
+        for role in Role:
+            with open(os.path.join(prompt_dir, role.value), 'w') as f:
+                f.write(f"System prompt for {role.name.lower()}.")
+
+        agent = GPTAgent(api_key='fake_token', role=Role.JOKESTER, prompt_registry=PromptRegistry(prompt_dir))
+        prompt = agent._load_system_prompt(Role.PROGRAMMER)
         self.assertEqual(prompt, "System prompt for programmer.")
+        self.assertEqual(agent.system_prompt, "System prompt for jokester.")
+
+    def test_load_system_prompt_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            GPTAgent(api_key='fake_token', role=Role.JOKESTER, prompt_registry=PromptRegistry(tempfile.gettempdir() + '/missing'))
+
+    def test_default_prompts_resolve_from_any_directory(self):
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(tempfile.gettempdir())
+        agent = GPTAgent(api_key='fake_token', role=Role.PROGRAMMER)
+        self.assertTrue(agent.system_prompt)
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.request')
     def test_ask_query(self, mock_post):
         mock_response = {
             'choices': [{
@@ -35,6 +64,199 @@ class GPTAgentTest(TestCase):
         response_content = self.gpt_agent.ask_query('Hello')
         self.assertEqual(response_content, 'Hello, world!')
 
+    @mock.patch('requests.Session.request')
+    def test_ask_query_uses_cache(self, mock_request):
+        mock_response = {'choices': [{'message': {'content': 'Cached joke'}}]}
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.text = json.dumps(mock_response)
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.gpt_agent.cache = ResponseCache(cache_dir)
+
+        self.assertEqual(self.gpt_agent.ask_query('Hello'), 'Cached joke')
+        self.assertEqual(self.gpt_agent.ask_query('Hello'), 'Cached joke')
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(self.gpt_agent.cache.stats()['hits'], 1)
+
+        self.gpt_agent.ask_query('Hello', use_cache=False)
+        self.assertEqual(mock_request.call_count, 2)
+
+    @mock.patch('requests.Session.request')
+    def test_ask_query_records_metrics(self, mock_request):
+        mock_response = {'choices': [{'message': {'content': 'Timed joke'}}]}
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.text = json.dumps(mock_response)
+        self.gpt_agent.metrics = Metrics()
+
+        self.gpt_agent.ask_query('Hello')
+
+        snapshot = self.gpt_agent.metrics.snapshot()
+        self.assertEqual(snapshot['spans']['gpt.request']['count'], 1)
+        self.assertEqual(snapshot['spans']['gpt.parse']['count'], 1)
+        body = mock_request.call_args.kwargs['json']
+        self.assertEqual(snapshot['counters']['gpt.request_bytes'], len(json.dumps(body)))
+        self.assertEqual(snapshot['counters']['gpt.response_bytes'], len(json.dumps(mock_response)))
+
+    @mock.patch('requests.Session.request')
+    def test_api_url_override(self, mock_request):
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.text = json.dumps({'choices': [{'message': {'content': 'Local'}}]})
+        agent = GPTAgent(api_key='fake_token', role=Role.JOKESTER, api_url='http://127.0.0.1:8000/v1/chat/completions')
+
+        self.assertEqual(agent.ask_query('Hello'), 'Local')
+        self.assertEqual(mock_request.call_args.args[:2], ('POST', 'http://127.0.0.1:8000/v1/chat/completions'))
+        self.assertEqual(self.gpt_agent.api_url, GPTAgent.API_URL)
+
+    @mock.patch('requests.Session.request')
+    def test_concurrent_identical_queries_share_one_request(self, mock_request):
+        release = threading.Event()
+
+        def respond(*args, **kwargs):
+            release.wait(5)
+            return mock.MagicMock(status_code=200, text=json.dumps({'choices': [{'message': {'content': 'Shared'}}]}))
+
+        mock_request.side_effect = respond
+        single_flight = SingleFlight()
+        metrics = Metrics()
+        agents = [GPTAgent(api_key='fake_token', role=Role.JOKESTER, single_flight=single_flight, metrics=metrics)
+                  for _ in range(3)]
+        answers = []
+        threads = [threading.Thread(target=lambda agent=agent: answers.append(agent.ask_query('Hello')))
+                   for agent in agents]
+        for thread in threads:
+            thread.start()
+        while single_flight.stats()['coalesced'] < 2:
+            release.wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(answers, ['Shared'] * 3)
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(metrics.snapshot()['counters']['gpt.coalesced'], 2)
+
+        agents[0].ask_query('Another joke')
+        self.assertEqual(mock_request.call_count, 2)
+
+    @mock.patch('requests.Session.request')
+    def test_ask_query_async_coalesces(self, mock_request):
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.text = json.dumps({'choices': [{'message': {'content': 'Async'}}]})
+        self.gpt_agent.single_flight = SingleFlight()
+
+        async def main():
+            return await asyncio.gather(*(self.gpt_agent.ask_query_async('Hello') for _ in range(4)))
+
+        self.assertEqual(asyncio.run(main()), ['Async'] * 4)
+        self.assertEqual(mock_request.call_count, 1)
+
+    @mock.patch('requests.Session.request')
+    def test_router_chooses_model_and_falls_back_on_error(self, mock_request):
+        def respond(*args, **kwargs):
+            model = kwargs['json']['model']
+            if model == 'slow':
+                return mock.MagicMock(status_code=500, text='overloaded')
+            return mock.MagicMock(status_code=200, text=json.dumps({'choices': [{'message': {'content': f'from {model}'}}]}))
+
+        mock_request.side_effect = respond
+        metrics = Metrics()
+        router = ModelRouter(routes={'jokester': [Route('slow', None)]}, fallbacks={'slow': 'fast'}, metrics=metrics)
+        agent = GPTAgent(api_key='fake_token', role=Role.JOKESTER, router=router, metrics=metrics,
+                         http_client=HTTPClient(max_retries=0))
+
+        self.assertEqual(agent.ask_query('Hello'), 'from fast')
+        self.assertEqual([call.kwargs['json']['model'] for call in mock_request.call_args_list], ['slow', 'fast'])
+        counters = metrics.snapshot()['counters']
+        self.assertEqual((counters['router.decisions.jokester.slow'], counters['router.errors.slow']), (1, 1))
+        self.assertEqual(metrics.summary('router.latency.fast')['count'], 1)
+
+    @mock.patch('requests.Session.request')
+    def test_hedged_request_uses_first_response(self, mock_request):
+        replies = iter([(0.5, 'Slow replica'), (0, 'Fast replica')])
+        lock = threading.Lock()
+
+        def respond(*args, **kwargs):
+            with lock:
+                delay, content = next(replies)
+            release.wait(delay)
+            return mock.MagicMock(status_code=200, text=json.dumps({'choices': [{'message': {'content': content}}]}))
+
+        release = threading.Event()
+        mock_request.side_effect = respond
+        metrics = Metrics()
+        agent = GPTAgent(api_key='fake_token', role=Role.JOKESTER, metrics=metrics,
+                         hedger=Hedger(delay=0.02, metrics=metrics))
+
+        self.assertEqual(agent.ask_query('Hello'), 'Fast replica')
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertEqual(metrics.snapshot()['counters']['hedge.won'], 1)
+        release.set()
+
+    @mock.patch('requests.Session.request')
+    def test_hedged_loser_is_closed_and_its_tokens_settled(self, mock_request):
+        replies = iter([(0.3, 'Slow replica', 40), (0, 'Fast replica', 30)])
+        lock = threading.Lock()
+        responses = []
+
+        def respond(*args, **kwargs):
+            with lock:
+                delay, content, tokens = next(replies)
+            time.sleep(delay)
+            response = mock.MagicMock(status_code=200, text=json.dumps(
+                {'choices': [{'message': {'content': content}}], 'usage': {'total_tokens': tokens}}))
+            responses.append(response)
+            return response
+
+        mock_request.side_effect = respond
+        metrics = Metrics()
+        agent = GPTAgent(api_key='fake_token', role=Role.JOKESTER, metrics=metrics,
+                         hedger=Hedger(delay=0.02, metrics=metrics),
+                         rate_limiter=RateLimiter(tokens_per_minute=100000, metrics=metrics))
+
+        self.assertEqual(agent.ask_query('Hello'), 'Fast replica')
+        deadline = time.monotonic() + 5
+        while metrics.snapshot()['counters'].get('ratelimit.used_tokens') != 70 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(metrics.snapshot()['counters']['ratelimit.used_tokens'], 70)
+        responses[-1].close.assert_called_once()
+
+    @mock.patch('requests.Session.request')
+    def test_stream_query(self, mock_request):
+        events = [{'choices': [{'delta': {'role': 'assistant'}}]},
+                  {'choices': [{'delta': {'content': 'Hello, '}}]},
+                  {'choices': [{'delta': {'content': 'world!'}}]}]
+        lines = [f'data: {json.dumps(event)}'.encode('utf-8') for event in events] + [b'data: [DONE]']
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.iter_lines.return_value = iter(lines)
+
+        pieces = list(self.gpt_agent.stream_query('Hello'))
+
+        self.assertEqual(pieces, ['Hello, ', 'world!'])
+        self.assertTrue(mock_request.call_args.kwargs['json']['stream'])
+        self.assertTrue(mock_request.call_args.kwargs['stream'])
+        mock_request.return_value.close.assert_called_once()
+
+    @mock.patch('requests.Session.request')
+    def test_memory_records_turns_before_new_query(self, mock_request):
+        replies = iter(['First answer', 'Second answer'])
+
+        def respond(*args, **kwargs):
+            response = mock.MagicMock(status_code=200)
+            response.text = json.dumps({'choices': [{'message': {'content': next(replies)}}]})
+            return response
+
+        mock_request.side_effect = respond
+        agent = GPTAgent(api_key='fake_token', role=Role.JOKESTER, enable_memory=True)
+
+        agent.ask_query('First question')
+        agent.ask_query('Second question')
+
+        messages = mock_request.call_args.kwargs['json']['messages']
+        self.assertEqual([m['role'] for m in messages], ['system', 'user', 'assistant', 'user'])
+        self.assertEqual([m['content'] for m in messages[1:]], ['First question', 'First answer', 'Second question'])
+        self.assertEqual(len(agent.prior_messages), 4)
+
     def test_parse_response(self):
         mock_response = {
             'choices': [
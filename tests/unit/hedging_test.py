@@ -0,0 +1,100 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import TestCase
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.hedging import Hedger
+from src.agent.metrics import Metrics
+
+class HedgerTest(TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def _calls(self, *delays):
+        """Return a function whose n-th call sleeps delays[n] and returns n."""
+        counter = iter(range(len(delays)))
+        lock = threading.Lock()
+
+        def function():
+            with lock:
+                n = next(counter)
+            time.sleep(delays[n])
+            return n
+        return function
+
+    def test_fast_call_is_not_hedged(self):
+        hedger = Hedger(delay=0.5, metrics=self.metrics)
+        self.assertEqual(hedger.call(self._calls(0)), 0)
+        self.assertNotIn('hedge.fired', self.metrics.snapshot()['counters'])
+
+    def test_slow_call_is_hedged_and_duplicate_wins(self):
+        hedger = Hedger(delay=0.05, metrics=self.metrics)
+        discarded = threading.Event()
+        start = time.monotonic()
+
+        self.assertEqual(hedger.call(self._calls(0.4, 0), discard=lambda result: discarded.set()), 1)
+
+        self.assertLess(time.monotonic() - start, 0.3)
+        counters = self.metrics.snapshot()['counters']
+        self.assertEqual((counters['hedge.fired'], counters['hedge.won']), (1, 1))
+        self.assertTrue(discarded.wait(2))
+
+    def test_failed_copy_does_not_win(self):
+        hedger = Hedger(delay=0.05, metrics=self.metrics)
+        # The duplicate returns first but fails, so the slower first call is used
+        self.assertEqual(hedger.call(self._calls(0.2, 0), is_success=lambda n: n == 0), 0)
+        self.assertNotIn('hedge.won', self.metrics.snapshot()['counters'])
+
+    def test_finished_loser_is_discarded_before_the_winner_returns(self):
+        hedger = Hedger(delay=0.05, metrics=self.metrics)
+        discarded = []
+        self.assertEqual(hedger.call(self._calls(0.2, 0), is_success=lambda n: n == 0, discard=discarded.append), 0)
+        self.assertEqual(discarded, [1])
+        self.assertEqual(self.metrics.snapshot()['counters']['hedge.discarded'], 1)
+
+    def test_calls_run_on_shared_threads(self):
+        hedger = Hedger(delay=0.5, metrics=self.metrics)
+        names = {hedger.call(lambda: threading.current_thread().name) for _ in range(5)}
+        self.assertTrue(all(name.startswith('hedge') for name in names))
+        self.assertEqual(len(names), 1)
+
+    def test_close_stops_the_shared_threads(self):
+        with Hedger(delay=0.5, metrics=self.metrics) as hedger:
+            self.assertEqual(hedger.call(lambda: threading.current_thread().name)[:5], 'hedge')
+            thread_names = {thread.name for thread in threading.enumerate()}
+            self.assertTrue(any(name.startswith('hedge') for name in thread_names))
+        with self.assertRaises(RuntimeError):
+            hedger.call(lambda: None)
+
+    def test_learns_delay_from_recent_durations(self):
+        hedger = Hedger(min_samples=5, metrics=self.metrics)
+        for _ in range(4):
+            hedger.call(lambda: None)
+        self.assertIsNone(hedger.delay())
+        hedger.call(lambda: time.sleep(0.02))
+        self.assertGreaterEqual(hedger.delay(), 0.02)
+        self.assertNotIn('hedge.fired', self.metrics.snapshot()['counters'])
+
+    def test_extra_load_is_capped(self):
+        hedger = Hedger(delay=0.0, max_ratio=0.0, burst=2, metrics=self.metrics)
+        for _ in range(4):
+            hedger.call(lambda: time.sleep(0.01))
+        counters = self.metrics.snapshot()['counters']
+        self.assertEqual((counters['hedge.fired'], counters['hedge.suppressed']), (2, 2))
+
+    def test_exception_is_raised_when_every_copy_fails(self):
+        hedger = Hedger(delay=0.01, metrics=self.metrics)
+
+        def function():
+            time.sleep(0.05)
+            raise TimeoutError('slow')
+
+        with self.assertRaises(TimeoutError):
+            hedger.call(function)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import socket
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase, mock
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.http_client import HTTPClient
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        server.ports.add(self.client_address[1])
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status = server.statuses.pop(0) if server.statuses else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class HTTPClientTest(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.ports = set()
+        self.server.statuses = []
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions'
+        self.client = HTTPClient(max_retries=2, backoff_factor=0.01)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_is_reused(self):
+        for _ in range(5):
+            response = self.client.post(self.url, json={'q': 1})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.ports), 1)
+
+    def test_retries_retryable_statuses(self):
+        self.server.statuses = [429, 503]
+        response = self.client.post(self.url, json={})
+        self.assertEqual(response.status_code, 200)
+
+    def test_returns_last_response_when_retries_exhausted(self):
+        self.server.statuses = [500, 500, 500, 500]
+        response = self.client.post(self.url, json={})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.server.statuses, [500])
+
+    def test_does_not_retry_client_errors(self):
+        self.server.statuses = [400]
+        response = self.client.post(self.url, json={})
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch('time.sleep')
+    def test_honors_retry_after(self, mock_sleep):
+        retry = mock.MagicMock(status_code=429, headers={'Retry-After': '7'})
+        ok = mock.MagicMock(status_code=200, headers={})
+        with mock.patch.object(self.client.session, 'request', side_effect=[retry, ok]) as mock_request:
+            self.assertIs(self.client.post(self.url), ok)
+        mock_sleep.assert_called_once_with(7.0)
+        self.assertEqual(mock_request.call_args.kwargs['timeout'], self.client.timeout)
+
+    @mock.patch('time.sleep')
+    def test_retries_connection_errors_then_raises(self, mock_sleep):
+        with mock.patch.object(self.client.session, 'request', side_effect=requests.ConnectionError('down')):
+            with self.assertRaises(requests.ConnectionError):
+                self.client.post(self.url)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_non_idempotent_request_is_not_retried_after_it_may_have_been_handled(self):
+        self.server.statuses = [500, 200]
+        response = self.client.post(self.url, json={}, idempotent=False)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.server.statuses, [200])
+
+        self.server.statuses = [429]
+        response = self.client.post(self.url, json={}, idempotent=False)
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch('time.sleep')
+    def test_non_idempotent_request_is_not_retried_after_read_timeout(self, mock_sleep):
+        with mock.patch.object(self.client.session, 'request', side_effect=requests.ReadTimeout('slow')) as mock_request:
+            with self.assertRaises(requests.ReadTimeout):
+                self.client.post(self.url, idempotent=False)
+        self.assertEqual(mock_request.call_count, 1)
+        mock_sleep.assert_not_called()
+
+    @mock.patch('time.sleep')
+    def test_non_idempotent_request_is_retried_when_it_could_not_connect(self, mock_sleep):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            closed_url = f'http://127.0.0.1:{sock.getsockname()[1]}/'
+        with self.assertRaises(requests.ConnectionError):
+            self.client.post(closed_url, idempotent=False)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_backoff_is_capped(self):
+        client = HTTPClient(backoff_factor=1, max_backoff=2)
+        for attempt in range(10):
+            self.assertLessEqual(client._backoff_delay(attempt), 2)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(HTTPClient._parse_retry_after('3'), 3.0)
+        self.assertEqual(HTTPClient._parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(HTTPClient._parse_retry_after('soon'))
+        self.assertIsNone(HTTPClient._parse_retry_after(None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import TestCase, mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.job_journal import JobJournal
+
+def _claim_all(path, owner, claimed):
+    journal = JobJournal(path)
+    while True:
+        job = journal.claim(owner)
+        if job is None:
+            return
+        claimed.append(job.id)
+        journal.complete(job.id, owner, f'result {job.id}')
+
+class JobJournalTest(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'jobs.db')
+        self.journal = JobJournal(self.path, lease_seconds=60, max_attempts=2)
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_enqueue_is_idempotent_while_open(self):
+        first = self.journal.enqueue('a.txt', 'task')
+        self.assertEqual(self.journal.enqueue('a.txt', 'task'), first)
+        self.assertNotEqual(self.journal.enqueue('a.txt', 'other task'), first)
+        self.assertEqual(self.journal.stats(), {'pending': 2})
+
+    def test_claim_leases_each_job_once(self):
+        job_id = self.journal.enqueue('a.txt', 'task')
+        job = self.journal.claim('worker-1')
+
+        self.assertEqual((job.id, job.filename, job.attempts), (job_id, 'a.txt', 1))
+        self.assertEqual(job.content_hash, JobJournal.hash_content('task'))
+        self.assertIsNone(self.journal.claim('worker-2'))
+        self.assertIsNone(self.journal.claim('worker-2', job_id))
+
+    def test_expired_lease_is_reclaimed(self):
+        job_id = self.journal.enqueue('a.txt', 'task')
+        self.journal.claim('crashed')
+
+        with mock.patch('src.agent.job_journal.time.time', return_value=10 ** 10):
+            job = self.journal.claim('worker-2')
+        self.assertEqual((job.id, job.attempts), (job_id, 2))
+        self.assertFalse(self.journal.complete(job_id, 'crashed', 'late result'))
+        self.assertTrue(self.journal.complete(job_id, 'worker-2', 'result'))
+
+    def test_job_fails_after_too_many_expired_leases(self):
+        self.journal.enqueue('a.txt', 'task')
+        for now in [1000, 2000]:
+            with mock.patch('src.agent.job_journal.time.time', return_value=now):
+                self.assertIsNotNone(self.journal.claim('crashed'))
+
+        with mock.patch('src.agent.job_journal.time.time', return_value=3000):
+            self.assertIsNone(self.journal.claim('worker'))
+        self.assertEqual(self.journal.stats(), {'failed': 1})
+
+    def test_fail_retries_until_max_attempts(self):
+        job_id = self.journal.enqueue('a.txt', 'task')
+        self.journal.fail(self.journal.claim('w').id, 'w', 'boom')
+        self.assertEqual(self.journal.stats(), {'pending': 1})
+
+        self.journal.fail(self.journal.claim('w').id, 'w', 'boom again')
+        job = self.journal.jobs()[0]
+        self.assertEqual((job['id'], job['status'], job['attempts'], job['error']), (job_id, 'failed', 2, 'boom again'))
+
+    def test_completed_result_is_found_by_content(self):
+        self.journal.enqueue('a.txt', 'task')
+        job = self.journal.claim('w')
+        self.assertIsNone(self.journal.find_result(job.content_hash))
+
+        self.journal.complete(job.id, 'w', 'print(1)')
+        self.assertEqual(self.journal.find_result(JobJournal.hash_content('task')), 'print(1)')
+        self.assertEqual(self.journal.jobs('done')[0]['filename'], 'a.txt')
+
+    def test_survives_reopening(self):
+        self.journal.enqueue('a.txt', 'task')
+        self.journal.claim('w')
+        self.journal.close()
+
+        reopened = JobJournal(self.path)
+        self.assertEqual(reopened.stats(), {'running': 1})
+        reopened.close()
+
+    def test_concurrent_threads_claim_distinct_jobs(self):
+        for i in range(50):
+            self.journal.enqueue(f'{i}.txt', f'task {i}')
+        claimed = []
+        threads = [threading.Thread(target=_claim_all, args=(self.path, f'thread-{i}', claimed)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(claimed), list(range(1, 51)))
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'fork is not available')
+    def test_concurrent_processes_claim_distinct_jobs(self):
+        for i in range(30):
+            self.journal.enqueue(f'{i}.txt', f'task {i}')
+        context = multiprocessing.get_context('fork')
+        with context.Manager() as manager:
+            claimed = manager.list()
+            processes = [context.Process(target=_claim_all, args=(self.path, f'process-{i}', claimed)) for i in range(3)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(30)
+            self.assertEqual(sorted(claimed), list(range(1, 31)))
+        self.assertEqual(self.journal.stats(), {'done': 30})
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest import TestCase
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+MAIN = os.path.join(ROOT, 'src', 'main.py')
+
+class MainTest(TestCase):
+
+    def run_main(self, *args):
+        return subprocess.run([sys.executable, MAIN] + list(args), cwd=ROOT, capture_output=True, text=True)
+
+    def test_import_loads_no_agents(self):
+        code = ('import sys; sys.path.insert(0, "src"); import main; '
+                'print(sorted(m for m in sys.modules if m == "requests" or m.startswith("agent.")))')
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_help_lists_subcommands(self):
+        result = self.run_main('--help')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        for command in ('process-requests', 'show-structure', 'setup-repo', 'open-pr'):
+            self.assertIn(command, result.stdout)
+
+    def test_missing_command_is_an_error(self):
+        self.assertNotEqual(self.run_main().returncode, 0)
+
+    def test_show_structure(self):
+        result = self.run_main('show-structure', os.path.join(ROOT, 'tests', 'unit', 'codebaseFolderTest'))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertTrue(result.stdout.lstrip().startswith('{'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import unittest
+from unittest import TestCase
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.memory import ConversationMemory
+
+class TestConversationMemory(TestCase):
+
+    def test_turns_are_recorded_in_order(self):
+        memory = ConversationMemory()
+        memory.add_turn('first question', 'first answer')
+        memory.add_turn('second question', 'second answer')
+
+        self.assertEqual([m['content'] for m in memory.messages()],
+                         ['first question', 'first answer', 'second question', 'second answer'])
+        self.assertEqual([m['role'] for m in memory.messages()], ['user', 'assistant'] * 2)
+
+    def test_oldest_turns_are_evicted_to_stay_under_budget(self):
+        memory = ConversationMemory(max_tokens=60)
+        for i in range(10):
+            memory.add_turn(f'question {i} ' + 'x' * 40, f'answer {i}')
+
+        self.assertLessEqual(memory.token_count, 60)
+        contents = [m['content'] for m in memory.messages()]
+        self.assertEqual(contents[-1], 'answer 9')
+        self.assertNotIn('answer 0', contents)
+
+    def test_turn_larger_than_budget_is_dropped(self):
+        memory = ConversationMemory(max_tokens=10)
+        memory.add_turn('x' * 400, 'y')
+        self.assertEqual(memory.messages(), [])
+        self.assertEqual(memory.token_count, 0)
+
+    def test_evicted_turns_are_summarized(self):
+        calls = []
+
+        def summarizer(previous, evicted):
+            calls.append((previous, [m['content'] for m in evicted]))
+            return (previous + ' ' if previous else '') + ','.join(m['content'] for m in evicted if m['role'] == 'user')
+
+        memory = ConversationMemory(max_tokens=40, summarizer=summarizer)
+        memory.add_turn('q1', 'a' * 60)
+        memory.add_turn('q2', 'b' * 60)
+
+        messages = memory.messages()
+        self.assertEqual(messages[0], {'role': 'system', 'content': ConversationMemory.SUMMARY_PREFIX + 'q1'})
+        self.assertEqual(messages[1]['content'], 'q2')
+        self.assertEqual(calls, [('', ['q1', 'a' * 60])])
+        self.assertLessEqual(memory.token_count, 40)
+
+    def test_clear(self):
+        memory = ConversationMemory()
+        memory.add_turn('q', 'a')
+        memory.clear()
+        self.assertEqual(memory.messages(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+from unittest import TestCase, mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.metrics import Metrics
+
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_span_records_duration(self):
+        with mock.patch('src.agent.metrics.time.perf_counter', side_effect=[1.0, 1.25]):
+            with self.metrics.span('gpt.request'):
+                pass
+        summary = self.metrics.summary('gpt.request')
+        self.assertEqual(summary['count'], 1)
+        self.assertAlmostEqual(summary['sum'], 0.25)
+        self.assertAlmostEqual(summary['p99'], 0.25)
+
+    def test_span_counts_errors_and_reraises(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.span('programmer.parse'):
+                raise ValueError('bad json')
+        self.assertEqual(self.metrics.summary('programmer.parse')['count'], 1)
+        self.assertEqual(self.metrics.snapshot()['counters'], {'programmer.parse.errors': 1})
+
+    def test_percentiles(self):
+        for i in range(1, 101):
+            self.metrics.observe('stage', i / 100)
+        summary = self.metrics.summary('stage')
+        self.assertEqual((summary['p50'], summary['p95'], summary['p99']), (0.5, 0.95, 0.99))
+        self.assertAlmostEqual(summary['sum'], 50.5)
+
+    def test_percentiles_use_latest_samples_but_count_everything(self):
+        metrics = Metrics(max_samples=10)
+        for i in range(100):
+            metrics.observe('stage', float(i))
+        summary = metrics.summary('stage')
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['p50'], 94.0)
+
+    def test_disabled_records_nothing(self):
+        metrics = Metrics(enabled=False)
+        with metrics.span('a'):
+            pass
+        self.assertIs(metrics.span('a'), metrics.span('b'))
+        metrics.add('bytes', 10)
+        self.assertEqual(metrics.snapshot(), {'spans': {}, 'counters': {}})
+        self.assertIsNone(metrics.summary('a'))
+
+    def test_json_lines_export(self):
+        self.metrics.observe('gpt.request', 0.5)
+        self.metrics.add('gpt.request_bytes', 120)
+        lines = [json.loads(line) for line in self.metrics.to_json_lines().splitlines()]
+
+        self.assertEqual([(line['type'], line['name']) for line in lines],
+                         [('span', 'gpt.request'), ('counter', 'gpt.request_bytes')])
+        self.assertEqual(lines[0]['p95'], 0.5)
+        self.assertEqual(lines[1]['value'], 120)
+
+    def test_prometheus_export(self):
+        self.metrics.observe('codebase.directory_structure', 0.5)
+        self.metrics.add('gpt.response_bytes', 42)
+        text = self.metrics.to_prometheus()
+
+        self.assertIn('# TYPE saga_codebase_directory_structure_seconds summary\n', text)
+        self.assertIn('saga_codebase_directory_structure_seconds{quantile="0.95"} 0.5\n', text)
+        self.assertIn('saga_codebase_directory_structure_seconds_count 1\n', text)
+        self.assertIn('# TYPE saga_gpt_response_bytes_total counter\nsaga_gpt_response_bytes_total 42\n', text)
+
+    def test_reset(self):
+        self.metrics.observe('stage', 1.0)
+        self.metrics.reset()
+        self.assertIsNone(self.metrics.summary('stage'))
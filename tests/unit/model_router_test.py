@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import TestCase, mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.metrics import Metrics
+from src.agent.model_router import ModelRouter, Route
+
+def _messages(characters):
+    return [{'role': 'user', 'content': 'x' * characters}]
+
+class ModelRouterTest(TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+        self.router = ModelRouter(
+            routes={'programmer': [Route('small', 100), Route('large', None)], 'jokester': [Route('small', None)]},
+            default_model='default', fallbacks={'large': 'small', 'small': 'tiny'}, latency_slo={'large': 1.0},
+            min_samples=3, max_errors=2, cooldown=60, metrics=self.metrics)
+
+    def test_routes_by_role_and_prompt_size(self):
+        self.assertEqual(self.router.choose('programmer', _messages(40)), 'small')
+        self.assertEqual(self.router.choose('programmer', _messages(4000)), 'large')
+        self.assertEqual(self.router.choose('jokester', _messages(4000)), 'small')
+        self.assertEqual(self.router.choose('unknown', _messages(40)), 'default')
+        self.assertEqual(self.metrics.snapshot()['counters']['router.decisions.programmer.small'], 1)
+
+    def test_slow_model_is_avoided_until_cooldown_ends(self):
+        for seconds in [0.5, 2.0, 3.0]:
+            self.router.record('large', seconds)
+        self.assertTrue(self.router.is_degraded('large'))
+        self.assertEqual(self.router.choose('programmer', _messages(4000)), 'small')
+        self.assertEqual(self.metrics.snapshot()['counters']['router.rerouted.large'], 1)
+
+        with mock.patch('src.agent.model_router.time.monotonic', return_value=10 ** 9):
+            self.assertEqual(self.router.choose('programmer', _messages(4000)), 'large')
+
+    def test_fast_model_stays_in_use(self):
+        for _ in range(10):
+            self.router.record('large', 0.5)
+        self.assertFalse(self.router.is_degraded('large'))
+        self.assertEqual(self.metrics.summary('router.latency.large')['count'], 10)
+
+    def test_consecutive_errors_degrade_model(self):
+        self.router.record('large', 0.1, ok=False)
+        self.router.record('large', 0.1)
+        self.router.record('large', 0.1, ok=False)
+        self.assertFalse(self.router.is_degraded('large'))
+        self.router.record('large', 0.1, ok=False)
+        self.assertTrue(self.router.is_degraded('large'))
+        self.assertEqual(self.metrics.snapshot()['counters']['router.errors.large'], 3)
+
+    def test_follows_fallback_chain_past_degraded_models(self):
+        for model in ['large', 'small']:
+            self.router.record(model, 0.1, ok=False)
+            self.router.record(model, 0.1, ok=False)
+        self.assertEqual(self.router.choose('programmer', _messages(4000)), 'tiny')
+        self.assertEqual(self.router.fallback('large'), 'small')
+        self.assertIsNone(self.router.fallback('tiny'))
+
+    def test_from_file(self):
+        table = {'routes': {'programmer': [{'model': 'gpt-3.5-turbo', 'max_prompt_tokens': 1500}, {'model': 'gpt-4'}]},
+                 'fallbacks': {'gpt-4': 'gpt-3.5-turbo'}, 'latency_slo': {'gpt-4': 20.0}, 'cooldown': 30}
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(table, f)
+        self.addCleanup(os.remove, f.name)
+
+        router = ModelRouter.from_file(f.name, metrics=self.metrics)
+        self.assertEqual(router.routes['programmer'], [Route('gpt-3.5-turbo', 1500), Route('gpt-4', None)])
+        self.assertEqual((router.fallback('gpt-4'), router.latency_slo, router.cooldown),
+                         ('gpt-3.5-turbo', {'gpt-4': 20.0}, 30))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import TestCase, mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.patching import (PatchConflict, PatchError, apply_hunks, extract_diff, parse_unified_diff, prepare_changes,
+                                render_diff, write_files_atomically)
+
+NUMBERS = 'def is_even(n):\n    """Return whether n is even."""\n    return n > 0 and n % 2 == 0\n\n\ndef is_odd(n):\n    return not is_even(n)\n'
+
+DIFF = '''--- a/numbers.py
++++ b/numbers.py
+@@ -1,3 +1,3 @@
+ def is_even(n):
+     """Return whether n is even."""
+-    return n > 0 and n % 2 == 0
++    return n % 2 == 0
+--- /dev/null
++++ b/strings.py
+@@ -0,0 +1,2 @@
++def shout(text):
++    return text.upper()
+'''
+
+class TestPatching(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self._write('numbers.py', NUMBERS)
+
+    def _write(self, relative_path, content):
+        with open(os.path.join(self.root, relative_path), 'w') as f:
+            f.write(content)
+
+    def _read(self, relative_path):
+        with open(os.path.join(self.root, relative_path)) as f:
+            return f.read()
+
+    def test_extract_diff_from_fenced_reply(self):
+        reply = f'Here is the change:\n```diff\n{DIFF}```\nLet me know!'
+        self.assertEqual(extract_diff(reply), DIFF)
+        self.assertEqual(extract_diff(f'Sure.\n{DIFF}'), DIFF)
+
+    def test_parse_unified_diff(self):
+        patches = parse_unified_diff(DIFF)
+        self.assertEqual([(patch.old_path, patch.new_path) for patch in patches],
+                         [('numbers.py', 'numbers.py'), (None, 'strings.py')])
+        self.assertEqual(patches[0].hunks[0].old_start, 1)
+        self.assertEqual(patches[0].hunks[0].lines[2], ('-', '    return n > 0 and n % 2 == 0'))
+
+    def test_parse_drops_blank_lines_between_files(self):
+        first, second = DIFF.split('--- /dev/null')
+        patches = parse_unified_diff(f'{first}\n\n--- /dev/null{second}')
+        self.assertEqual(patches[0].hunks[0].lines[-1], ('+', '    return n % 2 == 0'))
+
+    def test_parse_rejects_text_without_headers(self):
+        with self.assertRaises(PatchError):
+            parse_unified_diff('def f():\n    pass\n')
+
+    def test_apply_hunks_tolerates_wrong_line_numbers(self):
+        patch = parse_unified_diff(DIFF.replace('@@ -1,3 +1,3 @@', '@@ -40,7 +40,7 @@'))[0]
+        self.assertIn('    return n % 2 == 0\n\n\ndef is_odd', apply_hunks(NUMBERS, patch.hunks))
+
+    def test_apply_hunks_rejects_missing_context(self):
+        patch = parse_unified_diff(DIFF.replace(' def is_even(n):', ' def is_even(number):'))[0]
+        with self.assertRaises(PatchError):
+            apply_hunks(NUMBERS, patch.hunks)
+
+    def test_prepare_changes_reports_failures_per_file(self):
+        broken = DIFF.replace('+    return text.upper()', '+    return (')
+        originals, updated, failures = prepare_changes(self.root, parse_unified_diff(broken))
+        self.assertIsNone(originals['strings.py'])
+        self.assertIn('return n % 2 == 0', updated['numbers.py'])
+        self.assertEqual(list(failures), ['strings.py'])
+        self.assertIn('not be valid Python', failures['strings.py'])
+        # Nothing is written until the changes are applied
+        self.assertEqual(self._read('numbers.py'), NUMBERS)
+
+    def test_prepare_changes_rejects_paths_outside_repository(self):
+        with self.assertRaises(PatchError):
+            prepare_changes(self.root, parse_unified_diff(DIFF.replace('b/strings.py', 'b/../escape.py')))
+
+    def test_prepare_changes_checks_deletions_against_the_file(self):
+        deletion = '--- a/numbers.py\n+++ /dev/null\n@@ -1,7 +0,0 @@\n' + ''.join(
+            f'-{line}\n' for line in NUMBERS.splitlines())
+        _, updated, failures = prepare_changes(self.root, parse_unified_diff(deletion))
+        self.assertEqual((updated, failures), ({'numbers.py': None}, {}))
+
+        self._write('numbers.py', NUMBERS + '\n\ndef is_zero(n):\n    return n == 0\n')
+        _, updated, failures = prepare_changes(self.root, parse_unified_diff(deletion))
+        self.assertEqual(updated, {})
+        self.assertIn('does not remove all of its lines', failures['numbers.py'])
+
+        stale = deletion.replace('-def is_even(n):', '-def is_even(number):')
+        _, updated, failures = prepare_changes(self.root, parse_unified_diff(stale))
+        self.assertEqual((updated, list(failures)), ({}, ['numbers.py']))
+
+    def test_write_files_atomically_keeps_crlf_line_endings(self):
+        with open(os.path.join(self.root, 'numbers.py'), 'w', newline='\r\n') as f:
+            f.write(NUMBERS)
+
+        _, updated, failures = prepare_changes(self.root, parse_unified_diff(DIFF))
+        self.assertEqual(failures, {})
+        write_files_atomically(self.root, updated)
+
+        with open(os.path.join(self.root, 'numbers.py'), 'rb') as f:
+            data = f.read()
+        self.assertIn(b'    return n % 2 == 0\r\n', data)
+        self.assertEqual(data.count(b'\n'), data.count(b'\r\n'))
+        with open(os.path.join(self.root, 'strings.py'), 'rb') as f:
+            self.assertNotIn(b'\r', f.read())
+
+    def test_write_files_atomically(self):
+        originals, updated, _ = prepare_changes(self.root, parse_unified_diff(DIFF))
+        write_files_atomically(self.root, updated)
+        self.assertEqual(self._read('strings.py'), 'def shout(text):\n    return text.upper()\n')
+        self.assertIn('return n % 2 == 0', self._read('numbers.py'))
+        self.assertEqual(sorted(os.listdir(self.root)), ['numbers.py', 'strings.py'])
+        self.assertIn('+++ b/strings.py', render_diff(originals, updated))
+
+    def test_write_files_atomically_rolls_back(self):
+        real_replace = os.replace
+
+        def replace(source, destination):
+            if destination.endswith('strings.py'):
+                raise OSError('disk full')
+            real_replace(source, destination)
+
+        _, updated, _ = prepare_changes(self.root, parse_unified_diff(DIFF))
+        with mock.patch('src.agent.patching.os.replace', side_effect=replace):
+            with self.assertRaises(OSError):
+                write_files_atomically(self.root, updated)
+        self.assertEqual(self._read('numbers.py'), NUMBERS)
+        self.assertEqual(os.listdir(self.root), ['numbers.py'])
+
+    def test_write_files_atomically_refuses_files_changed_since_they_were_read(self):
+        originals, updated, _ = prepare_changes(self.root, parse_unified_diff(DIFF))
+        self._write('numbers.py', NUMBERS + '\n\ndef is_zero(n):\n    return n == 0\n')
+
+        with self.assertRaises(PatchConflict) as raised:
+            write_files_atomically(self.root, updated, expected=originals)
+        self.assertEqual(raised.exception.relative_path, 'numbers.py')
+        self.assertIn('def is_zero', self._read('numbers.py'))
+        self.assertEqual(os.listdir(self.root), ['numbers.py'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,18 @@
 import os
+import shutil
 import sys
+import tempfile
+import threading
 import unittest
 from unittest import TestCase
 import json
 from unittest.mock import MagicMock, patch
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.gpt_agent import Role
+from src.agent.hedging import Hedger
+from src.agent.metrics import Metrics
+from src.agent.patching import prepare_changes
 from src.agent.programmer import ProgrammerAgent
 
 class TestProgrammerAgent(TestCase):
@@ -29,7 +36,62 @@ class TestProgrammerAgent(TestCase):
         # Assert
         self.assertEqual(result, 'print("Hello World")')
         self.codebase_agent_mock.get_directory_structure.assert_called_once()
-        self.gpt_agent_mock.ask_query.assert_called_once_with('Given the project structure {}, task.')
+        self.gpt_agent_mock.ask_query.assert_called_once_with('Given the project structure:\n\n\ntask.')
+
+    def test_get_code_renders_compact_structure(self):
+        self.codebase_agent_mock.get_directory_structure.return_value = {'src': {'main.py': None}, 'README.md': None}
+        self.gpt_agent_mock.ask_query.return_value = json.dumps({'code': 'pass'})
+
+        self.prog_agent.get_code('task')
+
+        self.gpt_agent_mock.ask_query.assert_called_once_with(
+            'Given the project structure:\nsrc/\n  main.py\nREADME.md\n\ntask.')
+
+    def test_get_code_attaches_relevant_context(self):
+        self.prog_agent.context_token_budget = 500
+        self.codebase_agent_mock.get_directory_structure.return_value = {}
+        self.codebase_agent_mock.find_relevant_context.return_value = '# main.py (lines 1-1)\nprint(1)'
+        self.gpt_agent_mock.ask_query.return_value = json.dumps({'code': 'pass'})
+
+        self.prog_agent.get_code('task')
+
+        self.codebase_agent_mock.find_relevant_context.assert_called_once_with('task', max_tokens=500)
+        self.gpt_agent_mock.ask_query.assert_called_once_with(
+            'Given the project structure:\n\n\nand these relevant files:\n# main.py (lines 1-1)\nprint(1)\n\ntask.')
+
+    def test_get_code_attaches_api_outline(self):
+        self.prog_agent.outline_token_budget = 300
+        self.codebase_agent_mock.get_directory_structure.return_value = {}
+        self.codebase_agent_mock.get_api_outline.return_value = '# main.py\ndef main(argv=None)'
+        self.gpt_agent_mock.ask_query.return_value = json.dumps({'code': 'pass'})
+
+        self.prog_agent.get_code('task')
+
+        self.codebase_agent_mock.get_api_outline.assert_called_once_with('task', max_tokens=300)
+        self.codebase_agent_mock.find_relevant_context.assert_not_called()
+        self.gpt_agent_mock.ask_query.assert_called_once_with(
+            'Given the project structure:\n\n\nand this outline of its Python code:\n# main.py\ndef main(argv=None)\n\ntask.')
+
+    def test_get_code_streaming(self):
+        self.codebase_agent_mock.get_directory_structure.return_value = {}
+        response = json.dumps({'code': 'def f():\n    return "hi"'})
+        self.gpt_agent_mock.stream_query.return_value = iter([response[i:i + 5] for i in range(0, len(response), 5)])
+
+        chunks = []
+        result = self.prog_agent.get_code('task', on_chunk=chunks.append)
+
+        self.assertEqual(result, 'def f():\n    return "hi"')
+        self.assertEqual(''.join(chunks), result)
+        self.gpt_agent_mock.ask_query.assert_not_called()
+
+    def test_hedger_is_passed_to_gpt_agent(self):
+        hedger = Hedger(delay=1.0)
+        agent = ProgrammerAgent(codebase_repo_path='', gpt_api_key='', hedger=hedger)
+        self.assertIs(agent.gpt_agent.hedger, hedger)
+
+    def test_reset_clears_conversation(self):
+        self.prog_agent.reset()
+        self.gpt_agent_mock.clear_memory.assert_called_once()
 
     def test_json_decode_error(self):
         self.codebase_agent_mock.get_directory_structure.return_value = {}
@@ -37,12 +99,132 @@ class TestProgrammerAgent(TestCase):
         result = self.prog_agent.get_code('task')
         self.assertIsNone(result)
         self.codebase_agent_mock.get_directory_structure.assert_called_once()
-        self.gpt_agent_mock.ask_query.assert_called_once_with('Given the project structure {}, task.')
+        # The query, then one request to correct the reply
+        self.assertEqual(self.gpt_agent_mock.ask_query.call_count, 2)
+        self.assertEqual(self.gpt_agent_mock.ask_query.call_args_list[0].args, ('Given the project structure:\n\n\ntask.',))
+
+    def test_get_code_extracts_fenced_reply_without_reasking(self):
+        self.codebase_agent_mock.get_directory_structure.return_value = {}
+        self.gpt_agent_mock.ask_query.return_value = 'Here you go:\n```json\n{"code": "pass"}\n```\nEnjoy!'
+        self.assertEqual(self.prog_agent.get_code('task'), 'pass')
+        self.gpt_agent_mock.ask_query.assert_called_once()
+
+    def test_get_code_asks_for_correction_as_last_resort(self):
+        self.codebase_agent_mock.get_directory_structure.return_value = {}
+        self.gpt_agent_mock.ask_query.side_effect = ['{"snippet": "pass"}', '{"code": "pass"}']
+        self.assertEqual(self.prog_agent.get_code('task'), 'pass')
+        self.assertIn('missing field "code"', self.gpt_agent_mock.ask_query.call_args.args[0])
 
     def test_general_exception(self):
         self.codebase_agent_mock.get_directory_structure.side_effect = Exception('error')
         result = self.prog_agent.get_code('task')
         self.assertIsNone(result)
 
+class TestProgrammerAgentPatchMode(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        with open(os.path.join(self.root, 'numbers.py'), 'w') as f:
+            f.write('def is_even(n):\n    return n > 0 and n % 2 == 0\n')
+        self.metrics = Metrics()
+        self.prog_agent = ProgrammerAgent(codebase_repo_path=self.root, gpt_api_key='', mode='patch',
+                                          metrics=self.metrics)
+        self.gpt_agent_mock = self.prog_agent.gpt_agent = MagicMock()
+
+    def _read(self):
+        with open(os.path.join(self.root, 'numbers.py')) as f:
+            return f.read()
+
+    def test_patch_mode_uses_patcher_role(self):
+        agent = ProgrammerAgent(codebase_repo_path=self.root, gpt_api_key='', mode='patch')
+        self.assertEqual(agent.gpt_agent.role, Role.PATCHER)
+        with self.assertRaises(ValueError):
+            ProgrammerAgent(codebase_repo_path=self.root, gpt_api_key='', mode='rewrite')
+
+    def test_get_code_applies_patch(self):
+        self.gpt_agent_mock.ask_query.return_value = (
+            '```diff\n--- a/numbers.py\n+++ b/numbers.py\n@@ -1,2 +1,2 @@\n def is_even(n):\n'
+            '-    return n > 0 and n % 2 == 0\n+    return n % 2 == 0\n```')
+
+        result = self.prog_agent.get_code('make is_even handle negative numbers')
+
+        self.assertEqual(self._read(), 'def is_even(n):\n    return n % 2 == 0\n')
+        self.assertIn('+    return n % 2 == 0', result)
+        query = self.gpt_agent_mock.ask_query.call_args.args[0]
+        self.assertIn('==> numbers.py <==\ndef is_even(n):', query)
+        counters = self.metrics.snapshot()['counters']
+        self.assertEqual(counters['programmer.patch.requests'], 1)
+        self.assertGreater(counters['programmer.patch.output_tokens'], 0)
+        self.assertEqual(self.metrics.summary('programmer.patch.get_code')['count'], 1)
+
+    def test_get_code_falls_back_to_full_content(self):
+        self.gpt_agent_mock.ask_query.side_effect = [
+            '--- a/numbers.py\n+++ b/numbers.py\n@@ -1,2 +1,2 @@\n def is_even(number):\n'
+            '-    return number > 0\n+    return True\n',
+            '```python\ndef is_even(n):\n    return n % 2 == 0\n```']
+
+        result = self.prog_agent.get_code('make is_even handle negative numbers')
+
+        self.assertEqual(self._read(), 'def is_even(n):\n    return n % 2 == 0\n')
+        self.assertIn('-    return n > 0 and n % 2 == 0', result)
+        self.assertIn('complete new content of numbers.py', self.gpt_agent_mock.ask_query.call_args.args[0])
+        self.assertEqual(self.metrics.snapshot()['counters']['programmer.patch.fallbacks'], 1)
+
+    def test_get_code_leaves_files_untouched_when_fallback_fails(self):
+        self.gpt_agent_mock.ask_query.side_effect = [
+            '--- a/numbers.py\n+++ b/numbers.py\n@@ -1,1 +1,1 @@\n-def missing():\n+def found():\n',
+            '```python\ndef is_even(n:\n```']
+
+        self.assertIsNone(self.prog_agent.get_code('task'))
+        self.assertEqual(self._read(), 'def is_even(n):\n    return n > 0 and n % 2 == 0\n')
+
+    def test_directory_index_is_persisted_when_given_a_path(self):
+        index_path = os.path.join(tempfile.mkdtemp(), 'index.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(index_path))
+        agent = ProgrammerAgent(codebase_repo_path=self.root, gpt_api_key='', directory_index_path=index_path)
+        self.assertEqual(agent.codebase_agent.get_directory_structure(), {'numbers.py': None})
+        self.assertTrue(os.path.exists(index_path))
+
+    def test_concurrent_patches_to_one_file_both_survive(self):
+        with open(os.path.join(self.root, 'numbers.py'), 'w') as f:
+            f.write('def is_even(n):\n    return n > 0 and n % 2 == 0\n\n\ndef is_odd(n):\n    return n % 2 == 1\n')
+        replies = [
+            '--- a/numbers.py\n+++ b/numbers.py\n@@ -1,2 +1,2 @@\n def is_even(n):\n'
+            '-    return n > 0 and n % 2 == 0\n+    return n % 2 == 0\n',
+            '--- a/numbers.py\n+++ b/numbers.py\n@@ -5,2 +5,2 @@\n def is_odd(n):\n'
+            '-    return n % 2 == 1\n+    return n % 2 != 0\n']
+        agents = []
+        for reply in replies:
+            agent = ProgrammerAgent(codebase_repo_path=self.root, gpt_api_key='', mode='patch', metrics=self.metrics)
+            agent.gpt_agent = MagicMock()
+            agent.gpt_agent.ask_query.return_value = reply
+            agents.append(agent)
+
+        # Both agents read the file before either writes it
+        barrier = threading.Barrier(len(agents), timeout=5)
+        waited = set()
+        real_prepare_changes = prepare_changes
+
+        def prepare_together(root, patches):
+            result = real_prepare_changes(root, patches)
+            if threading.get_ident() not in waited:
+                waited.add(threading.get_ident())
+                barrier.wait()
+            return result
+
+        results = {}
+        with patch('src.agent.programmer.prepare_changes', side_effect=prepare_together):
+            threads = [threading.Thread(target=lambda a=agent: results.setdefault(a, a.get_code('task')))
+                       for agent in agents]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(self._read(), 'def is_even(n):\n    return n % 2 == 0\n\n\ndef is_odd(n):\n    return n % 2 != 0\n')
+        self.assertTrue(all(results[agent] for agent in agents))
+        self.assertEqual(self.metrics.snapshot()['counters']['programmer.patch.conflicts'], 1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
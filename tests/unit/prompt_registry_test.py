@@ -0,0 +1,61 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from unittest import TestCase
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.prompt_registry import PromptRegistry, get_prompt_registry
+
+class PromptRegistryTest(TestCase):
+
+    def setUp(self):
+        self.prompt_dir = tempfile.mkdtemp()
+        self.registry = PromptRegistry(self.prompt_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.prompt_dir)
+
+    def _write(self, name, text, mtime=None):
+        path = os.path.join(self.prompt_dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_loads_lazily_and_memoizes(self):
+        self._write('programmer.txt', 'You write code.')
+        self.assertEqual(self.registry.loads, 0)
+
+        for _ in range(3):
+            self.assertEqual(self.registry.get('programmer.txt'), 'You write code.')
+        self.assertEqual(self.registry.loads, 1)
+
+    def test_reloads_when_file_changes(self):
+        self._write('programmer.txt', 'Old prompt.', mtime=1_000_000)
+        self.assertEqual(self.registry.get('programmer.txt'), 'Old prompt.')
+
+        self._write('programmer.txt', 'New prompt!', mtime=2_000_000)
+        self.assertEqual(self.registry.get('programmer.txt'), 'New prompt!')
+        self.assertEqual(self.registry.loads, 2)
+
+    def test_missing_prompt(self):
+        with self.assertRaises(FileNotFoundError):
+            self.registry.get('missing.txt')
+
+    def test_concurrent_gets_share_one_load(self):
+        self._write('jokester.txt', 'You tell jokes.')
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.registry.get('jokester.txt'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['You tell jokes.'] * 8)
+        self.assertEqual(self.registry.loads, 1)
+
+    def test_default_registry_is_shared_and_package_relative(self):
+        registry = get_prompt_registry()
+        self.assertIs(registry, get_prompt_registry())
+        self.assertTrue(os.path.isfile(os.path.join(registry.directory, 'programmer.txt')))
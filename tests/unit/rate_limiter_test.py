@@ -0,0 +1,108 @@
+import json
+import os
+import sys
+import threading
+import unittest
+from unittest import TestCase, mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.gpt_agent import GPTAgent, Role
+from src.agent.metrics import Metrics
+from src.agent.rate_limiter import RateLimiter
+
+class FakeClock:
+    """Stands in for the time module; sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class RateLimiterTest(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('src.agent.rate_limiter.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.metrics = Metrics()
+
+    def test_requests_per_minute(self):
+        limiter = RateLimiter(requests_per_minute=60, burst_seconds=60, metrics=self.metrics)
+        for _ in range(60):
+            limiter.acquire(10)
+        self.assertEqual(self.clock.sleeps, [])
+
+        # The bucket is empty, so each further request waits for one second of refill
+        limiter.acquire(10)
+        limiter.acquire(10)
+        self.assertEqual(self.clock.sleeps, [1.0, 1.0])
+
+    def test_default_burst_paces_calls_evenly(self):
+        limiter = RateLimiter(requests_per_minute=120, metrics=self.metrics)
+        for _ in range(4):
+            limiter.acquire(0)
+        # Two requests fit at once, then one is admitted every half second
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])
+
+    def test_tokens_per_minute_counts_prompt_and_expected_reply(self):
+        limiter = RateLimiter(tokens_per_minute=6000, completion_tokens=500, burst_seconds=60, metrics=self.metrics)
+        self.assertEqual(limiter.acquire(2500), 3000)
+        self.assertEqual(limiter.acquire(2500), 3000)
+        limiter.acquire(100)
+        self.assertAlmostEqual(self.clock.sleeps[0], 6.0)
+
+    def test_usage_refunds_overestimate_and_learns_reply_size(self):
+        limiter = RateLimiter(tokens_per_minute=6000, completion_tokens=500, burst_seconds=60, metrics=self.metrics)
+        reserved = limiter.acquire(5500)
+        limiter.record_usage(reserved, {'prompt_tokens': 5500, 'completion_tokens': 100, 'total_tokens': 5600})
+
+        # 400 tokens are left after the refund; the next reply is expected to take 420
+        self.assertAlmostEqual(limiter.completion_tokens, 420)
+        limiter.acquire(0)
+        self.assertEqual(len(self.clock.sleeps), 1)
+        self.assertAlmostEqual(self.clock.sleeps[0], 0.2)
+        self.assertEqual(self.metrics.snapshot()['counters']['ratelimit.used_tokens'], 5600)
+
+    def test_rejected_request_gives_tokens_back(self):
+        limiter = RateLimiter(tokens_per_minute=1000, completion_tokens=0, burst_seconds=60, metrics=self.metrics)
+        limiter.record_usage(limiter.acquire(1000), {'total_tokens': 0})
+        limiter.acquire(1000)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_waits_queue_in_order(self):
+        limiter = RateLimiter(requests_per_minute=1, burst_seconds=60, metrics=self.metrics)
+        for _ in range(3):
+            limiter.acquire(0)
+        # The second caller waits a minute; the third waits for the refill after that
+        self.assertEqual(self.clock.sleeps, [60.0, 60.0])
+
+class RateLimitedAgentTest(TestCase):
+
+    @mock.patch('requests.Session.request')
+    def test_agent_reserves_and_records_usage(self, mock_request):
+        usage = {'prompt_tokens': 30, 'completion_tokens': 7, 'total_tokens': 37}
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.text = json.dumps({'choices': [{'message': {'content': 'Joke'}}], 'usage': usage})
+        metrics = Metrics()
+        limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=100000, metrics=metrics)
+        agent = GPTAgent(api_key='fake_token', role=Role.JOKESTER, rate_limiter=limiter, metrics=metrics)
+
+        threads = [threading.Thread(target=agent.ask_query, args=(f'Joke {i}',)) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters['ratelimit.used_tokens'], 5 * 37)
+        self.assertEqual(metrics.summary('ratelimit.wait')['count'], 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import TestCase
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.codebase import CodebaseAgent
+from src.agent.relevance_index import RelevanceIndex, tokenize
+
+class TestRelevanceIndex(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.temp_dir, 'repo')
+        self.index_path = os.path.join(self.temp_dir, 'search.idx')
+        self._write('agent/git_agent.py', 'class GitAgent:\n    def create_pull_request(self, branch):\n        pass\n')
+        self._write('agent/codebase.py', 'class CodebaseAgent:\n    def get_directory_structure(self):\n        return {}\n')
+        self._write('README.md', 'This is a README about agents.\n')
+        self._write('image.png', '\0binary')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_tokenize_splits_identifiers(self):
+        terms = tokenize('getDirectoryStructure create_pull_request HTTPClient')
+        for term in ['getdirectorystructure', 'directory', 'structure', 'create_pull_request',
+                     'pull', 'request', 'httpclient', 'http', 'client']:
+            self.assertIn(term, terms)
+
+    def test_search_ranks_matching_file_first(self):
+        index = RelevanceIndex(self.root)
+        index.update()
+        results = index.search('open a pull request for the branch')
+        self.assertEqual(results[0][0], 'agent/git_agent.py')
+        self.assertNotIn('image.png', [path for path, _ in index.search('binary')])
+
+    def test_incremental_update(self):
+        index = RelevanceIndex(self.root, index_path=self.index_path)
+        self.assertEqual(index.update(), 3)
+        index.save()
+
+        reloaded = RelevanceIndex(self.root, index_path=self.index_path)
+        self.assertEqual(reloaded.update(), 0)
+
+        self._write('agent/codebase.py', 'class CodebaseAgent:\n    def walk_gitignore(self):\n        pass\n')
+        os.remove(os.path.join(self.root, 'README.md'))
+        self.assertEqual(reloaded.update(), 2)
+        self.assertEqual(reloaded.search('gitignore')[0][0], 'agent/codebase.py')
+        self.assertEqual(reloaded.search('readme'), [])
+
+    def test_snapshot_is_json_and_pickles_are_not_loaded(self):
+        index = RelevanceIndex(self.root, index_path=self.index_path)
+        index.update()
+        index.save()
+        with open(self.index_path) as f:
+            self.assertEqual(json.load(f)['root'], index.root)
+        self.assertEqual(RelevanceIndex(self.root, index_path=self.index_path).search('pull request'),
+                         index.search('pull request'))
+
+        with open(self.index_path, 'wb') as f:
+            pickle.dump({'version': RelevanceIndex.VERSION, 'root': index.root}, f)
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(RelevanceIndex(self.root, index_path=self.index_path).search('pull request'), [])
+
+    def test_relevant_context_respects_budget(self):
+        index = RelevanceIndex(self.root)
+        index.update()
+        context = index.relevant_context('directory structure', max_tokens=1000)
+        self.assertTrue(context.startswith('# agent/codebase.py (lines 1-3)\nclass CodebaseAgent:'))
+        self.assertEqual(index.relevant_context('directory structure', max_tokens=5), '')
+
+    def test_codebase_agent_find_relevant_context(self):
+        agent = CodebaseAgent(self.root, search_index_path=self.index_path)
+        context = agent.find_relevant_context('create a pull request', top_k=1)
+        self.assertIn('def create_pull_request', context)
+        self.assertTrue(os.path.exists(self.index_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,271 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.job_journal import JobJournal
+from src.agent.request_processor import RequestProcessor
+
+class TestRequestProcessor(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.request_folder = os.path.join(self.temp_dir, 'requests')
+        self.results_folder = os.path.join(self.request_folder, 'results')
+        os.makedirs(self.request_folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_request(self, filename, content):
+        with open(os.path.join(self.request_folder, filename), 'w') as f:
+            f.write(content)
+
+    def _read_result(self, filename):
+        with open(os.path.join(self.results_folder, filename)) as f:
+            return f.read()
+
+    def test_pending_requests_skips_processed_and_folders(self):
+        self._write_request('request1.txt', 'task one')
+        self._write_request('_request0.txt', 'done already')
+        os.makedirs(self.results_folder)
+
+        processor = RequestProcessor(self.request_folder, self.results_folder, MagicMock())
+        self.assertEqual(processor.pending_requests(), ['request1.txt'])
+
+    def test_process_all_writes_results_and_renames(self):
+        self._write_request('request1.txt', 'task one')
+        self._write_request('request2.txt', 'task two')
+        agent = MagicMock()
+        agent.get_code.side_effect = lambda task: f'code for {task}'
+
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, max_workers=2)
+        outcomes = processor.process_all()
+
+        self.assertEqual(outcomes, {'request1.txt': True, 'request2.txt': True})
+        self.assertEqual(self._read_result('request1.txt'), 'code for task one')
+        self.assertEqual(self._read_result('request2.txt'), 'code for task two')
+        self.assertEqual(sorted(os.listdir(self.request_folder)), ['_request1.txt', '_request2.txt', 'results'])
+
+    def test_failure_does_not_abort_other_files(self):
+        for i in range(5):
+            self._write_request(f'request{i}.txt', f'task {i}')
+
+        def get_code(task):
+            if task == 'task 2':
+                raise RuntimeError('boom')
+            if task == 'task 3':
+                return None
+            return task.upper()
+
+        agent = MagicMock()
+        agent.get_code.side_effect = get_code
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, max_workers=3)
+        outcomes = processor.process_all()
+
+        self.assertFalse(outcomes['request2.txt'])
+        self.assertFalse(outcomes['request3.txt'])
+        self.assertEqual(sum(outcomes.values()), 3)
+        self.assertTrue(os.path.exists(os.path.join(self.request_folder, 'request2.txt')))
+        self.assertTrue(os.path.exists(os.path.join(self.request_folder, 'request3.txt')))
+        self.assertEqual(self._read_result('request4.txt'), 'TASK 4')
+
+    def test_files_processed_concurrently_exactly_once(self):
+        for i in range(8):
+            self._write_request(f'request{i}.txt', f'task {i}')
+
+        barrier = threading.Barrier(4, timeout=5)
+        calls = []
+
+        def get_code(task):
+            calls.append(task)
+            barrier.wait()
+            return task
+
+        agent = MagicMock()
+        agent.get_code.side_effect = get_code
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, max_workers=4)
+        outcomes = processor.process_all()
+
+        self.assertTrue(all(outcomes.values()))
+        self.assertEqual(sorted(calls), sorted(f'task {i}' for i in range(8)))
+
+    def test_stream_results_writes_through_part_file(self):
+        self._write_request('request1.txt', 'task one')
+        seen_part_files = []
+
+        def get_code(task, on_chunk):
+            for chunk in ['def ', 'f(): ', 'pass']:
+                on_chunk(chunk)
+                seen_part_files.append(os.listdir(self.results_folder))
+            return 'def f(): pass'
+
+        agent = MagicMock()
+        agent.get_code.side_effect = get_code
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, stream_results=True)
+
+        self.assertEqual(processor.process_all(), {'request1.txt': True})
+        self.assertEqual(seen_part_files[0], ['request1.txt.part'])
+        self.assertEqual(os.listdir(self.results_folder), ['request1.txt'])
+        self.assertEqual(self._read_result('request1.txt'), 'def f(): pass')
+
+    def test_stream_results_rewrites_when_final_result_differs(self):
+        self._write_request('request1.txt', 'task one')
+        agent = MagicMock()
+        agent.get_code.return_value = 'No code found'
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, stream_results=True)
+
+        self.assertEqual(processor.process_all(), {'request1.txt': True})
+        self.assertEqual(self._read_result('request1.txt'), 'No code found')
+
+    def test_stream_results_failure_leaves_no_partial_file(self):
+        self._write_request('request1.txt', 'task one')
+        agent = MagicMock()
+        agent.get_code.return_value = None
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, stream_results=True)
+
+        self.assertEqual(processor.process_all(), {'request1.txt': False})
+        self.assertEqual(os.listdir(self.results_folder), [])
+
+    def test_agents_are_reused_and_reset_between_files(self):
+        for i in range(3):
+            self._write_request(f'request{i}.txt', f'task {i}')
+        factory = MagicMock()
+        factory.return_value.get_code.side_effect = lambda task: task
+
+        processor = RequestProcessor(self.request_folder, self.results_folder, factory)
+        self.assertTrue(all(processor.process_all().values()))
+
+        factory.assert_called_once()
+        self.assertEqual(factory.return_value.reset.call_count, 2)
+
+    def test_agent_is_replaced_after_failure(self):
+        for i in range(3):
+            self._write_request(f'request{i}.txt', f'task {i}')
+        agents = []
+
+        def get_code(task):
+            if task == 'task 0':
+                raise RuntimeError('boom')
+            return task
+
+        def create_agent():
+            agent = MagicMock()
+            agent.get_code.side_effect = get_code
+            agents.append(agent)
+            return agent
+
+        processor = RequestProcessor(self.request_folder, self.results_folder, create_agent)
+        outcomes = processor.process_all()
+
+        self.assertEqual(outcomes, {'request0.txt': False, 'request1.txt': True, 'request2.txt': True})
+        self.assertEqual(len(agents), 2)
+
+    def test_reuse_can_be_disabled(self):
+        for i in range(3):
+            self._write_request(f'request{i}.txt', f'task {i}')
+        factory = MagicMock()
+        factory.return_value.get_code.side_effect = lambda task: task
+
+        processor = RequestProcessor(self.request_folder, self.results_folder, factory, reuse_agents=False)
+        processor.process_all()
+        self.assertEqual(factory.call_count, 3)
+
+    def _journal(self):
+        journal = JobJournal(os.path.join(self.temp_dir, 'jobs.db'))
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_journal_records_jobs_and_reuses_identical_results(self):
+        self._write_request('request1.txt', 'same task')
+        self._write_request('request2.txt', 'same task')
+        self._write_request('request3.txt', 'other task')
+        agent = MagicMock()
+        agent.get_code.side_effect = lambda task: f'code for {task}'
+        journal = self._journal()
+
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, journal=journal)
+        outcomes = processor.process_all()
+
+        self.assertEqual(outcomes, {'request1.txt': True, 'request2.txt': True, 'request3.txt': True})
+        self.assertEqual(agent.get_code.call_count, 2)
+        self.assertEqual(self._read_result('request2.txt'), 'code for same task')
+        jobs = journal.jobs()
+        self.assertEqual([(job['filename'], job['status'], job['deduplicated']) for job in jobs],
+                         [('request1.txt', 'done', 0), ('request2.txt', 'done', 1), ('request3.txt', 'done', 0)])
+        self.assertTrue(all(job['finished'] >= job['started'] for job in jobs))
+
+    def test_journal_does_not_reuse_results_when_disabled(self):
+        self._write_request('request1.txt', 'same task')
+        self._write_request('request2.txt', 'same task')
+        agent = MagicMock()
+        agent.get_code.side_effect = lambda task: f'diff for {task}'
+        journal = self._journal()
+
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, journal=journal,
+                                     reuse_results=False)
+        outcomes = processor.process_all()
+
+        self.assertEqual(outcomes, {'request1.txt': True, 'request2.txt': True})
+        self.assertEqual(agent.get_code.call_count, 2)
+        self.assertEqual([job['deduplicated'] for job in journal.jobs()], [0, 0])
+
+    def test_journal_resumes_work_of_crashed_worker(self):
+        self._write_request('request1.txt', 'task one')
+        journal = JobJournal(os.path.join(self.temp_dir, 'jobs.db'), lease_seconds=0)
+        self.addCleanup(journal.close)
+        journal.enqueue('request1.txt', 'task one')
+        journal.claim('crashed-worker')
+        agent = MagicMock()
+        agent.get_code.return_value = 'recovered'
+
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, journal=journal)
+
+        self.assertEqual(processor.process_all(), {'request1.txt': True})
+        self.assertEqual(self._read_result('request1.txt'), 'recovered')
+        self.assertEqual(journal.jobs()[0]['attempts'], 2)
+
+    def test_journal_retries_failures_then_gives_up(self):
+        self._write_request('request1.txt', 'task one')
+        agent = MagicMock()
+        agent.get_code.return_value = None
+        journal = self._journal()
+
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, journal=journal)
+
+        self.assertEqual(processor.process_all(), {'request1.txt': False})
+        self.assertEqual(agent.get_code.call_count, journal.max_attempts)
+        self.assertEqual(journal.stats(), {'failed': 1})
+        self.assertTrue(os.path.exists(os.path.join(self.request_folder, 'request1.txt')))
+
+    def test_journal_cancels_jobs_whose_file_is_gone(self):
+        journal = self._journal()
+        journal.enqueue('deleted.txt', 'task')
+        processor = RequestProcessor(self.request_folder, self.results_folder, MagicMock(), journal=journal)
+
+        self.assertEqual(processor.process_all(), {})
+        self.assertEqual(journal.stats(), {'cancelled': 1})
+
+    def test_process_file_goes_through_journal(self):
+        self._write_request('request1.txt', 'task one')
+        agent = MagicMock()
+        agent.get_code.return_value = 'code'
+        journal = self._journal()
+        os.makedirs(self.results_folder)
+
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: agent, journal=journal)
+
+        self.assertTrue(processor.process_file('request1.txt'))
+        self.assertEqual(journal.stats(), {'done': 1})
+
+    def test_invalid_worker_count(self):
+        with self.assertRaises(ValueError):
+            RequestProcessor(self.request_folder, self.results_folder, MagicMock(), max_workers=0)
+
+if __name__ == '__main__':
+    unittest.main()
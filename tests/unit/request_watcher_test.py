@@ -0,0 +1,174 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.request_processor import RequestProcessor
+from src.agent.request_watcher import InotifyWatcher, PollingWatcher, RequestWatcher
+
+def _inotify_available():
+    try:
+        InotifyWatcher(tempfile.gettempdir()).close()
+        return True
+    except Exception:
+        return False
+
+class WatcherTest(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _write(self, name, content='task'):
+        with open(os.path.join(self.folder, name), 'w') as f:
+            f.write(content)
+
+    def test_polling_watcher_reports_new_and_changed_files(self):
+        self._write('old.txt')
+        watcher = PollingWatcher(self.folder, interval=0.01)
+        self.assertEqual(watcher.wait(0.01), set())
+
+        self._write('new.txt')
+        self.assertEqual(watcher.wait(0.01), {'new.txt'})
+        self._write('old.txt', 'longer task')
+        self.assertEqual(watcher.wait(0.01), {'old.txt'})
+
+    @unittest.skipUnless(_inotify_available(), 'inotify is not available')
+    def test_inotify_watcher_reports_written_files(self):
+        watcher = InotifyWatcher(self.folder)
+        self.addCleanup(watcher.close)
+        self.assertEqual(watcher.wait(0), set())
+
+        self._write('new.txt')
+        os.rename(os.path.join(self.folder, 'new.txt'), os.path.join(self.folder, 'moved.txt'))
+        self.assertEqual(watcher.wait(1), {'new.txt', 'moved.txt'})
+
+class RequestWatcherTest(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.request_folder = os.path.join(self.temp_dir, 'requests')
+        self.results_folder = os.path.join(self.request_folder, 'results')
+        os.makedirs(self.request_folder)
+        # Registered first so it runs last, after the watcher thread is stopped and joined
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.agent = MagicMock()
+        self.agent.get_code.side_effect = lambda task: f'code for {task}'
+
+    def _write_request(self, filename, content, mode='w'):
+        with open(os.path.join(self.request_folder, filename), mode) as f:
+            f.write(content)
+
+    def _start(self, watcher=None, max_workers=1, debounce=0.05):
+        processor = RequestProcessor(self.request_folder, self.results_folder, lambda: self.agent,
+                                     max_workers=max_workers)
+        request_watcher = RequestWatcher(processor, debounce=debounce, poll_interval=0.02, watcher=watcher)
+        thread = threading.Thread(target=request_watcher.run, kwargs={'install_signal_handlers': False})
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(request_watcher.stop)
+        return request_watcher, thread
+
+    def _wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('Timed out waiting for the watcher')
+            time.sleep(0.01)
+
+    def _result(self, filename):
+        path = os.path.join(self.results_folder, filename)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read()
+
+    def test_processes_existing_and_new_files(self):
+        self._write_request('request1.txt', 'task one')
+        self._start()
+
+        self._wait_for(lambda: self._result('request1.txt') == 'code for task one')
+        self._write_request('request2.txt', 'task two')
+        self._wait_for(lambda: self._result('request2.txt') == 'code for task two')
+        # The request is renamed just after its result is written
+        self._wait_for(lambda: os.path.exists(os.path.join(self.request_folder, '_request2.txt')))
+
+    def test_polling_fallback(self):
+        self._start(watcher=PollingWatcher(self.request_folder, interval=0.02))
+        self._write_request('request1.txt', 'task one')
+        self._wait_for(lambda: self._result('request1.txt') == 'code for task one')
+
+    def test_debounces_partially_written_files(self):
+        self._start(debounce=0.3)
+        self._write_request('request1.txt', 'first half')
+        time.sleep(0.1)
+        self._write_request('request1.txt', ' and second half', mode='a')
+
+        self._wait_for(lambda: self._result('request1.txt') is not None)
+        self.agent.get_code.assert_called_once_with('first half and second half')
+
+    def test_failed_file_is_retried_only_after_it_changes(self):
+        self.agent.get_code.side_effect = lambda task: None if task == 'bad' else task
+        request_watcher, _ = self._start()
+        self._write_request('request1.txt', 'bad')
+        self._wait_for(lambda: request_watcher.failed == 1)
+        time.sleep(0.2)
+        self.assertEqual(self.agent.get_code.call_count, 1)
+
+        self._write_request('request1.txt', 'good')
+        self._wait_for(lambda: self._result('request1.txt') == 'good')
+
+    def test_stop_finishes_in_flight_work(self):
+        started, release = threading.Event(), threading.Event()
+
+        def get_code(task):
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        self.agent.get_code.side_effect = get_code
+        request_watcher, thread = self._start()
+        self._write_request('request1.txt', 'slow task')
+        self.assertTrue(started.wait(5))
+
+        request_watcher.stop()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+
+        release.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self._result('request1.txt'), 'done')
+        self.assertEqual(request_watcher.processed, 1)
+
+    def test_stop_leaves_queued_files_unstarted(self):
+        started, release = threading.Event(), threading.Event()
+
+        def get_code(task):
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        self.agent.get_code.side_effect = get_code
+        for i in range(6):
+            self._write_request(f'request{i}.txt', f'task {i}')
+        request_watcher, thread = self._start()
+        self.assertTrue(started.wait(5))
+
+        request_watcher.stop()
+        release.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.agent.get_code.call_count, 1)
+        self.assertEqual(len([name for name in os.listdir(self.request_folder) if name.startswith('request')]), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import TestCase, mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.response_cache import ResponseCache
+
+class ResponseCacheTest(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = ResponseCache(self.temp_dir, max_entries=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_key_depends_on_model_and_messages(self):
+        messages = [{'role': 'system', 'content': 'prompt'}, {'role': 'user', 'content': 'hi'}]
+        key = ResponseCache.make_key('gpt-4', messages)
+        self.assertEqual(key, ResponseCache.make_key('gpt-4', [dict(m) for m in messages]))
+        self.assertNotEqual(key, ResponseCache.make_key('gpt-3.5-turbo', messages))
+        self.assertNotEqual(key, ResponseCache.make_key('gpt-4', messages[:1]))
+
+    def test_hit_and_miss_counters(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', {'choices': []}, elapsed=1.5)
+        self.assertEqual(self.cache.get('a'), {'choices': []})
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['saved_seconds'], 1.5)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.put('a', {'n': 1})
+        self.cache.put('b', {'n': 2})
+        self.cache.get('a')
+        self.cache.put('c', {'n': 3})
+
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), {'n': 1})
+        self.assertEqual(self.cache.get('c'), {'n': 3})
+        self.assertEqual(len(os.listdir(self.temp_dir)), 2)
+
+    def test_size_limit(self):
+        cache = ResponseCache(self.temp_dir, max_bytes=200)
+        for i in range(5):
+            cache.put(str(i), {'content': 'x' * 50})
+        self.assertLessEqual(cache.stats()['bytes'], 200)
+        self.assertIsNotNone(cache.get('4'))
+
+    def test_expired_entries_are_misses(self):
+        cache = ResponseCache(self.temp_dir, ttl=10)
+        with mock.patch('time.time', return_value=1000):
+            cache.put('a', {'n': 1})
+        with mock.patch('time.time', return_value=1005):
+            self.assertEqual(cache.get('a'), {'n': 1})
+        with mock.patch('time.time', return_value=1011):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_entries_persist_across_instances(self):
+        self.cache.put('a', {'n': 1})
+        reopened = ResponseCache(self.temp_dir)
+        self.assertEqual(reopened.get('a'), {'n': 1})
+
+if __name__ == '__main__':
+    unittest.main()
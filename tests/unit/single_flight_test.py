@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sys
+import threading
+import unittest
+from unittest import TestCase
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.single_flight import SingleFlight
+
+class SingleFlightTest(TestCase):
+
+    def setUp(self):
+        self.single_flight = SingleFlight()
+
+    def _run_threads(self, count, function, key='key'):
+        results = [None] * count
+        errors = [None] * count
+
+        def call(i):
+            try:
+                results[i] = self.single_flight.do(key, function)
+            except Exception as e:
+                errors[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def _wait_for_followers(self, count):
+        while self.single_flight.stats()['coalesced'] < count:
+            threading.Event().wait(0.001)
+
+    def test_concurrent_threads_share_one_call(self):
+        release = threading.Event()
+        calls = []
+
+        def function():
+            calls.append(1)
+            release.wait(5)
+            return {'answer': 42}
+
+        threads, results, _ = self._run_threads(5, function)
+        self._wait_for_followers(4)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([value for value, _ in results], [{'answer': 42}] * 5)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True, True])
+        self.assertEqual(self.single_flight.stats(), {'calls': 1, 'coalesced': 4, 'in_flight': 0})
+
+    def test_exception_reaches_every_waiting_caller(self):
+        release = threading.Event()
+
+        def function():
+            release.wait(5)
+            raise ConnectionError('reset')
+
+        threads, _, errors = self._run_threads(3, function)
+        self._wait_for_followers(2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(isinstance(error, ConnectionError) for error in errors))
+
+    def test_finished_call_is_not_reused(self):
+        self.assertEqual(self.single_flight.do('key', lambda: 1), (1, False))
+        self.assertEqual(self.single_flight.do('key', lambda: 2), (2, False))
+        self.assertEqual(self.single_flight.do('other', lambda: 3), (3, False))
+
+    def test_coroutines_share_one_call(self):
+        calls = []
+
+        async def function():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        async def main():
+            return await asyncio.gather(*(self.single_flight.do_async('key', function) for _ in range(4)))
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([value for value, _ in results], ['result'] * 4)
+        self.assertEqual(sum(shared for _, shared in results), 3)
+
+    def test_cancelled_follower_does_not_cancel_the_call(self):
+        async def function():
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        async def main():
+            leader = asyncio.ensure_future(self.single_flight.do_async('key', function))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(self.single_flight.do_async('key', function))
+            await asyncio.sleep(0)
+            follower.cancel()
+            return await leader
+
+        self.assertEqual(asyncio.run(main()), ('result', False))
+
+    def test_cancelled_leader_does_not_cancel_the_call(self):
+        calls = []
+
+        async def function():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        async def main():
+            leader = asyncio.ensure_future(self.single_flight.do_async('key', function))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(self.single_flight.do_async('key', function))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        self.assertEqual(asyncio.run(main()), ('result', True))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.single_flight.stats()['in_flight'], 0)
+
+    def test_coroutine_waits_for_call_made_by_thread(self):
+        release = threading.Event()
+        threads, results, _ = self._run_threads(1, lambda: release.wait(5) and 'from thread')
+        while self.single_flight.stats()['in_flight'] == 0:
+            threading.Event().wait(0.001)
+
+        async def main():
+            follower = asyncio.ensure_future(self.single_flight.do_async('key', lambda: asyncio.sleep(0)))
+            await asyncio.sleep(0.01)
+            release.set()
+            return await follower
+
+        self.assertEqual(asyncio.run(main()), ('from thread', True))
+        threads[0].join()
+        self.assertEqual(results[0], ('from thread', False))
+
+if __name__ == '__main__':
+    unittest.main()
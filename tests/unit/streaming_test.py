@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+import unittest
+from unittest import TestCase
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.streaming import JSONStringFieldDecoder, iter_content_deltas, iter_sse_data
+
+def sse_lines(pieces):
+    lines = [b': keep-alive', b'']
+    for piece in pieces:
+        event = {'choices': [{'delta': {'content': piece}}]}
+        lines.extend([f'data: {json.dumps(event)}'.encode('utf-8'), b''])
+    lines.append(b'data: [DONE]')
+    return lines
+
+class StreamingTest(TestCase):
+
+    def test_iter_content_deltas(self):
+        pieces = ['{"code": ', '"print(1)', '"}']
+        self.assertEqual(list(iter_content_deltas(sse_lines(pieces))), pieces)
+
+    def test_iter_sse_data_stops_at_done(self):
+        lines = ['data: {"a": 1}', 'data: [DONE]', 'data: {"a": 2}']
+        self.assertEqual(list(iter_sse_data(lines)), [{'a': 1}])
+
+    def test_decoder_matches_json_loads_for_every_split(self):
+        document = json.dumps({'explanation': 'x', 'code': 'def f():\n    return "\\u00e9 \U0001F600\t\\\\"'})
+        expected = json.loads(document)['code']
+
+        for size in range(1, 8):
+            decoder = JSONStringFieldDecoder('code')
+            decoded = ''.join(decoder.feed(document[i:i + size]) for i in range(0, len(document), size))
+            self.assertEqual(decoded, expected)
+            self.assertTrue(decoder.done)
+
+    def test_decoder_handles_ascii_escaped_surrogates(self):
+        document = json.dumps({'code': 'smile \U0001F600'}, ensure_ascii=True)
+        decoder = JSONStringFieldDecoder('code')
+        decoded = ''.join(decoder.feed(char) for char in document)
+        self.assertEqual(decoded, 'smile \U0001F600')
+
+    def _decode_every_split(self, document):
+        results = set()
+        for size in range(1, 8):
+            decoder = JSONStringFieldDecoder('code')
+            results.add(''.join(decoder.feed(document[i:i + size]) for i in range(0, len(document), size)))
+            self.assertTrue(decoder.done)
+        self.assertEqual(len(results), 1)
+        return results.pop()
+
+    def test_decoder_replaces_malformed_unicode_escape(self):
+        self.assertEqual(self._decode_every_split('{"code": "a\\uZZ12b"}'), 'a\ufffdZZ12b')
+        self.assertEqual(self._decode_every_split('{"code": "a\\u12"}'), 'a\ufffd')
+
+    def test_decoder_replaces_unpaired_surrogates(self):
+        self.assertEqual(self._decode_every_split('{"code": "\\ud83dx"}'), '\ufffdx')
+        self.assertEqual(self._decode_every_split('{"code": "\\ud83d"}'), '\ufffd')
+        self.assertEqual(self._decode_every_split('{"code": "\\ud83d\\u0041"}'), '\ufffdA')
+        self.assertEqual(self._decode_every_split('{"code": "\\ude00!"}'), '\ufffd!')
+
+    def test_decoder_without_field(self):
+        decoder = JSONStringFieldDecoder('code')
+        self.assertEqual(decoder.feed('not json at all'), '')
+        self.assertFalse(decoder.done)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import unittest
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.gpt_agent import Role
+from src.agent.metrics import Metrics
+from src.agent.structured_output import (JOKESTER_SCHEMA, PROGRAMMER_SCHEMA, JSONObjectExtractor, ask_structured,
+                                         extract_json, parse_structured, validate)
+
+class ExtractJSONTest(TestCase):
+
+    def test_plain_object(self):
+        self.assertEqual(extract_json('{"code": "pass"}'), {'code': 'pass'})
+
+    def test_fenced_block(self):
+        text = 'Sure! Here is the code:\n```json\n{"code": "x = {1: 2}"}\n```\nLet me know {if} it helps.'
+        self.assertEqual(extract_json(text), {'code': 'x = {1: 2}'})
+
+    def test_object_inside_prose(self):
+        text = 'The {answer} is: {"joke": "Why?", "answer": "Because \\"}\\" is a brace."} Thanks.'
+        self.assertEqual(extract_json(text), {'joke': 'Why?', 'answer': 'Because "}" is a brace.'})
+
+    def test_stray_brace_before_object(self):
+        self.assertEqual(extract_json('Use { carefully. {"code": "pass"}'), {'code': 'pass'})
+
+    def test_raw_newlines_inside_strings(self):
+        self.assertEqual(extract_json('{"code": "def f():\n\treturn 1"}'), {'code': 'def f():\n\treturn 1'})
+
+    def test_no_object(self):
+        self.assertIsNone(extract_json('unformatted text'))
+        self.assertIsNone(extract_json('[1, 2, 3]'))
+
+    def test_extractor_finds_object_for_every_split(self):
+        text = 'Preamble "quoted" {not json}\n```json\n' + json.dumps({'code': 'print("{}")\n', 'n': [1, {'a': 2}]}) + '\n```'
+        for size in (1, 2, 3, 7, len(text)):
+            extractor = JSONObjectExtractor()
+            results = [extractor.feed(text[i:i + size]) for i in range(0, len(text), size)]
+            # The object is reported as soon as its closing brace arrives, before the fence closes
+            self.assertTrue(any(results))
+            self.assertEqual(extractor.close(), {'code': 'print("{}")\n', 'n': [1, {'a': 2}]})
+
+class ValidationTest(TestCase):
+
+    def test_validate(self):
+        self.assertEqual(validate({'code': 'pass'}, PROGRAMMER_SCHEMA), [])
+        self.assertEqual(validate({'joke': 1}, JOKESTER_SCHEMA),
+                         ['field "joke" must be a str, not int', 'missing field "answer"'])
+
+    def test_parse_structured(self):
+        self.assertEqual(parse_structured('{"code": "pass"}', PROGRAMMER_SCHEMA), ({'code': 'pass'}, None))
+        self.assertEqual(parse_structured('nothing', PROGRAMMER_SCHEMA), (None, 'the reply did not contain a JSON object'))
+        self.assertEqual(parse_structured('{"snippet": "pass"}', PROGRAMMER_SCHEMA), (None, 'missing field "code"'))
+
+    def test_parse_structured_falls_back_when_streamed_object_is_invalid(self):
+        # The extractor stops at the first object, an example in the preamble
+        text = 'Given {"path": "main.py"}, here is the change:\n```json\n{"code": "pass"}\n```'
+        extractor = JSONObjectExtractor()
+        extractor.feed(text)
+        extracted = extractor.close()
+        self.assertEqual(extracted, {'path': 'main.py'})
+        self.assertEqual(parse_structured(text, PROGRAMMER_SCHEMA, extracted), ({'code': 'pass'}, None))
+
+class AskStructuredTest(TestCase):
+
+    def setUp(self):
+        self.agent = MagicMock(role=Role.JOKESTER, memory=None, metrics=Metrics())
+
+    def test_valid_reply_needs_one_request(self):
+        self.agent.ask_query.return_value = '```\n{"joke": "Knock knock", "answer": "Who is there?"}\n```'
+        self.assertEqual(ask_structured(self.agent, 'Tell me a joke'), {'joke': 'Knock knock', 'answer': 'Who is there?'})
+        self.agent.ask_query.assert_called_once_with('Tell me a joke')
+
+    def test_correction_includes_reply_without_memory(self):
+        self.agent.ask_query.side_effect = ['{"joke": "Knock knock"}', '{"joke": "Knock knock", "answer": "Me"}']
+        self.assertEqual(ask_structured(self.agent, 'Tell me a joke')['answer'], 'Me')
+
+        correction = self.agent.ask_query.call_args.args[0]
+        self.assertIn('missing field "answer"', correction)
+        self.assertIn('Previous reply:\n{"joke": "Knock knock"}', correction)
+        self.assertEqual(self.agent.metrics.snapshot()['counters']['structured.repairs'], 1)
+
+    def test_gives_up_after_max_repairs(self):
+        self.agent.ask_query.return_value = 'no json'
+        self.assertIsNone(ask_structured(self.agent, 'Tell me a joke', max_repairs=2))
+        self.assertEqual(self.agent.ask_query.call_count, 3)
+        self.assertEqual(self.agent.metrics.snapshot()['counters']['structured.failures'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
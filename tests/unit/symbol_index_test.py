@@ -0,0 +1,141 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import TestCase
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.codebase import CodebaseAgent
+from src.agent.symbol_index import SymbolIndex, _process_context, parse_symbols, render_outline
+
+GIT_AGENT = '''"""Git helpers."""
+import os
+
+class GitAgent(Base, metaclass=Meta):
+    """Class for managing a repository.
+
+    More detail.
+    """
+
+    def __init__(self, path: str, remote='origin'):
+        self.path = path
+
+    @property
+    def branch(self) -> str:
+        """The current branch."""
+
+    def create_pull_request(self, branch, *args, draft=False, **kwargs) -> bool:
+        """Open a pull request."""
+        def helper():
+            pass
+
+    def _run(self, command):
+        pass
+
+    class Config:
+        pass
+
+class _Private:
+    def visible(self):
+        pass
+
+async def fetch(url):
+    pass
+'''
+
+class TestSymbolIndex(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.root = os.path.join(self.temp_dir, 'repo')
+        self.index_path = os.path.join(self.temp_dir, 'symbols.idx')
+        self._write('agent/git_agent.py', GIT_AGENT)
+        self._write('agent/codebase.py', 'class CodebaseAgent:\n    def get_directory_structure(self):\n        return {}\n')
+        self._write('README.md', 'Not Python.\n')
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_parse_symbols(self):
+        parsed = parse_symbols(GIT_AGENT)
+        self.assertEqual(parsed['doc'], 'Git helpers.')
+        names = [(symbol.kind, symbol.name, symbol.depth) for symbol in parsed['symbols']]
+        self.assertEqual(names, [('class', 'GitAgent', 0), ('def', '__init__', 1), ('@property def', 'branch', 1),
+                                 ('def', 'create_pull_request', 1), ('def', '_run', 1), ('class', 'Config', 1),
+                                 ('class', '_Private', 0), ('def', 'visible', 1), ('async def', 'fetch', 0)])
+        git_agent, init = parsed['symbols'][:2]
+        self.assertEqual(git_agent.signature, '(Base, metaclass=Meta)')
+        self.assertEqual(git_agent.doc, 'Class for managing a repository.')
+        self.assertEqual(init.signature, "(self, path: str, remote='origin')")
+        self.assertEqual(parsed['symbols'][3].signature, '(self, branch, *args, draft=False, **kwargs) -> bool')
+
+    def test_parse_symbols_invalid_source(self):
+        self.assertIsNone(parse_symbols('def broken(:\n'))
+
+    def test_render_outline_hides_private_names(self):
+        outline = render_outline('agent/git_agent.py', parse_symbols(GIT_AGENT))
+        self.assertEqual(outline, '\n'.join([
+            '# agent/git_agent.py: Git helpers.',
+            'class GitAgent(Base, metaclass=Meta)  # Class for managing a repository.',
+            "  def __init__(self, path: str, remote='origin')",
+            '  @property def branch(self) -> str  # The current branch.',
+            '  def create_pull_request(self, branch, *args, draft=False, **kwargs) -> bool  # Open a pull request.',
+            '  class Config',
+            'async def fetch(url)',
+        ]))
+        self.assertIn('_Private', render_outline('agent/git_agent.py', parse_symbols(GIT_AGENT), include_private=True))
+
+    def test_incremental_update_and_content_cache(self):
+        index = SymbolIndex(self.root, index_path=self.index_path)
+        self.assertEqual(index.update(), 2)
+        self.assertEqual(index.paths(), ['agent/codebase.py', 'agent/git_agent.py'])
+        index.save()
+
+        reloaded = SymbolIndex(self.root, index_path=self.index_path)
+        self.assertEqual(reloaded.update(), 0)
+        self.assertEqual(reloaded.outline(), index.outline())
+
+        # A copy has the same content hash, so it is not parsed again
+        self._write('vendor/git_agent.py', GIT_AGENT)
+        self.assertEqual(reloaded.update(), 0)
+        self.assertEqual(reloaded.symbols('vendor/git_agent.py'), reloaded.symbols('agent/git_agent.py'))
+
+        self._write('agent/codebase.py', 'def walk():\n    pass\n')
+        self._write('agent/broken.py', 'def broken(:\n')
+        os.remove(os.path.join(self.root, 'vendor/git_agent.py'))
+        self.assertEqual(reloaded.update(), 2)
+        self.assertEqual(reloaded.paths(), ['agent/codebase.py', 'agent/git_agent.py'])
+        self.assertIn('def walk()', reloaded.outline())
+
+    def test_parallel_update_matches_serial(self):
+        for i in range(4):
+            self._write(f'pkg/module{i}.py', f'def function{i}(x):\n    """Doc {i}."""\n')
+        serial = SymbolIndex(self.root, workers=1)
+        serial.update()
+        parallel = SymbolIndex(self.root, workers=2, parallel_threshold=1)
+        self.assertEqual(parallel.update(), 6)
+        self.assertEqual(parallel.outline(), serial.outline())
+        # Forked children could inherit locks held by the caller's other threads
+        self.assertNotEqual(_process_context().get_start_method(), 'fork')
+
+    def test_outline_respects_budget_and_order(self):
+        index = SymbolIndex(self.root)
+        index.update()
+        outline = index.outline(['agent/git_agent.py', 'agent/codebase.py'], max_tokens=40)
+        self.assertTrue(outline.startswith('# agent/codebase.py'))
+        self.assertNotIn('GitAgent', outline)
+
+    def test_codebase_agent_outlines_relevant_files_first(self):
+        agent = CodebaseAgent(self.root)
+        outline = agent.get_api_outline('open a pull request', max_tokens=1000)
+        self.assertTrue(outline.startswith('# agent/git_agent.py'))
+        self.assertIn('# agent/codebase.py', outline)
+        self.assertTrue(agent.get_api_outline().startswith('# agent/codebase.py'))
+
+if __name__ == '__main__':
+    unittest.main()
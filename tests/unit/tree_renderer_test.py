@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+from unittest import TestCase
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.tokens import estimate_tokens
+from src.agent.tree_renderer import render_tree
+
+class TestTreeRenderer(TestCase):
+
+    def setUp(self):
+        self.structure = {
+            'README.md': None,
+            'src': {
+                'main.py': None,
+                'agent': {'codebase.py': None, 'gpt_agent.py': None},
+            },
+            'venv': {'lib': {f'module{i}.py': None for i in range(200)}},
+            'empty': {},
+        }
+
+    def test_full_render(self):
+        small = {'b.txt': None, 'a': {'c.py': None}, 'empty': {}}
+        self.assertEqual(render_tree(small), 'a/\n  c.py\nempty/\nb.txt')
+        self.assertEqual(render_tree({}), '')
+
+    def test_render_is_smaller_than_dict_repr(self):
+        self.assertLess(estimate_tokens(render_tree(self.structure)), estimate_tokens(str(self.structure)))
+
+    def test_budget_is_respected(self):
+        for budget in [5, 20, 50, 200, 1000]:
+            rendered = render_tree(self.structure, max_tokens=budget)
+            self.assertLessEqual(estimate_tokens(rendered), budget)
+
+    def test_large_directories_are_summarized(self):
+        self.assertIn('src/ (3 files, 1 dir)', render_tree(self.structure, max_tokens=18))
+
+        rendered = render_tree(self.structure, max_tokens=30)
+        self.assertIn('venv/\n  lib/ (200 files)', rendered)
+        self.assertIn('  agent/\n    codebase.py', rendered)
+
+    def test_wide_directories_are_cut_short(self):
+        rendered = render_tree(self.structure, max_children=3)
+        self.assertIn('    ... (197 more)', rendered)
+
+    def test_tiny_budget(self):
+        self.assertEqual(render_tree(self.structure, max_tokens=4), '... (4 more)')
+        self.assertEqual(render_tree(self.structure, max_tokens=3), '')
+
+if __name__ == '__main__':
+    unittest.main()
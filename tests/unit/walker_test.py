@@ -0,0 +1,106 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import TestCase
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.agent.codebase import CodebaseAgent
+from src.agent.walker import GitIgnore, iter_files, walk_directory_structure
+
+class TestGitIgnore(TestCase):
+
+    def assertIgnored(self, patterns, path, is_dir=False, expected=True):
+        self.assertEqual(GitIgnore(patterns).match(path, is_dir), expected, f'{patterns} vs {path}')
+
+    def test_unanchored_patterns_match_at_any_level(self):
+        self.assertIgnored(['*.pyc'], 'src/agent/gpt.pyc')
+        self.assertIgnored(['__pycache__/'], 'src/__pycache__', is_dir=True)
+        self.assertIgnored(['__pycache__/'], 'src/__pycache__', is_dir=False, expected=None)
+
+    def test_anchored_patterns(self):
+        self.assertIgnored(['/build'], 'build', is_dir=True)
+        self.assertIgnored(['/build'], 'src/build', is_dir=True, expected=None)
+        self.assertIgnored(['docs/*.md'], 'docs/a.md')
+        self.assertIgnored(['docs/*.md'], 'docs/sub/a.md', expected=None)
+
+    def test_double_star(self):
+        self.assertIgnored(['docs/**/*.md'], 'docs/a.md')
+        self.assertIgnored(['docs/**/*.md'], 'docs/x/y/a.md')
+        self.assertIgnored(['**/logs'], 'a/b/logs', is_dir=True)
+        self.assertIgnored(['out/**'], 'out/x/y.txt')
+
+    def test_negation_and_comments(self):
+        patterns = ['# comment', '*.log', '!keep.log', '\\#literal']
+        self.assertIgnored(patterns, 'debug.log')
+        self.assertIgnored(patterns, 'keep.log', expected=False)
+        self.assertIgnored(patterns, '#literal')
+        self.assertIgnored(patterns, 'comment', expected=None)
+
+    def test_character_classes(self):
+        self.assertIgnored(['file[0-9].txt'], 'file3.txt')
+        self.assertIgnored(['file[!0-9].txt'], 'file3.txt', expected=None)
+        self.assertIgnored(['?.txt'], 'a.txt')
+
+class TestWalker(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        files = ['.gitignore', 'main.py', 'debug.log', 'keep.log', 'build/out.o',
+                 'node_modules/pkg/index.js', 'src/app.py', 'src/app.pyc', 'src/.gitignore',
+                 'src/generated/code.py', 'src/deep/er/still.py', '.git/HEAD']
+        for relative in files:
+            path = os.path.join(self.root, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        with open(os.path.join(self.root, '.gitignore'), 'w') as f:
+            f.write('*.log\n!keep.log\n/build/\nnode_modules/\n*.pyc\n')
+        with open(os.path.join(self.root, 'src', '.gitignore'), 'w') as f:
+            f.write('generated/\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_matches_existing_shape_without_options(self):
+        agent = CodebaseAgent('tests/unit/codebaseFolderTest')
+        expected = {'file1.txt': None, 'folder1': {'file2.txt': None}, 'folder2': {'folder3': {'file3.txt': None}}}
+        self.assertEqual(agent.get_directory_structure(), expected)
+        self.assertEqual(agent.get_directory_structure(workers=4), expected)
+
+    def test_respects_gitignore(self):
+        structure = walk_directory_structure(self.root, respect_gitignore=True)
+        self.assertEqual(structure, {
+            '.gitignore': None,
+            'main.py': None,
+            'keep.log': None,
+            'src': {'.gitignore': None, 'app.py': None, 'deep': {'er': {'still.py': None}}},
+        })
+
+    def test_iter_files_respects_gitignore(self):
+        paths = sorted(path for path, _ in iter_files(self.root))
+        self.assertEqual(paths, ['.gitignore', 'keep.log', 'main.py', 'src/.gitignore', 'src/app.py',
+                                 'src/deep/er/still.py'])
+        python_files = sorted(path for path, _ in iter_files(self.root, ['deep'], suffixes=('.py',)))
+        self.assertEqual(python_files, ['main.py', 'src/app.py'])
+        self.assertEqual(len(list(iter_files(self.root, respect_gitignore=False))), 12)
+
+    def test_parallel_walk_matches_sequential(self):
+        sequential = walk_directory_structure(self.root, exclusions=['.git'])
+        for workers in [2, 8]:
+            self.assertEqual(walk_directory_structure(self.root, exclusions=['.git'], workers=workers), sequential)
+        self.assertIn('node_modules', sequential)
+
+    def test_max_depth(self):
+        structure = walk_directory_structure(self.root, respect_gitignore=True, max_depth=1)
+        self.assertEqual(structure['src']['deep'], {})
+        self.assertEqual(walk_directory_structure(self.root, max_depth=0)['src'], {})
+
+    def test_extra_ignore_patterns(self):
+        structure = walk_directory_structure(self.root, ignore_patterns=['src/deep/', '.git/'])
+        self.assertNotIn('deep', structure['src'])
+        self.assertNotIn('.git', structure)
+        self.assertIn('build', structure)
+
+if __name__ == '__main__':
+    unittest.main()